@@ -1,7 +1,13 @@
 import os
 import csv
+import sys
 
 students = []
+# Students by ID, kept in step with the students list
+students_by_id = {}
+
+# Lines of report output collected before each write
+CHUNK_LINES = 5000
 
 def add_student():
     while True:
@@ -21,7 +27,9 @@ def add_student():
                 break
         else:
             student = {'id': student_id, 'name': name, 'grades': []}
+            refresh_average(student)
             students.append(student)
+            students_by_id[student_id] = student
             print(f"Student {name} (ID: {student_id}) added successfully!")
 
 def search_student():
@@ -34,7 +42,7 @@ def search_student():
                 print(f"\nFound: ID: {student['id']}, Name: {student['name']}")
                 if student['grades']:
                     print(f"Grades: {student['grades']}")
-                    print(f"Average: {calculate_average(student['grades']):.2f}")
+                    print(f"Average: {get_average(student):.2f}")
                 else:
                     print("No grades recorded yet.")
                 return
@@ -48,7 +56,7 @@ def search_student():
                 print(f"\nFound: ID: {student['id']}, Name: {student['name']}")
                 if student['grades']:
                     print(f"Grades: {student['grades']}")
-                    print(f"Average: {calculate_average(student['grades']):.2f}")
+                    print(f"Average: {get_average(student):.2f}")
                 else:
                     print("No grades recorded yet.")
                 found = True
@@ -62,6 +70,65 @@ def calculate_average(grades):
         return 0
     return sum(grades) / len(grades)
 
+def refresh_average(student):
+    student['grade_sum'] = sum(student['grades'])
+    student['average'] = calculate_average(student['grades'])
+
+def get_average(student):
+    if 'average' not in student:
+        refresh_average(student)
+    return student['average']
+
+def add_grade(student, grade):
+    get_average(student)
+    student['grades'].append(grade)
+    student['grade_sum'] += grade
+    student['average'] = student['grade_sum'] / len(student['grades'])
+
+def add_grades(student, grades):
+    get_average(student)
+    student['grades'].extend(grades)
+    for grade in grades:
+        student['grade_sum'] += grade
+    if student['grades']:
+        student['average'] = student['grade_sum'] / len(student['grades'])
+
+def student_index():
+    # Rebuild the ID map only if the students list was changed without it
+    if len(students_by_id) != len(students):
+        students_by_id.clear()
+        for student in students:
+            students_by_id[student['id']] = student
+    return students_by_id
+
+def validate_grade_events(events, by_id):
+    # One pass over the batch: grades grouped by student, and rejected rows
+    grouped = {}
+    errors = []
+    for row, (student_id, grade) in enumerate(events, 1):
+        try:
+            grade = float(grade)
+        except (TypeError, ValueError):
+            errors.append((row, f"Invalid grade: {grade}"))
+            continue
+        if not 0 <= grade <= 100:
+            errors.append((row, f"Grade {grade} must be between 0 and 100"))
+        elif student_id not in by_id:
+            errors.append((row, f"No student found with ID: {student_id}"))
+        else:
+            grouped.setdefault(student_id, []).append(grade)
+    return grouped, errors
+
+def ingest_grades(events):
+    by_id = student_index()
+    grouped, errors = validate_grade_events(events, by_id)
+    
+    added = 0
+    for student_id, grades in grouped.items():
+        add_grades(by_id[student_id], grades)
+        added += len(grades)
+    return added, errors
+
 def update_grades():
     student_id = input("Enter student ID to update grades: ").strip()
     
@@ -78,7 +145,7 @@ def update_grades():
                 try:
                     grade = float(grade_input)
                     if 0 <= grade <= 100:
-                        student['grades'].append(grade)
+                        add_grade(student, grade)
                         print(f"Grade {grade} added successfully!")
                     else:
                         print("Error: Grade must be between 0 and 100.")
@@ -87,7 +154,7 @@ def update_grades():
             
             if student['grades']:
                 print(f"Updated grades: {student['grades']}")
-                print(f"New average: {calculate_average(student['grades']):.2f}")
+                print(f"New average: {get_average(student):.2f}")
             return
     
     print(f"No student found with ID: {student_id}")
@@ -102,35 +169,41 @@ def generate_report():
     failed = 0
     no_grades = 0
     
-    print("\n" + "="*50)
-    print("STUDENT ACADEMIC REPORT")
-    print("="*50)
+    # Build the report in a buffer and write it in large chunks, not one
+    # print() per line
+    lines = ["\n" + "="*50, "STUDENT ACADEMIC REPORT", "="*50]
     
     for student in students:
-        print(f"\nStudent: {student['name']} (ID: {student['id']})")
+        lines.append(f"\nStudent: {student['name']} (ID: {student['id']})")
         
         if not student['grades']:
-            print("Status: No grades recorded")
+            lines.append("Status: No grades recorded")
             no_grades += 1
         else:
-            avg = calculate_average(student['grades'])
+            avg = get_average(student)
             status = "PASS" if avg >= passing_grade else "FAIL"
-            print(f"Grades: {student['grades']}")
-            print(f"Average: {avg:.2f}")
-            print(f"Status: {status}")
+            lines.append(f"Grades: {student['grades']}")
+            lines.append(f"Average: {avg:.2f}")
+            lines.append(f"Status: {status}")
             
             if avg >= passing_grade:
                 passed += 1
             else:
                 failed += 1
+        
+        if len(lines) >= CHUNK_LINES:
+            sys.stdout.write("\n".join(lines) + "\n")
+            lines = []
     
-    print("\n" + "-"*50)
-    print("SUMMARY")
-    print(f"Total Students: {len(students)}")
-    print(f"Passed: {passed}")
-    print(f"Failed: {failed}")
-    print(f"No Grades: {no_grades}")
-    print("="*50)
+    lines.append("\n" + "-"*50)
+    lines.append("SUMMARY")
+    lines.append(f"Total Students: {len(students)}")
+    lines.append(f"Passed: {passed}")
+    lines.append(f"Failed: {failed}")
+    lines.append(f"No Grades: {no_grades}")
+    lines.append("="*50)
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
 
 def save_to_file():
     filename = input("Enter filename to save (without extension): ").strip()
@@ -165,6 +238,7 @@ def load_from_file():
     
     try:
         loaded_count = 0
+        existing_ids = student_index()
         with open(filename, 'r') as file:
             reader = csv.reader(file)
             next(reader)
@@ -179,42 +253,77 @@ def load_from_file():
                     if grades_str:
                         grades = [float(g) for g in grades_str.split(';')]
                     
-                    exists = False
-                    for student in students:
-                        if student['id'] == student_id:
-                            exists = True
-                            break
-                    
-                    if not exists:
-                        students.append({
+                    if student_id not in existing_ids:
+                        student = {
                             'id': student_id,
                             'name': name,
                             'grades': grades
-                        })
+                        }
+                        refresh_average(student)
+                        students.append(student)
+                        existing_ids[student_id] = student
                         loaded_count += 1
         
         print(f"Successfully loaded {loaded_count} student(s) from {filename}")
     except Exception as e:
         print(f"Error loading file: {e}")
 
+PAGE_SIZE = 10
+
+SORT_KEYS = {
+    'id': lambda student: student['id'],
+    'name': lambda student: student['name'].lower(),
+    'average': lambda student: -get_average(student),
+}
+
+def format_student(student):
+    lines = [f"\nID: {student['id']}", f"Name: {student['name']}"]
+    if student['grades']:
+        lines.append(f"Grades: {student['grades']}")
+        lines.append(f"Average: {get_average(student):.2f}")
+    else:
+        lines.append("Grades: No grades recorded")
+    return "\n".join(lines)
+
 def display_all_students():
     if not students:
         print("No students in the system.")
         return
     
-    print("\n" + "="*50)
-    print("ALL STUDENTS")
-    print("="*50)
+    order = list(range(len(students)))
+    sort_name = "roster order"
+    page = 0
+    page_count = (len(order) + PAGE_SIZE - 1) // PAGE_SIZE
     
-    for student in students:
-        print(f"\nID: {student['id']}")
-        print(f"Name: {student['name']}")
-        if student['grades']:
-            print(f"Grades: {student['grades']}")
-            print(f"Average: {calculate_average(student['grades']):.2f}")
+    while True:
+        page = min(max(page, 0), page_count - 1)
+        rows = [format_student(students[i]) for i in order[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]]
+        
+        header = "ALL STUDENTS"
+        if page_count > 1:
+            header += f" (page {page + 1} of {page_count}, {sort_name})"
+        sys.stdout.write("\n" + "="*50 + "\n" + header + "\n" + "="*50
+                         + "\n".join(rows) + "\n" + "="*50 + "\n")
+        if page_count == 1:
+            return
+        
+        command = input("Enter for next page, 'p' previous, a page number, "
+                        "sort by id/name/average, or 'done': ").strip().lower()
+        if command == 'done' or (command in ('', 'n') and page == page_count - 1):
+            return
+        elif command in ('', 'n'):
+            page += 1
+        elif command == 'p':
+            page -= 1
+        elif command.isdigit():
+            page = int(command) - 1
+        elif command in SORT_KEYS:
+            key = SORT_KEYS[command]
+            order = sorted(range(len(students)), key=lambda i: key(students[i]))
+            sort_name = f"by {command}"
+            page = 0
         else:
-            print("Grades: No grades recorded")
-    print("="*50)
+            print("Invalid option.")
 
 def main():
     print("="*50)
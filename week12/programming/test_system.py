@@ -41,4 +41,15 @@ with open('test_data.csv', 'w', newline='') as file:
         writer.writerow([student['id'], student['name'], grades_str])
 print("File saved successfully!")
 
+print("\n7. Testing bulk grade ingestion")
+added, errors = ingest_grades([('S1001', 100), ('S1003', '70'), ('S9999', 80),
+                               ('S1002', 'abc'), ('S1001', 120), ('S1003', 55)])
+print(f"Added {added} grades, {len(errors)} rows rejected")
+for row, message in errors:
+    print(f"  Row {row}: {message}")
+print(f"Charlie Brown: Grades = {students[2]['grades']}, Average = {get_average(students[2]):.2f}")
+students.append({'id': 'S1004', 'name': 'Dana White', 'grades': []})
+added, errors = ingest_grades([('S1004', 88)])
+print(f"Dana White (added after the first batch): Grades = {students[3]['grades']}")
+
 print("\nAll tests completed successfully!")
\ No newline at end of file
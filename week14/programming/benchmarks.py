@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for Student Academic Management System
+Measures the heavy operations on large synthetic rosters
+Usage: python benchmarks.py [benchmark ...] [rows ...] [--store NAME]
+                            [--output FILE] [--compare OLD_FILE]
+Benchmarks: suite (default), import, report, load
+"""
+
+import io
+import os
+import sys
+import time
+import json
+import random
+import platform
+import argparse
+import subprocess
+from contextlib import redirect_stdout
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+import final_project as app
+from final_project import (
+    StudentCSVReader, BulkCSVReader, StudentStore,
+    ReportStats, parallel_report_stats, ShardedCSVReader
+)
+
+FIRST_NAMES = ["Alice", "Bob", "Charlie", "Diana", "Ethan", "Fiona", "George", "Hannah"]
+LAST_NAMES = ["Johnson", "Smith", "Brown", "Prince", "Hunt", "Garcia", "Lee", "Walker"]
+
+
+def print_section(title):
+    """Print a formatted section header"""
+    print("\n" + "="*60)
+    print(f"  {title}")
+    print("="*60)
+
+
+def write_synthetic_roster(filename, rows, seed=571):
+    """Write a CSV roster of random students with 1-10 grades each (reproducible per seed)"""
+    rng = random.Random(seed)
+    with open(filename, "w", newline="") as file:
+        file.write("ID,Name,Grades\r\n")
+        for i in range(rows):
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            grades = ";".join(str(rng.randint(0, 100)) for _ in range(rng.randint(1, 10)))
+            file.write(f"S{1000000 + i},{name},{grades}\r\n")
+
+
+def time_call(func):
+    """Run func once and return (seconds, result)"""
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def benchmark_csv_import(rows):
+    """Compare the streaming loader with the bulk columnar import"""
+    print_section(f"CSV Import ({rows:,} rows)")
+    filename = "benchmark_roster.csv"
+    write_synthetic_roster(filename, rows)
+
+    def streaming_load():
+        store = StudentStore()
+        store.replace(StudentCSVReader(filename))
+        return store
+
+    def bulk_load():
+        return BulkCSVReader(filename).load_columnar()
+
+    try:
+        results = {}
+        for label, loader in [("load_from_file (StudentCSVReader)", streaming_load),
+                              ("bulk import (BulkCSVReader)", bulk_load)]:
+            seconds, store = time_call(loader)
+            results[label] = seconds
+            print(f"  {label:<36} {seconds:8.2f} s  {len(store) / seconds:12,.0f} rows/s")
+            del store
+
+        baseline, bulk = results.values()
+        print(f"\n  Bulk import speedup: {baseline / bulk:.1f}x")
+    finally:
+        os.remove(filename)
+
+
+def benchmark_parallel_report(rows):
+    """Compare the serial report pass with the sharded multi-process one"""
+    print_section(f"Report Statistics ({rows:,} rows, {os.cpu_count()} CPUs)")
+    filename = "benchmark_roster.csv"
+    write_synthetic_roster(filename, rows)
+    try:
+        store = BulkCSVReader(filename).load_columnar()
+    finally:
+        os.remove(filename)
+
+    serial, expected = time_call(lambda: ReportStats.from_records(store))
+    print(f"  {'serial':<36} {serial:8.2f} s")
+    for workers in (2, 4, 8):
+        seconds, stats = time_call(lambda: parallel_report_stats(store, workers))
+        assert stats.grade_distribution == expected.grade_distribution
+        print(f"  {f'{workers} workers':<36} {seconds:8.2f} s  {serial / seconds:6.1f}x")
+
+
+def benchmark_sharded_load(rows):
+    """Compare the streaming loader with sharded loading on several processes"""
+    print_section(f"Sharded CSV Load ({rows:,} rows, {os.cpu_count()} CPUs)")
+    filename = "benchmark_roster.csv"
+    write_synthetic_roster(filename, rows)
+    try:
+        baseline = None
+        for workers in (1, 2, 4, 8):
+            def load():
+                store = StudentStore()
+                store.replace(ShardedCSVReader(filename, workers=workers))
+                return store
+            seconds, store = time_call(load)
+            baseline = baseline or seconds
+            print(f"  {f'{workers} worker(s)':<36} {seconds:8.2f} s  {baseline / seconds:6.1f}x")
+            del store
+    finally:
+        os.remove(filename)
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process so far in MB, None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def time_once(func, items):
+    """Run func once and return its result entry (items processed per second)"""
+    seconds, _ = time_call(func)
+    return {"seconds": round(seconds, 4), "throughput": round(items / seconds, 1),
+            "peak_memory_mb": peak_memory_mb()}
+
+
+def time_samples(func, args_list):
+    """Call func once per argument tuple and return latency percentiles in microseconds"""
+    latencies = []
+    start = time.perf_counter()
+    for args in args_list:
+        call_start = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - call_start)
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    percentile = lambda p: round(latencies[min(int(p / 100 * len(latencies)), len(latencies) - 1)] * 1e6, 1)
+    return {"calls": len(latencies), "throughput": round(len(latencies) / seconds, 1),
+            "p50_us": percentile(50), "p90_us": percentile(90), "p99_us": percentile(99),
+            "max_us": round(latencies[-1] * 1e6, 1), "peak_memory_mb": peak_memory_mb()}
+
+
+def benchmark_operations(rows, store_name="dict", samples=1000, seed=571):
+    """
+    Time the main operations of the system on a synthetic roster
+    Whole-roster operations (load, save, report) are run once; per-record
+    operations (searches, page views, grade edits) are sampled with
+    random arguments. Returns: {operation: result entry}
+    """
+    print_section(f"Core Operations ({rows:,} rows, {store_name} store)")
+    filename = "benchmark_roster.csv"
+    write_synthetic_roster(filename, rows, seed)
+    rng = random.Random(seed)
+    saved = app.students, app.CSV_FILE, app.current_user, app.rank_index, app.name_prefix_index
+    if store_name == "sqlite":
+        app.students = app.SQLiteStudentStore()
+    else:
+        app.students = app.STORE_BACKENDS[store_name]()
+    app.CSV_FILE = filename
+    app.current_user = {"username": "benchmark", "role": "admin"}
+    app.rank_index = app.name_prefix_index = None
+    
+    ids = [f"S{1000000 + rng.randrange(rows)}" for _ in range(samples)]
+    names = [rng.choice(FIRST_NAMES + LAST_NAMES)[:rng.randint(2, 5)].lower()
+             for _ in range(samples)]
+    page_count = -(-rows // app.PAGE_SIZE)
+    pages = [(rng.choice(list(app.STUDENT_SORT_KEYS)), rng.randrange(page_count))
+             for _ in range(samples)]
+    edits = [(student_id, rng.randint(0, 100)) for student_id in ids]
+    
+    def view_page(sort_key, page):
+        student_ids = app.students.sorted_ids(sort_key)
+        page_ids = student_ids[page * app.PAGE_SIZE:(page + 1) * app.PAGE_SIZE]
+        return app.render_student_page([app.students.get(student_id) for student_id in page_ids],
+                                       page, page_count, sort_key)
+    
+    def edit_grade(student_id, grade):
+        app.students.update_grade(app.students.get(student_id), 0, grade)
+    
+    results = {}
+    try:
+        with redirect_stdout(io.StringIO()):
+            results["load_from_file"] = time_once(app.load_from_file, rows)
+            rows = len(app.students)
+            results["save_to_file"] = time_once(lambda: app.save_to_file("csv"), rows)
+            results["generate_report"] = time_once(app.generate_report, rows)
+            results["generate_report_batch"] = time_once(lambda: app.generate_report(True), rows)
+            results["search_id"] = time_samples(app.students.get, [(i,) for i in ids])
+            results["search_name"] = time_samples(app.students.search_name, [(n,) for n in names])
+            results["view_page"] = time_samples(view_page, pages)
+            results["edit_grade"] = time_samples(edit_grade, edits)
+    finally:
+        if isinstance(app.students, app.SQLiteStudentStore):
+            app.students.close()
+        app.students, app.CSV_FILE, app.current_user, app.rank_index, app.name_prefix_index = saved
+        os.remove(filename)
+    
+    for operation, result in results.items():
+        if "calls" in result:
+            print(f"  {operation:<24} {result['throughput']:>12,.0f} ops/s  "
+                  f"p50 {result['p50_us']:>9,.1f} us  p99 {result['p99_us']:>10,.1f} us")
+        else:
+            print(f"  {operation:<24} {result['seconds']:>10.2f} s    "
+                  f"{result['throughput']:>12,.0f} rows/s")
+    print(f"  Peak memory: {peak_memory_mb()} MB")
+    return results
+
+
+def git_revision():
+    """Short hash of the checked-out commit, None outside a git checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes, store_name="dict", output="benchmark_results.json", samples=1000):
+    """Benchmark the core operations at each roster size and write the results as JSON"""
+    report = {"revision": git_revision(), "python": platform.python_version(),
+              "platform": platform.platform(), "cpus": os.cpu_count(), "store": store_name,
+              "numpy": app.numpy_module() is not None, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "results": {}}
+    for rows in sizes:
+        report["results"][str(rows)] = benchmark_operations(rows, store_name, samples)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nResults written to {output}")
+    return report
+
+
+def compare_results(old, new, threshold=1.1):
+    """Print every operation that got slower than threshold times the old result"""
+    print_section(f"Compared with {old.get('revision') or 'previous run'}")
+    regressions = 0
+    for rows, operations in new["results"].items():
+        for operation, result in operations.items():
+            before = old.get("results", {}).get(rows, {}).get(operation)
+            if before is None:
+                continue
+            metric = "p50_us" if "calls" in result else "seconds"
+            ratio = result[metric] / before[metric] if before[metric] else 1.0
+            if ratio > threshold:
+                regressions += 1
+                print(f"  {operation} at {int(rows):,} rows: {before[metric]} -> "
+                      f"{result[metric]} ({ratio:.2f}x slower)")
+    if not regressions:
+        print("  No regressions")
+    return regressions
+
+
+BENCHMARKS = {"import": benchmark_csv_import, "report": benchmark_parallel_report,
+              "load": benchmark_sharded_load}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the student records system")
+    parser.add_argument("args", nargs="*", metavar="benchmark|rows",
+                        help="benchmarks to run (suite, import, report, load) and roster sizes")
+    parser.add_argument("--store", default="dict", choices=list(app.STORE_BACKENDS),
+                        help="store backend for the suite")
+    parser.add_argument("--samples", type=int, default=1000,
+                        help="calls per sampled operation in the suite")
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="JSON file for the suite results")
+    parser.add_argument("--compare", metavar="OLD_FILE",
+                        help="report suite operations that got slower than this earlier run")
+    args = parser.parse_args()
+    names = [arg for arg in args.args if not arg.isdigit()] or ["suite"]
+    sizes = [int(arg) for arg in args.args if arg.isdigit()]
+    for name in names:
+        if name == "suite":
+            report = run_suite(sizes or [10_000, 100_000, 1_000_000], args.store,
+                               args.output, args.samples)
+            if args.compare:
+                with open(args.compare) as file:
+                    if compare_results(json.load(file), report):
+                        sys.exit(1)
+        elif name in BENCHMARKS:
+            for rows in sizes or [1_000_000]:
+                BENCHMARKS[name](rows)
+        else:
+            parser.error(f"unknown benchmark {name}")
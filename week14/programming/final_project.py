@@ -6,14 +6,2003 @@ Author: Group Project
 Course: KG-571, Foundation of Programming
 """
 
+import io
 import os
+import re
+import sys
 import csv
-import getpass
-from typing import List, Dict, Optional, Tuple
+import math
+import json
+import mmap
+import struct
+import tempfile
+import time
+import warnings
+import threading
+import atexit
+from array import array
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice, repeat
+from functools import wraps
+from collections import deque, OrderedDict
+from typing import List, Dict, Optional, Tuple, Iterable
+
+# NumPy is optional and, like the other heavy modules (sqlite3, argparse,
+# multiprocessing), imported where it is first used so startup stays fast
+_numpy = None
+
+
+def numpy_module():
+    """
+    Import NumPy on first use
+    Returns: the numpy module, or None when it is not installed (batch
+             grading then falls back to plain Python)
+    """
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+class NameIndex:
+    """
+    Trigram index for partial (substring) name search
+    Names get ordinals in the order they are added, and every 3 character
+    slice of a lowercased name maps to an array('i') of the ordinals whose
+    name contains it. Ordinals only grow, so each array is already in
+    roster order. A query of three or more characters only checks the
+    names in its rarest trigram's array; shorter queries scan the kept
+    lowercased names instead of lowercasing the roster again.
+    Removed names leave gaps until more than half the ordinals are gaps.
+    """
+
+    GRAM_SIZE = 3
+
+    def __init__(self):
+        self.clear()
+
+    @classmethod
+    def _grams(cls, text: str) -> set:
+        """Return every GRAM_SIZE slice of text"""
+        return {text[i:i + cls.GRAM_SIZE] for i in range(len(text) - cls.GRAM_SIZE + 1)}
+
+    def add(self, student_id: str, name: str):
+        """Index a student's name"""
+        self._add_lowered(student_id, name.lower())
+
+    def _add_lowered(self, student_id: str, lowered: str):
+        ordinal = len(self._ids)
+        self._ids.append(student_id)
+        self._names.append(lowered)
+        self._ordinals[student_id] = ordinal
+        postings = self._postings
+        for gram in self._grams(lowered):
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array("i")
+            posting.append(ordinal)
+
+    def remove(self, student_id: str):
+        """Drop a student's name from the index"""
+        ordinal = self._ordinals.pop(student_id, None)
+        if ordinal is None:
+            return
+        self._ids[ordinal] = None
+        self._names[ordinal] = None
+        if len(self._ids) > 2 * len(self._ordinals):
+            live = [(student_id, lowered) for student_id, lowered in zip(self._ids, self._names)
+                    if student_id is not None]
+            self.clear()
+            for student_id, lowered in live:
+                self._add_lowered(student_id, lowered)
+
+    def clear(self):
+        """Remove all names from the index"""
+        self._ids: List[Optional[str]] = []
+        self._names: List[Optional[str]] = []
+        self._ordinals: Dict[str, int] = {}
+        self._postings: Dict[str, array] = {}
+
+    def search(self, query: str) -> List[str]:
+        """
+        Find students whose name contains the query (case-insensitive)
+        Returns: matching IDs in the order the names were added
+        """
+        query = query.lower()
+        names = self._names
+        if len(query) < self.GRAM_SIZE:
+            candidates = range(len(names))
+        else:
+            postings = [self._postings.get(gram) for gram in self._grams(query)]
+            if not all(postings):
+                return []
+            candidates = min(postings, key=len)
+        return [self._ids[ordinal] for ordinal in candidates
+                if names[ordinal] is not None and query in names[ordinal]]
+
+
+class ReportStats:
+    """
+    Running totals behind generate_report
+    The StudentStore applies every change as a delta, so producing a
+    report costs O(1) regardless of the roster size
+    """
+
+    def __init__(self):
+        self.total_students = 0
+        self.passed_students = 0
+        self.total_average = 0.0
+        self.grade_distribution = {"A": 0, "B": 0, "C": 0, "D": 0, "F": 0}
+
+    @property
+    def failed_students(self) -> int:
+        return self.total_students - self.passed_students
+
+    def _apply(self, average: float, letter: str, delta: int):
+        """Count (delta=1) or uncount (delta=-1) one student's result"""
+        self.total_students += delta
+        if average >= 60:
+            self.passed_students += delta
+        self.total_average += delta * average
+        self.grade_distribution[letter] += delta
+
+    def add(self, student: Dict):
+        """Include a student's cached average in the totals"""
+        self._apply(student["average"], student["letter"], 1)
+
+    def remove(self, student: Dict):
+        """Take a student's cached average out of the totals"""
+        self._apply(student["average"], student["letter"], -1)
+
+    def copy(self) -> "ReportStats":
+        """Return an independent copy of the totals"""
+        stats = ReportStats()
+        stats.merge(self)
+        return stats
+
+    def merge(self, other: "ReportStats"):
+        """Add another set of totals (e.g. for a separate batch of students)"""
+        self.total_students += other.total_students
+        self.passed_students += other.passed_students
+        self.total_average += other.total_average
+        for letter, count in other.grade_distribution.items():
+            self.grade_distribution[letter] += count
+
+    @classmethod
+    def from_batch(cls, averages, letters, passed) -> "ReportStats":
+        """Build the totals from batch_grade results"""
+        np = numpy_module()
+        stats = cls()
+        stats.total_students = len(averages)
+        if np is None:
+            stats.passed_students = sum(passed)
+            stats.total_average = sum(averages)
+            for letter in letters:
+                stats.grade_distribution[letter] += 1
+        else:
+            stats.passed_students = int(np.count_nonzero(passed))
+            stats.total_average = float(np.sum(averages))
+            for letter in stats.grade_distribution:
+                stats.grade_distribution[letter] = int(np.count_nonzero(letters == letter))
+        return stats
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> "ReportStats":
+        """Build the totals with a full recompute from every grade list"""
+        stats = cls()
+        for student in records:
+            average = calculate_average(student["grades"])
+            stats._apply(average, get_letter_grade(average), 1)
+        return stats
+
+    def verify(self, records: Iterable[Dict]) -> List[str]:
+        """
+        Compare the running totals against a full recompute
+        Returns: a description of every mismatch (empty if consistent)
+        """
+        expected = ReportStats.from_records(records)
+        problems = []
+        for field in ("total_students", "passed_students"):
+            if getattr(self, field) != getattr(expected, field):
+                problems.append(f"{field}: running {getattr(self, field)}, "
+                                f"recomputed {getattr(expected, field)}")
+        # Sums of floats built from deltas can differ in the last few bits
+        if not math.isclose(self.total_average, expected.total_average,
+                            rel_tol=1e-9, abs_tol=1e-6):
+            problems.append(f"total_average: running {self.total_average}, "
+                            f"recomputed {expected.total_average}")
+        for letter, count in expected.grade_distribution.items():
+            if self.grade_distribution[letter] != count:
+                problems.append(f"grade {letter}: running "
+                                f"{self.grade_distribution[letter]}, recomputed {count}")
+        return problems
+
+
+class StoreEvents:
+    """
+    Change notifications shared by the student stores
+    Listeners are called as listener(event, student, *details) after every
+    change: "add", "remove", "add_grade" (grade), "add_grades" (grades),
+    "update_grade" (index, grade), "delete_grade" (index), and "clear",
+    "replace" or "extend" with student None when many students change at once
+
+    version counts the changes, so derived data such as the sort indexes
+    from sorted_ids can tell when it is out of date
+    """
+
+    version = 0
+
+    def subscribe(self, listener):
+        """Call listener after every change to this store"""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        """Stop calling a listener added with subscribe"""
+        self._listeners.remove(listener)
+
+    def _notify(self, event: str, student=None, *details):
+        self.version += 1
+        for listener in self._listeners:
+            listener(event, student, *details)
+
+    def transaction(self):
+        """Group many changes into one commit where the store supports it"""
+        return nullcontext()
+
+    def sorted_ids(self, key: Optional[str] = None) -> List[str]:
+        """
+        Return every student ID in roster order, or sorted by "id", "name"
+        or "average" (highest first), ties broken by ID
+        The index is built once and reused until the store changes, so
+        the returned list must not be modified
+        """
+        cached = self._sort_indexes.get(key)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        ids = self._build_sort_index(key)
+        self._sort_indexes[key] = (self.version, ids)
+        return ids
+
+    def _build_sort_index(self, key: Optional[str]) -> List[str]:
+        if key is None:
+            return [student["id"] for student in self]
+        sort_key = STUDENT_SORT_KEYS[key]
+        return [student_id for _, student_id in
+                sorted((sort_key(student), student["id"]) for student in self)]
+
+
+class StudentStore(StoreEvents):
+    """
+    Ordered collection of student records with an ID index
+    Keeps insertion order for display, a dict for O(1) lookup by ID and
+    a NameIndex for partial name searches, built on the first one
+
+    Each record also carries cached grade aggregates ("grade_sum",
+    "grade_count", "average" and "letter"), so grade changes must go
+    through add_grade, update_grade and delete_grade to keep them and the
+    store's ReportStats current
+    """
+
+    def __init__(self):
+        self._records: List[Dict] = []
+        self._by_id: Dict[str, Dict] = {}
+        self._names: Optional[NameIndex] = None
+        self._listeners = []
+        self._sort_indexes = {}
+        self.stats = ReportStats()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __contains__(self, student_id: str) -> bool:
+        return student_id in self._by_id
+
+    def get(self, student_id: str) -> Optional[Dict]:
+        """Return the student with the given ID, or None if not found"""
+        return self._by_id.get(student_id)
+
+    def search_name(self, query: str) -> List[Dict]:
+        """Return students whose name contains the query, in roster order"""
+        names = self._names
+        if names is None:
+            # Filled before it is published, so concurrent readers (see
+            # server.py) never search a half-built index
+            names = NameIndex()
+            for student in self._records:
+                names.add(student["id"], student["name"])
+            self._names = names
+        return [self._by_id[student_id] for student_id in names.search(query)]
+
+    def add(self, student: Dict) -> bool:
+        """
+        Add a student record to the end of the roster
+        Returns: False if the ID already exists, True otherwise
+        """
+        if student["id"] in self._by_id:
+            return False
+        student = self._as_record(student)
+        self._cache_grades(student)
+        self._records.append(student)
+        self._by_id[student["id"]] = student
+        if self._names is not None:
+            self._names.add(student["id"], student["name"])
+        self.stats.add(student)
+        self._notify("add", student)
+        return True
+
+    # List-style name so callers that append records directly keep working
+    append = add
+
+    def remove(self, student_id: str) -> Optional[Dict]:
+        """Remove a student by ID and return the removed record"""
+        student = self._by_id.pop(student_id, None)
+        if student is not None:
+            self._records.remove(student)
+            if self._names is not None:
+                self._names.remove(student_id)
+            self.stats.remove(student)
+            self._notify("remove", student)
+        return student
+
+    def clear(self):
+        """Remove all students"""
+        self._records = []
+        self._by_id = {}
+        self._names = None
+        self.stats = ReportStats()
+        self._notify("clear")
+
+    def replace(self, records: Iterable[Dict]) -> int:
+        """
+        Replace the whole roster in place (used when reloading from file)
+        Duplicate IDs are skipped, the first one wins
+        Returns: number of records kept
+        """
+        new_records = []
+        new_by_id = {}
+        new_stats = ReportStats()
+        for student in records:
+            if student["id"] in new_by_id:
+                continue
+            student = self._as_record(student)
+            self._cache_grades(student)
+            new_records.append(student)
+            new_by_id[student["id"]] = student
+            new_stats.add(student)
+        self._records = new_records
+        self._by_id = new_by_id
+        self._names = None
+        self.stats = new_stats
+        self._notify("replace")
+        return len(new_records)
+
+    @staticmethod
+    def _as_record(student) -> Dict:
+        """Copy records from other stores (e.g. StudentView) into a plain dict"""
+        if isinstance(student, dict):
+            return student
+        return {"id": student["id"], "name": student["name"], "grades": student["grades"]}
+
+    @staticmethod
+    def _set_grade_totals(student: Dict, grade_sum: float, grade_count: int):
+        """Store the grade aggregates and derive the average and letter grade"""
+        student["grade_sum"] = grade_sum
+        student["grade_count"] = grade_count
+        student["average"] = grade_sum / grade_count if grade_count else 0.0
+        student["letter"] = get_letter_grade(student["average"])
+
+    def _cache_grades(self, student: Dict):
+        """Compute the cached aggregates from a student's full grade list"""
+        grades = student["grades"]
+        self._set_grade_totals(student, sum(grades), len(grades))
+
+    def _change_grade_totals(self, student: Dict, grade_sum: float, grade_count: int):
+        """Update a student's cached aggregates and the report stats"""
+        self.stats.remove(student)
+        self._set_grade_totals(student, grade_sum, grade_count)
+        self.stats.add(student)
+
+    def add_grade(self, student: Dict, grade: float):
+        """Append a grade and update the cached aggregates in O(1)"""
+        student["grades"].append(grade)
+        self._change_grade_totals(student, student["grade_sum"] + grade,
+                                  student["grade_count"] + 1)
+        self._notify("add_grade", student, grade)
+
+    def add_grades(self, student: Dict, grades: List[float]):
+        """Append several grades, updating the cached aggregates once"""
+        grade_sum = student["grade_sum"]
+        for grade in grades:
+            grade_sum += grade
+        student["grades"].extend(grades)
+        self._change_grade_totals(student, grade_sum, student["grade_count"] + len(grades))
+        self._notify("add_grades", student, grades)
+
+    def update_grade(self, student: Dict, index: int, grade: float):
+        """
+        Replace the grade at index and update the cached aggregates
+        The sum is recomputed from the grades (O(k)): subtracting the old
+        grade would drift from calculate_average in the last bits
+        """
+        student["grades"][index] = grade
+        self._change_grade_totals(student, sum(student["grades"]), student["grade_count"])
+        self._notify("update_grade", student, index, grade)
+
+    def delete_grade(self, student: Dict, index: int) -> float:
+        """Remove the grade at index and return it, recomputing the cached sum"""
+        old_grade = student["grades"].pop(index)
+        self._change_grade_totals(student, sum(student["grades"]),
+                                  student["grade_count"] - 1)
+        self._notify("delete_grade", student, index)
+        return old_grade
+
+
+class StudentView:
+    """
+    Lightweight handle on one row of a ColumnarStudentStore
+    Supports the same student["id"], ["name"] and ["grades"] access as the
+    dict records, plus the cached aggregate keys. A view stays valid until
+    a student is removed from its store.
+    """
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "ColumnarStudentStore", row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, key: str):
+        return self._store._field(self._row, key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other) -> bool:
+        return (isinstance(other, StudentView)
+                and self._store is other._store and self._row == other._row)
+
+    def __hash__(self) -> int:
+        return hash((id(self._store), self._row))
+
+    def __repr__(self) -> str:
+        return f"StudentView({self['id']!r}, {self['name']!r}, {self['grades']!r})"
+
+
+class MappedSnapshot:
+    """
+    Read-only access to a binary roster snapshot through mmap
+    Nothing is parsed up front; IDs and names are decoded when asked for
+    and students are found by binary search over the ID order section.
+
+    File layout (native byte order, sections in this order):
+      header          magic, student count, grade count, string table
+                      size and the report totals (see HEADER)
+      string_offsets  2n+1 int64 offsets of ID 0, name 0, ID 1, ...
+      starts, counts  n int64 each, the slice of grades for every row
+      sums            n float64 grade sums
+      id_order        n int64 row numbers sorted by student ID
+      grades          every grade as float64
+      strings         UTF-8 IDs and names
+    """
+
+    MAGIC = b"SAMSNAP1"
+    # magic, students, grades, string bytes, total, passed, total average, A-F
+    HEADER = struct.Struct("=8sqqqqqd5q")
+
+    def __init__(self, filename: str):
+        with open(filename, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, count, grade_count, strings_size, total, passed, total_average,
+         *distribution) = self.HEADER.unpack_from(self._mmap, 0)
+        if magic != self.MAGIC:
+            raise ValueError(f"{filename} is not a student records snapshot")
+        
+        self.count = count
+        self.stats = ReportStats()
+        self.stats.total_students = total
+        self.stats.passed_students = passed
+        self.stats.total_average = total_average
+        self.stats.grade_distribution = dict(zip(self.stats.grade_distribution, distribution))
+        
+        view = memoryview(self._mmap)
+        position = self.HEADER.size
+        sections = []
+        for length, typecode in ((2 * count + 1, "q"), (count, "q"), (count, "q"),
+                                 (count, "d"), (count, "q"), (grade_count, "d")):
+            sections.append(view[position:position + 8 * length].cast(typecode))
+            position += 8 * length
+        (self.string_offsets, self.starts, self.counts,
+         self.sums, self.id_order, self.grades) = sections
+        self.strings = view[position:position + strings_size]
+
+    def _string(self, index: int) -> str:
+        offsets = self.string_offsets
+        return str(self.strings[offsets[index]:offsets[index + 1]], "utf-8")
+
+    def student_id(self, row: int) -> str:
+        return self._string(2 * row)
+
+    def student_name(self, row: int) -> str:
+        return self._string(2 * row + 1)
+
+    def find(self, student_id: str) -> Optional[int]:
+        """Return the row of a student ID in O(log n), or None"""
+        index = bisect_left(self.id_order, student_id, key=self.student_id)
+        if index < self.count and self.student_id(self.id_order[index]) == student_id:
+            return self.id_order[index]
+        return None
+
+
+class ColumnarStudentStore(StoreEvents):
+    """
+    Array-backed alternative to StudentStore with a much smaller footprint
+    IDs and names are UTF-8 text in one string table with an offsets
+    array, laid out like the snapshot's, and students are found through an
+    open-addressing hash table of row numbers. Every grade lives in one
+    contiguous array('d'); each row keeps the start, count and sum of its
+    grade slice. Records are handed out as StudentView objects. String
+    offsets and grade counts are 32-bit, which caps the string table at
+    4 GB.
+
+    A grade slice that has to grow is moved to the end of the buffer and
+    the old space is reclaimed once more than half the buffer is unused.
+    Removed rows are left as gaps until more than half the rows are gaps.
+    There is no name index: name searches scan the string table.
+
+    A store opened with open_snapshot reads straight from the
+    memory-mapped file and is only copied into regular arrays by the
+    first change, so opening it costs the same for any roster size.
+    """
+
+    # Hash table size for an empty store; it grows once two thirds are taken
+    MIN_SLOTS = 8
+
+    def __init__(self):
+        self._listeners = []
+        self._sort_indexes = {}
+        self._reset()
+
+    @classmethod
+    def open_snapshot(cls, filename: str) -> "ColumnarStudentStore":
+        """Open a binary snapshot written by save_snapshot without reading it"""
+        snapshot = MappedSnapshot(filename)
+        store = cls()
+        store._snapshot = snapshot
+        store._starts = snapshot.starts
+        store._counts = snapshot.counts
+        store._sums = snapshot.sums
+        store._grades = snapshot.grades
+        store.stats = snapshot.stats
+        return store
+
+    def _thaw(self):
+        """Copy a memory-mapped snapshot into regular columns before a change"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return
+        self._strings = bytearray(snapshot.strings)
+        self._string_offsets = array("I", snapshot.string_offsets)
+        self._counts = array("i", snapshot.counts)
+        for column, typecode in (("_starts", "q"), ("_sums", "d"), ("_grades", "d")):
+            copied = array(typecode)
+            copied.frombytes(getattr(self, column).cast("B"))
+            setattr(self, column, copied)
+        self._live = bytearray(b"\x01") * snapshot.count
+        self._size = snapshot.count
+        self._snapshot = None
+        self._rehash()
+
+    def clear(self):
+        """Remove all students"""
+        self._reset()
+        self._notify("clear")
+
+    def _reset(self):
+        """Empty every column"""
+        self._strings = bytearray()
+        self._string_offsets = array("I", [0])
+        self._live = bytearray()
+        self._size = 0
+        self._slots = array("i", bytes(4 * self.MIN_SLOTS))
+        self._used_slots = 0
+        self._starts = array("q")
+        self._counts = array("i")
+        self._sums = array("d")
+        self._grades = array("d")
+        self._dead_grades = 0
+        self._snapshot: Optional[MappedSnapshot] = None
+        self.stats = ReportStats()
+
+    def _key(self, row: int) -> bytes:
+        """Return a row's student ID as UTF-8 bytes"""
+        offsets = self._string_offsets
+        return bytes(self._strings[offsets[2 * row]:offsets[2 * row + 1]])
+
+    def _string(self, index: int) -> str:
+        offsets = self._string_offsets
+        return str(self._strings[offsets[index]:offsets[index + 1]], "utf-8")
+
+    def _find(self, key: bytes) -> Optional[int]:
+        """Return the live row whose UTF-8 student ID is key, or None"""
+        slots, live = self._slots, self._live
+        offsets, strings = self._string_offsets, self._strings
+        mask = len(slots) - 1
+        slot = hash(key) & mask
+        while slots[slot]:
+            row = slots[slot] - 1
+            if live[row] and strings[offsets[2 * row]:offsets[2 * row + 1]] == key:
+                return row
+            slot = (slot + 1) & mask
+        return None
+
+    def _place(self, row: int, key: bytes):
+        """
+        Put a row in the hash table, reusing the slot of a removed row
+        Slots hold row + 1 so that 0 marks an empty slot; a removed row's
+        slot stays taken until it is reused, so probing passes over it
+        """
+        slots, live = self._slots, self._live
+        mask = len(slots) - 1
+        slot = hash(key) & mask
+        while slots[slot] and live[slots[slot] - 1]:
+            slot = (slot + 1) & mask
+        if not slots[slot]:
+            self._used_slots += 1
+        slots[slot] = row + 1
+
+    def _rehash(self, extra: int = 0):
+        """Rebuild the hash table with room for the live rows plus extra"""
+        size = self.MIN_SLOTS
+        while size < 2 * (self._size + extra):
+            size *= 2
+        self._slots = array("i", bytes(4 * size))
+        self._used_slots = 0
+        for row, live in enumerate(self._live):
+            if live:
+                self._place(row, self._key(row))
+
+    def _reserve(self, extra: int):
+        """Grow the hash table before adding extra rows if it would pass 2/3 full"""
+        if 3 * (self._used_slots + extra) > 2 * len(self._slots):
+            self._rehash(extra)
+
+    def __len__(self) -> int:
+        if self._snapshot is not None:
+            return self._snapshot.count
+        return self._size
+
+    def __iter__(self):
+        if self._snapshot is not None:
+            for row in range(self._snapshot.count):
+                yield StudentView(self, row)
+            return
+        for row, live in enumerate(self._live):
+            if live:
+                yield StudentView(self, row)
+
+    def __contains__(self, student_id: str) -> bool:
+        return self._row_of(student_id) is not None
+
+    def _row_of(self, student_id: str) -> Optional[int]:
+        """Return the row holding a student ID, or None"""
+        if self._snapshot is not None:
+            return self._snapshot.find(student_id)
+        return self._find(student_id.encode("utf-8"))
+
+    def _field(self, row: int, key: str):
+        """Read one field of a row, as a dict record would return it"""
+        if key == "id":
+            if self._snapshot is not None:
+                return self._snapshot.student_id(row)
+            return self._string(2 * row)
+        if key == "name":
+            if self._snapshot is not None:
+                return self._snapshot.student_name(row)
+            return self._string(2 * row + 1)
+        if key == "grades":
+            start = self._starts[row]
+            return self._grades[start:start + self._counts[row]].tolist()
+        if key == "grade_sum":
+            return self._sums[row]
+        if key == "grade_count":
+            return self._counts[row]
+        if key in ("average", "letter"):
+            count = self._counts[row]
+            average = self._sums[row] / count if count else 0.0
+            return average if key == "average" else get_letter_grade(average)
+        raise KeyError(key)
+
+    def get(self, student_id: str) -> Optional[StudentView]:
+        """Return the student with the given ID, or None if not found"""
+        row = self._row_of(student_id)
+        return None if row is None else StudentView(self, row)
+
+    def search_name(self, query: str) -> List[StudentView]:
+        """
+        Return students whose name contains the query, in roster order
+        The lowercased string table is searched with bytes.find, and each
+        hit is mapped to its row by binary search over the offsets, so a
+        search needs no index and costs one pass over the table. Tables
+        with non-ASCII text compare decoded names instead, since
+        bytes.lower only lowercases ASCII.
+        """
+        query = query.lower()
+        if not query:
+            return list(self)
+        if self._snapshot is not None:
+            strings, offsets = self._snapshot.strings, self._snapshot.string_offsets
+            live = None
+        else:
+            strings, offsets, live = self._strings, self._string_offsets, self._live
+        text = bytes(strings)
+        if not text.isascii():
+            return [student for student in self if query in student["name"].lower()]
+        text = text.lower()
+        key = query.encode("utf-8")
+        matches = []
+        position = text.find(key)
+        while position >= 0:
+            slot = bisect_right(offsets, position) - 1
+            row = slot // 2
+            # Odd slots are names; a hit may also fall in an ID or run past the name
+            if slot % 2 and position + len(key) <= offsets[slot + 1] and (live is None or live[row]):
+                matches.append(StudentView(self, row))
+                position = text.find(key, offsets[slot + 1])
+            else:
+                position = text.find(key, position + 1)
+        return matches
+
+    def _append_strings(self, key: bytes, name: str):
+        """Add a row's ID and name to the string table"""
+        self._strings += key
+        self._string_offsets.append(len(self._strings))
+        self._strings += name.encode("utf-8")
+        self._string_offsets.append(len(self._strings))
+
+    def _append_row(self, student_id: str, name: str, grades: Iterable[float]) -> int:
+        """Store a new row at the end of every column and return its number"""
+        self._reserve(1)
+        row = len(self._live)
+        key = student_id.encode("utf-8")
+        self._append_strings(key, name)
+        self._live.append(1)
+        self._size += 1
+        start = len(self._grades)
+        self._grades.extend(grades)
+        self._starts.append(start)
+        self._counts.append(len(self._grades) - start)
+        self._sums.append(sum(self._grades[start:]))
+        self._place(row, key)
+        return row
+
+    def add(self, student: Dict) -> bool:
+        """
+        Add a student record to the end of the roster
+        Returns: False if the ID already exists, True otherwise
+        """
+        self._thaw()
+        if self._row_of(student["id"]) is not None:
+            return False
+        row = self._append_row(student["id"], student["name"], student["grades"])
+        self.stats.add(StudentView(self, row))
+        self._notify("add", StudentView(self, row))
+        return True
+
+    # List-style name so callers that append records directly keep working
+    append = add
+
+    def remove(self, student_id: str) -> Optional[Dict]:
+        """Remove a student by ID and return a copy of the removed record"""
+        self._thaw()
+        row = self._row_of(student_id)
+        if row is None:
+            return None
+        view = StudentView(self, row)
+        self.stats.remove(view)
+        removed = {"id": view["id"], "name": view["name"], "grades": view["grades"]}
+        self._live[row] = 0
+        self._size -= 1
+        self._dead_grades += self._counts[row]
+        self._counts[row] = 0
+        self._sums[row] = 0.0
+        if len(self._live) > 2 * self._size:
+            self._compact()
+        self._notify("remove", removed)
+        return removed
+
+    def replace(self, records: Iterable[Dict]) -> int:
+        """
+        Replace the whole roster in place (used when reloading from file)
+        Duplicate IDs are skipped, the first one wins. Another
+        ColumnarStudentStore (e.g. from BulkCSVReader) is adopted as is.
+        Returns: number of records kept
+        """
+        if not isinstance(records, ColumnarStudentStore):
+            staged = ColumnarStudentStore()
+            for student in records:
+                if staged._row_of(student["id"]) is None:
+                    row = staged._append_row(student["id"], student["name"], student["grades"])
+                    staged.stats.add(StudentView(staged, row))
+            records = staged
+        kept = {"_listeners": self._listeners, "_sort_indexes": {},
+                "version": self.version}
+        self.__dict__.update(records.__dict__)
+        self.__dict__.update(kept)
+        self._notify("replace")
+        return len(self)
+
+    def extend_columns(self, ids: List[str], names: List[str], offsets, sums, values,
+                       stats: ReportStats):
+        """
+        Append many rows at once from NumPy column data
+        ids must be new and unique; student i's grades are
+        values[offsets[i]:offsets[i + 1]] and sum to sums[i], and stats
+        holds the report totals for the new rows
+        """
+        np = numpy_module()
+        self._thaw()
+        self._reserve(len(ids))
+        row = len(self._live)
+        base = len(self._grades)
+        keys = [student_id.encode("utf-8") for student_id in ids]
+        for key, name in zip(keys, names):
+            self._append_strings(key, name)
+        self._live += b"\x01" * len(keys)
+        self._size += len(keys)
+        for new_row, key in enumerate(keys, row):
+            self._place(new_row, key)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        self._starts.frombytes((offsets[:-1] + base).tobytes())
+        self._counts.frombytes(np.diff(offsets).astype(np.intc).tobytes())
+        self._sums.frombytes(np.asarray(sums, dtype=np.float64).tobytes())
+        self._grades.frombytes(np.asarray(values, dtype=np.float64).tobytes())
+        self.stats.merge(stats)
+        self._notify("extend")
+
+    def grade_columns(self) -> Tuple:
+        """
+        Return (starts, counts, grades) for the live rows in roster order
+        Without removed rows the columns themselves are returned, uncopied
+        """
+        if self._snapshot is not None or len(self._live) == self._size:
+            return self._starts, self._counts, self._grades
+        rows = [row for row, live in enumerate(self._live) if live]
+        return (array("q", (self._starts[row] for row in rows)),
+                array("q", (self._counts[row] for row in rows)), self._grades)
+
+    def _compact(self):
+        """Drop removed rows and unused grade space, renumbering the rows"""
+        stats = self.stats
+        rows = [(view["id"], view["name"], view["grades"]) for view in self]
+        self._reset()
+        self._reserve(len(rows))
+        for student_id, name, grades in rows:
+            self._append_row(student_id, name, grades)
+        self.stats = stats
+
+    def _compact_grades(self):
+        """Rewrite the grade buffer without the space left by moved slices"""
+        grades = array("d")
+        for row in range(len(self._live)):
+            start, count = self._starts[row], self._counts[row]
+            self._starts[row] = len(grades)
+            grades.extend(self._grades[start:start + count])
+        self._grades = grades
+        self._dead_grades = 0
+
+    def _change_row(self, student: StudentView, grade_sum: float, grade_count: int):
+        """Update a row's sum and count along with the report stats"""
+        self.stats.remove(student)
+        self._sums[student._row] = grade_sum
+        self._counts[student._row] = grade_count
+        self.stats.add(student)
+
+    def _append_grades(self, student: StudentView, grades: List[float]):
+        """Append to a row's slice, moving the slice to the end if needed"""
+        self._thaw()
+        row = student._row
+        start, count = self._starts[row], self._counts[row]
+        if start + count != len(self._grades):
+            self._grades.extend(self._grades[start:start + count])
+            self._dead_grades += count
+            start = len(self._grades) - count
+            self._starts[row] = start
+        self._grades.extend(grades)
+        grade_sum = self._sums[row]
+        for grade in grades:
+            grade_sum += grade
+        self._change_row(student, grade_sum, count + len(grades))
+        if self._dead_grades * 2 > len(self._grades):
+            self._compact_grades()
+
+    def add_grade(self, student: StudentView, grade: float):
+        """Append a grade, moving the row's slice to the end if needed"""
+        self._append_grades(student, (grade,))
+        self._notify("add_grade", student, grade)
+
+    def add_grades(self, student: StudentView, grades: List[float]):
+        """Append several grades, moving the row's slice at most once"""
+        self._append_grades(student, grades)
+        self._notify("add_grades", student, grades)
+
+    def update_grade(self, student: StudentView, index: int, grade: float):
+        """Replace the grade at index and recompute the row's sum from its grades"""
+        self._thaw()
+        row = student._row
+        start, count = self._starts[row], self._counts[row]
+        if not -count <= index < count:
+            raise IndexError("grade index out of range")
+        self._grades[start + index % count] = grade
+        self._change_row(student, sum(self._grades[start:start + count]), count)
+        self._notify("update_grade", student, index, grade)
+
+    def delete_grade(self, student: StudentView, index: int) -> float:
+        """Remove the grade at index and return it, recomputing the row's sum"""
+        self._thaw()
+        row = student._row
+        start, count = self._starts[row], self._counts[row]
+        if not -count <= index < count:
+            raise IndexError("grade index out of range")
+        index %= count
+        old_grade = self._grades[start + index]
+        self._grades[start + index:start + count - 1] = self._grades[start + index + 1:start + count]
+        self._dead_grades += 1
+        self._change_row(student, sum(self._grades[start:start + count - 1]), count - 1)
+        self._notify("delete_grade", student, index)
+        return old_grade
+
+
+class SQLiteStudentStore(StoreEvents):
+    """
+    Student store kept in a SQLite database instead of in memory
+    Students and their grades live in normalized tables; lookups by ID use
+    the unique index, and every change is committed as a small transaction,
+    so edits never rewrite the roster. Each student row also stores its
+    grade sum, count, average and letter grade, which keeps reports down to
+    one GROUP BY over the students table.
+
+    Records are plain dicts read from the database; changes must go through
+    the store methods, which also update the dict they are given.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS students (
+            row INTEGER PRIMARY KEY,
+            id TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            name_key TEXT NOT NULL,
+            grade_sum REAL NOT NULL,
+            grade_count INTEGER NOT NULL,
+            average REAL NOT NULL,
+            letter TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS students_name ON students (name_key);
+        CREATE INDEX IF NOT EXISTS students_average ON students (average);
+        CREATE TABLE IF NOT EXISTS grades (
+            seq INTEGER PRIMARY KEY,
+            student INTEGER NOT NULL REFERENCES students (row) ON DELETE CASCADE,
+            grade REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS grades_student ON grades (student);
+    """
+    # Trigram full-text index over name_key for substring name searches,
+    # kept in sync with the students table by triggers. Needs SQLite 3.34+
+    # with FTS5; without it name searches scan the table.
+    NAME_SEARCH_SCHEMA = """
+        CREATE VIRTUAL TABLE students_names USING fts5(
+            name_key, content='students', content_rowid='row',
+            tokenize='trigram case_sensitive 1');
+        CREATE TRIGGER students_names_insert AFTER INSERT ON students BEGIN
+            INSERT INTO students_names (rowid, name_key) VALUES (new.row, new.name_key);
+        END;
+        CREATE TRIGGER students_names_delete AFTER DELETE ON students BEGIN
+            INSERT INTO students_names (students_names, rowid, name_key)
+            VALUES ('delete', old.row, old.name_key);
+        END;
+        CREATE TRIGGER students_names_update AFTER UPDATE OF name_key ON students BEGIN
+            INSERT INTO students_names (students_names, rowid, name_key)
+            VALUES ('delete', old.row, old.name_key);
+            INSERT INTO students_names (rowid, name_key) VALUES (new.row, new.name_key);
+        END;
+        INSERT INTO students_names (students_names) VALUES ('rebuild');
+    """
+    COLUMNS = "row, id, name, grade_sum, grade_count, average, letter"
+    # ORDER BY clauses matching StoreEvents.sorted_ids
+    SORT_ORDERS = {None: "row", "id": "id", "name": "name_key, id",
+                   "average": "average DESC, id"}
+
+    def __init__(self, filename: str = ":memory:"):
+        self.filename = filename
+        self._connection = None
+        self._connect_lock = threading.Lock()
+        self._name_search = False  # Set when the connection is opened
+        self._listeners = []
+        self._sort_indexes = {}
+        self._transaction_depth = 0
+
+    @property
+    def _db(self):
+        """
+        The database connection, opened on first use
+        Creating the store (at import time for SAMS_STORE=sqlite) neither
+        imports sqlite3 nor creates the database file
+        """
+        if self._connection is None:
+            with self._connect_lock:
+                if self._connection is None:
+                    import sqlite3
+                    # Server mode reads from worker threads; its lock keeps writes exclusive
+                    db = sqlite3.connect(self.filename, check_same_thread=False)
+                    db.execute("PRAGMA foreign_keys = ON")
+                    db.execute("PRAGMA journal_mode = WAL")
+                    db.executescript(self.SCHEMA)
+                    self._name_search = self._create_name_search(db)
+                    self._connection = db
+        return self._connection
+
+    def _create_name_search(self, db) -> bool:
+        """
+        Create the trigram name index (filled from existing rows) if missing
+        Returns: False when this SQLite has no FTS5 trigram tokenizer
+        """
+        import sqlite3
+        if db.execute("SELECT 1 FROM sqlite_master WHERE name = 'students_names'").fetchone():
+            return True
+        try:
+            db.executescript("BEGIN;" + self.NAME_SEARCH_SCHEMA + "COMMIT;")
+        except sqlite3.OperationalError:
+            if db.in_transaction:
+                db.rollback()
+            return False
+        return True
+
+    def close(self):
+        """Close the database connection, if it was opened"""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+
+    def __bool__(self) -> bool:
+        return self._db.execute("SELECT EXISTS (SELECT 1 FROM students)").fetchone()[0] == 1
+
+    def __iter__(self):
+        # Merge two ordered scans instead of running one grade query per student
+        grades = self._db.execute("SELECT student, grade FROM grades ORDER BY student, seq")
+        pending = grades.fetchone()
+        for row in self._db.execute(f"SELECT {self.COLUMNS} FROM students ORDER BY row"):
+            student_grades = []
+            while pending is not None and pending[0] <= row[0]:
+                if pending[0] == row[0]:
+                    student_grades.append(pending[1])
+                pending = grades.fetchone()
+            yield self._record(row, student_grades)
+
+    def __contains__(self, student_id: str) -> bool:
+        return self._db.execute("SELECT 1 FROM students WHERE id = ?",
+                                (student_id,)).fetchone() is not None
+
+    @contextmanager
+    def transaction(self):
+        """Commit the changes made inside as one transaction; nested uses join it"""
+        self._transaction_depth += 1
+        try:
+            if self._transaction_depth > 1:
+                yield
+            else:
+                with self._db:
+                    yield
+        finally:
+            self._transaction_depth -= 1
+
+    def _build_sort_index(self, key: Optional[str]) -> List[str]:
+        return [student_id for student_id, in self._db.execute(
+            f"SELECT id FROM students ORDER BY {self.SORT_ORDERS[key]}")]
+
+    @staticmethod
+    def _record(row: Tuple, grades: List[float]) -> Dict:
+        """Build a record dict from a students row and its grades"""
+        return {"id": row[1], "name": row[2], "grades": grades, "grade_sum": row[3],
+                "grade_count": row[4], "average": row[5], "letter": row[6]}
+
+    def _grades_of(self, row: int) -> List[float]:
+        return [grade for grade, in self._db.execute(
+            "SELECT grade FROM grades WHERE student = ? ORDER BY seq", (row,))]
+
+    def get(self, student_id: str) -> Optional[Dict]:
+        """Return the student with the given ID, or None if not found"""
+        row = self._db.execute(f"SELECT {self.COLUMNS} FROM students WHERE id = ?",
+                               (student_id,)).fetchone()
+        return None if row is None else self._record(row, self._grades_of(row[0]))
+
+    def search_name(self, query: str) -> List[Dict]:
+        """
+        Return students whose name contains the query, in roster order
+        Queries of three or more characters are answered by the trigram
+        index; shorter ones cannot be and scan name_key instead
+        """
+        query = query.lower()
+        db = self._db
+        if self._name_search and len(query) >= 3:
+            phrase = '"' + query.replace('"', '""') + '"'
+            rows = db.execute(
+                f"SELECT {self.COLUMNS} FROM students WHERE row IN "
+                "(SELECT rowid FROM students_names WHERE students_names MATCH ?) ORDER BY row",
+                (phrase,)).fetchall()
+        else:
+            rows = db.execute(
+                f"SELECT {self.COLUMNS} FROM students WHERE instr(name_key, ?) > 0 ORDER BY row",
+                (query,)).fetchall()
+        return [self._record(row, self._grades_of(row[0])) for row in rows]
+
+    @property
+    def stats(self) -> ReportStats:
+        """Report totals computed by SQL over the stored averages"""
+        stats = ReportStats()
+        for letter, count, passed, total in self._db.execute(
+                "SELECT letter, COUNT(*), SUM(average >= 60), TOTAL(average) "
+                "FROM students GROUP BY letter"):
+            stats.total_students += count
+            stats.passed_students += passed
+            stats.total_average += total
+            stats.grade_distribution[letter] = count
+        return stats
+
+    def _insert(self, student) -> bool:
+        """Insert one student and their grades, skipping an existing ID"""
+        grades = list(student["grades"])
+        grade_sum = sum(grades)
+        average = grade_sum / len(grades) if grades else 0.0
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO students (id, name, name_key, grade_sum, grade_count, "
+            "average, letter) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (student["id"], student["name"], student["name"].lower(), grade_sum,
+             len(grades), average, get_letter_grade(average)))
+        if not cursor.rowcount:
+            return False
+        self._db.executemany("INSERT INTO grades (student, grade) VALUES (?, ?)",
+                             zip(repeat(cursor.lastrowid), grades))
+        return True
+
+    def add(self, student: Dict) -> bool:
+        """
+        Add a student record to the end of the roster
+        Returns: False if the ID already exists, True otherwise
+        """
+        with self.transaction():
+            if not self._insert(student):
+                return False
+        self._notify("add", self.get(student["id"]))
+        return True
+
+    # List-style name so callers that append records directly keep working
+    append = add
+
+    def remove(self, student_id: str) -> Optional[Dict]:
+        """Remove a student by ID and return the removed record"""
+        student = self.get(student_id)
+        if student is not None:
+            with self.transaction():
+                self._db.execute("DELETE FROM students WHERE id = ?", (student_id,))
+            self._notify("remove", student)
+        return student
+
+    def clear(self):
+        """Remove all students"""
+        with self.transaction():
+            self._db.execute("DELETE FROM grades")
+            self._db.execute("DELETE FROM students")
+        self._notify("clear")
+
+    def replace(self, records: Iterable[Dict]) -> int:
+        """
+        Replace the whole roster in one transaction (used when reloading from file)
+        Duplicate IDs are skipped, the first one wins
+        Returns: number of records kept
+        """
+        kept = 0
+        with self.transaction():
+            self._db.execute("DELETE FROM grades")
+            self._db.execute("DELETE FROM students")
+            for student in records:
+                kept += self._insert(student)
+        self._notify("replace")
+        return kept
+
+    def _change_grade_totals(self, student: Dict, grade_sum: float, grade_count: int):
+        """Store a student's new aggregates in the row and the record"""
+        StudentStore._set_grade_totals(student, grade_sum, grade_count)
+        self._db.execute(
+            "UPDATE students SET grade_sum = ?, grade_count = ?, average = ?, letter = ? "
+            "WHERE id = ?",
+            (grade_sum, grade_count, student["average"], student["letter"], student["id"]))
+
+    def _grade_seq(self, student: Dict, index: int) -> int:
+        """Return the grades table key of a student's grade at index"""
+        count = student["grade_count"]
+        if not -count <= index < count:
+            raise IndexError("grade index out of range")
+        return self._db.execute(
+            "SELECT seq FROM grades WHERE student = "
+            "(SELECT row FROM students WHERE id = ?) ORDER BY seq LIMIT 1 OFFSET ?",
+            (student["id"], index % count)).fetchone()[0]
+
+    def add_grade(self, student: Dict, grade: float):
+        """Append a grade and update the stored aggregates"""
+        with self.transaction():
+            self._db.execute(
+                "INSERT INTO grades (student, grade) "
+                "SELECT row, ? FROM students WHERE id = ?", (grade, student["id"]))
+            student["grades"].append(grade)
+            self._change_grade_totals(student, student["grade_sum"] + grade,
+                                      student["grade_count"] + 1)
+        self._notify("add_grade", student, grade)
+
+    def add_grades(self, student: Dict, grades: List[float]):
+        """Append several grades with one aggregate update"""
+        with self.transaction():
+            row, = self._db.execute("SELECT row FROM students WHERE id = ?",
+                                    (student["id"],)).fetchone()
+            self._db.executemany("INSERT INTO grades (student, grade) VALUES (?, ?)",
+                                 zip(repeat(row), grades))
+            grade_sum = student["grade_sum"]
+            for grade in grades:
+                grade_sum += grade
+            student["grades"].extend(grades)
+            self._change_grade_totals(student, grade_sum, student["grade_count"] + len(grades))
+        self._notify("add_grades", student, grades)
+
+    def update_grade(self, student: Dict, index: int, grade: float):
+        """Replace the grade at index and update the stored aggregates"""
+        with self.transaction():
+            self._db.execute("UPDATE grades SET grade = ? WHERE seq = ?",
+                             (grade, self._grade_seq(student, index)))
+            student["grades"][index] = grade
+            self._change_grade_totals(student, sum(student["grades"]), student["grade_count"])
+        self._notify("update_grade", student, index, grade)
+
+    def delete_grade(self, student: Dict, index: int) -> float:
+        """Remove the grade at index and return it, updating the stored aggregates"""
+        with self.transaction():
+            self._db.execute("DELETE FROM grades WHERE seq = ?",
+                             (self._grade_seq(student, index),))
+            old_grade = student["grades"].pop(index)
+            self._change_grade_totals(student, sum(student["grades"]),
+                                      student["grade_count"] - 1)
+        self._notify("delete_grade", student, index)
+        return old_grade
+
+
+class SortedIndex:
+    """
+    Order-statistics index of student IDs sorted by a key function
+    Entries (key(student), id) are kept in sorted buckets of up to
+    2 * LOAD entries, with the bucket maxima for bisecting and a Fenwick
+    tree over the bucket sizes for positions. Updates, range lookups and
+    finding the k-th student cost O(log n) plus a short list shift inside
+    one bucket.
+
+    Built from a store, it subscribes to the store's change events and
+    moves a student whenever their key changes.
+    """
+
+    LOAD = 512
+
+    def __init__(self, key, store=None):
+        self.key = key
+        self._keys: Dict[str, Tuple] = {}
+        self._buckets: List[List[Tuple]] = []
+        self._maxes: List[Tuple] = []
+        self._tree: List[int] = [0]
+        self._store = store
+        if store is not None:
+            self.rebuild(store)
+            store.subscribe(self.record)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def rebuild(self, records: Iterable[Dict]):
+        """Index every record from scratch"""
+        self._keys = {student["id"]: (self.key(student), student["id"])
+                      for student in records}
+        ordered = sorted(self._keys.values())
+        self._buckets = [ordered[i:i + self.LOAD] for i in range(0, len(ordered), self.LOAD)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._build_tree()
+
+    def _build_tree(self):
+        tree = [0] * (len(self._buckets) + 1)
+        for i, bucket in enumerate(self._buckets, 1):
+            tree[i] += len(bucket)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, bucket: int, delta: int):
+        i = bucket + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _position(self, key: Tuple) -> int:
+        """Count the indexed keys that sort before key"""
+        bucket = bisect_left(self._maxes, key)
+        if bucket == len(self._buckets):
+            return len(self._keys)
+        position = bisect_left(self._buckets[bucket], key)
+        i = bucket
+        while i > 0:
+            position += self._tree[i]
+            i -= i & -i
+        return position
+
+    def _locate(self, position: int) -> Tuple[int, int]:
+        """Return the (bucket, offset) holding the key at a position"""
+        bucket = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            following = bucket + step
+            if following < len(self._tree) and self._tree[following] <= position:
+                bucket = following
+                position -= self._tree[following]
+            step >>= 1
+        return bucket, position
+
+    def _insert(self, key: Tuple):
+        if not self._buckets:
+            self._buckets, self._maxes = [[key]], [key]
+            self._build_tree()
+            return
+        i = min(bisect_left(self._maxes, key), len(self._buckets) - 1)
+        bucket = self._buckets[i]
+        insort(bucket, key)
+        self._maxes[i] = bucket[-1]
+        if len(bucket) > 2 * self.LOAD:
+            self._buckets[i:i + 1] = [bucket[:self.LOAD], bucket[self.LOAD:]]
+            self._maxes[i:i + 1] = [bucket[self.LOAD - 1], bucket[-1]]
+            self._build_tree()
+        else:
+            self._tree_add(i, 1)
+
+    def _discard(self, key: Tuple):
+        i = bisect_left(self._maxes, key)
+        bucket = self._buckets[i]
+        del bucket[bisect_left(bucket, key)]
+        if bucket:
+            self._maxes[i] = bucket[-1]
+            self._tree_add(i, -1)
+        else:
+            del self._buckets[i]
+            del self._maxes[i]
+            self._build_tree()
+
+    def update(self, student: Dict):
+        """Add a student or move them to the position of their current key"""
+        key = (self.key(student), student["id"])
+        old_key = self._keys.get(student["id"])
+        if old_key == key:
+            return
+        if old_key is not None:
+            self._discard(old_key)
+        self._keys[student["id"]] = key
+        self._insert(key)
+
+    def remove(self, student_id: str):
+        """Drop a student from the index"""
+        key = self._keys.pop(student_id, None)
+        if key is not None:
+            self._discard(key)
+
+    def record(self, event: str, student, *details):
+        """Store listener that keeps the index in step with the roster"""
+        if event == "remove":
+            self.remove(student["id"])
+        elif student is not None:
+            self.update(student)
+        elif event == "clear":
+            self.rebuild([])
+        else:
+            self.rebuild(self._store)
+
+    def _slice(self, start: int, stop: int) -> List[str]:
+        """Return the IDs at positions start to stop, in key order"""
+        ids = []
+        if start >= stop:
+            return ids
+        bucket, offset = self._locate(start)
+        while len(ids) < stop - start and bucket < len(self._buckets):
+            ids.extend(student_id for _, student_id in
+                       self._buckets[bucket][offset:offset + stop - start - len(ids)])
+            bucket, offset = bucket + 1, 0
+        return ids
+
+    def between(self, low, high) -> List[str]:
+        """IDs of the students with low <= key < high, in key order"""
+        return self._slice(self._position((low,)), self._position((high,)))
+
+    def count_between(self, low, high) -> int:
+        """Number of students with low <= key < high, without reading them"""
+        return max(self._position((high,)) - self._position((low,)), 0)
+
+    def entry_of(self, student_id: str) -> Tuple:
+        """Return a student's (key, id) entry, which sorts in index order"""
+        return self._keys[student_id]
+
+    def key_of(self, student_id: str):
+        """Return a student's indexed key"""
+        return self._keys[student_id][0]
+
+
+class RankIndex(SortedIndex):
+    """
+    SortedIndex of students by average, highest first
+    Adds top-K, class rank and percentile queries and average ranges
+    """
+
+    def __init__(self, store=None):
+        super().__init__(lambda student: -student["average"], store)
+
+    def average_between(self, low: float = -math.inf, high: float = math.inf) -> List[str]:
+        """IDs of the students with low <= average < high, highest first"""
+        return self.between(math.nextafter(-high, math.inf), math.nextafter(-low, math.inf))
+
+    def top(self, k: int) -> List[str]:
+        """IDs of the k students with the highest averages, best first"""
+        return self._slice(0, min(k, len(self)))
+
+    def bottom(self, k: int) -> List[str]:
+        """IDs of the k students with the lowest averages, lowest first"""
+        return self._slice(max(len(self) - k, 0), len(self))[::-1]
+
+    def rank(self, student_id: str) -> Optional[int]:
+        """
+        Class rank of a student: 1 + the number of students with a higher
+        average, so equal averages share a rank
+        Returns: None if the student is not indexed
+        """
+        key = self._keys.get(student_id)
+        if key is None:
+            return None
+        return self._position((key[0],)) + 1
+
+    def percentile(self, student_id: str) -> Optional[float]:
+        """
+        Percentile rank of a student's average: the share of students below
+        it, counting students with the same average as half below
+        Returns: None if the student is not indexed
+        """
+        key = self._keys.get(student_id)
+        if key is None:
+            return None
+        higher = self._position((key[0],))
+        not_lower = self._position((math.nextafter(key[0], math.inf),))
+        lower = len(self) - not_lower
+        return (lower + (not_lower - higher) / 2) / len(self) * 100
+
+
+class Journal:
+    """
+    Append-only write-ahead log of roster changes
+    Subscribed to the student store, it turns every change into one JSON
+    line. Saving appends the pending lines, so its cost follows the number
+    of changes rather than the roster size, and loading replays them on
+    top of the roster file.
+
+    The first line names the roster file the log applies to, with that
+    file's size, modification time and inode. Once the roster file is
+    rewritten (by compaction or a full save) an old log no longer matches
+    and is moved aside to a .stale file, so no change is ever applied twice.
+    """
+
+    # Fold the log into the roster file once it has more entries than this
+    # or than the roster has students, whichever is larger
+    COMPACT_AFTER = 1000
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.base: Optional[str] = None
+        self.pending: List[str] = []
+        self.entries = 0
+        self.replaying = False
+        # Without a log matching the roster file the next save must be full
+        self.needs_compaction = True
+        # Entries in a log found not to match its roster file by replay()
+        self.discarded = 0
+
+    @staticmethod
+    def _file_identity(filename: str) -> Optional[List[int]]:
+        try:
+            info = os.stat(filename)
+        except FileNotFoundError:
+            return None
+        return [info.st_size, info.st_mtime_ns, info.st_ino]
+
+    def record(self, event: str, student, *details):
+        """Store listener that queues one change"""
+        if self.replaying:
+            return
+        if event == "add":
+            entry = {"op": "add", "id": student["id"], "name": student["name"],
+                     "grades": list(student["grades"])}
+        elif event == "remove":
+            entry = {"op": "remove", "id": student["id"]}
+        elif event == "add_grade":
+            entry = {"op": "add_grade", "id": student["id"], "grade": details[0]}
+        elif event == "add_grades":
+            entry = {"op": "add_grades", "id": student["id"], "grades": list(details[0])}
+        elif event == "update_grade":
+            entry = {"op": "update_grade", "id": student["id"],
+                     "index": details[0], "grade": details[1]}
+        elif event == "delete_grade":
+            entry = {"op": "delete_grade", "id": student["id"], "index": details[0]}
+        else:
+            # Bulk changes are not logged, the next save writes the whole roster
+            self.pending = []
+            self.needs_compaction = True
+            return
+        self.pending.append(json.dumps(entry))
+
+    def should_compact(self, base_filename: str, roster_size: int) -> bool:
+        """Whether the next save has to write the full roster file"""
+        return (self.needs_compaction or self.base != base_filename
+                or self.entries + len(self.pending) > max(self.COMPACT_AFTER, roster_size))
+
+    def flush(self) -> int:
+        """Append the pending changes to the log and fsync it; returns how many"""
+        count = len(self.pending)
+        if count:
+            with open(self.filename, "a") as file:
+                file.write("\n".join(self.pending) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            self.entries += count
+            self.pending = []
+        return count
+
+    def cut(self):
+        """
+        Mark the roster as copied for a full save
+        The copy holds every change queued so far, so they leave the queue;
+        changes made while the copy is written stay queued for the new log.
+        """
+        self.pending = []
+        self.needs_compaction = False
+
+    def start(self, base_filename: str, keep_pending: bool = False):
+        """
+        Begin a new log for a freshly written roster file
+        keep_pending: keep the changes queued since cut() instead of
+                      starting empty
+        """
+        header = {"journal": 1, "base": base_filename,
+                  "identity": self._file_identity(base_filename)}
+        with atomic_open(self.filename, "w") as file:
+            file.write(json.dumps(header) + "\n")
+        self.base = base_filename
+        self.entries = 0
+        if not keep_pending:
+            self.cut()
+
+    def replay(self, store, base_filename: str) -> int:
+        """
+        Apply the logged changes to a store just loaded from base_filename
+        Returns: number of changes applied
+        """
+        self.pending = []
+        self.entries = 0
+        self.needs_compaction = True
+        self.discarded = 0
+        if not os.path.exists(self.filename):
+            return 0
+        
+        applied = 0
+        with open(self.filename) as file:
+            try:
+                header = json.loads(file.readline())
+            except ValueError:
+                header = {}
+            if (header.get("base") != base_filename
+                    or header.get("identity") != self._file_identity(base_filename)):
+                # Written for another roster file: keep it aside rather than lose it
+                self.discarded = sum(1 for line in file if line.strip())
+                file.close()
+                os.replace(self.filename, self.filename + ".stale")
+                return 0
+            
+            self.replaying = True
+            try:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn final write; the next save rewrites everything
+                        self.entries = applied
+                        return applied
+                    self._apply(store, entry)
+                    applied += 1
+            finally:
+                self.replaying = False
+        
+        self.base = base_filename
+        self.entries = applied
+        self.needs_compaction = False
+        return applied
+
+    @staticmethod
+    def _apply(store, entry: Dict):
+        """Perform one logged change on the store"""
+        op = entry["op"]
+        if op == "add":
+            store.add({"id": entry["id"], "name": entry["name"], "grades": entry["grades"]})
+            return
+        if op == "remove":
+            store.remove(entry["id"])
+            return
+        student = store.get(entry["id"])
+        if student is None:
+            return
+        if op == "add_grade":
+            store.add_grade(student, entry["grade"])
+        elif op == "add_grades":
+            store.add_grades(student, entry["grades"])
+        elif op == "update_grade":
+            store.update_grade(student, entry["index"], entry["grade"])
+        elif op == "delete_grade":
+            store.delete_grade(student, entry["index"])
+
+
+class BackgroundSaver:
+    """
+    Writes roster files on a worker thread so the menu never waits
+    Save requests made while a write is running are coalesced: only the
+    most recent roster is written once the current write finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._pending: Optional[Tuple] = None
+        self._busy = False
+        self._thread: Optional[threading.Thread] = None
+        self.last_saved: Optional[float] = None
+        self.last_filename: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.coalesced = 0
+
+    def request(self, filename: str, file_format: str, records: List[Dict],
+                stats: ReportStats):
+        """Queue a save of a copied roster (see copy_roster) and return at once"""
+        with self._lock:
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = (filename, file_format, records, stats)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="roster-saver",
+                                                daemon=True)
+                self._thread.start()
+            self._changed.notify_all()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while self._pending is None:
+                    self._changed.wait()
+                filename, file_format, records, stats = self._pending
+                self._pending = None
+                self._busy = True
+            try:
+                write_roster_file(filename, file_format, records, stats)
+                error = None
+            except Exception as e:
+                error = str(e)
+            with self._lock:
+                self._busy = False
+                self.last_error = error
+                if error is None:
+                    self.last_saved = time.time()
+                    self.last_filename = filename
+                self._changed.notify_all()
+
+    @property
+    def busy(self) -> bool:
+        """Whether a save is queued or being written"""
+        with self._lock:
+            return self._busy or self._pending is not None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every requested save has been written
+        Returns: False if the timeout expired first
+        """
+        with self._lock:
+            return self._changed.wait_for(
+                lambda: not self._busy and self._pending is None, timeout)
+
+    def status(self) -> str:
+        """One line describing the last completed save"""
+        with self._lock:
+            if self.last_error:
+                return f"Last save failed: {self.last_error}"
+            if self.last_saved is None:
+                return "Not saved this session"
+            saved_at = time.strftime("%H:%M:%S", time.localtime(self.last_saved))
+            return f"Last saved: {saved_at} ({self.last_filename})"
+
+
+class Metrics:
+    """
+    Timings and file traffic recorded by @instrumented functions
+    Every call is counted and added to the cumulative time; percentiles are
+    taken over the last SAMPLE_SIZE calls of each function. Updates are
+    locked because saves run on the saver thread.
+    """
+
+    SAMPLE_SIZE = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Dict] = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.started = time.time()
+        # Set to profile the next instrumented call made from the menu
+        self.profile_next = False
+        self.last_profile: Optional[Dict] = None
+
+    def record(self, name: str, seconds: float):
+        """Add one call of name that took seconds"""
+        with self._lock:
+            calls = self._calls.get(name)
+            if calls is None:
+                calls = self._calls[name] = {"count": 0, "total": 0.0,
+                                             "recent": deque(maxlen=self.SAMPLE_SIZE)}
+            calls["count"] += 1
+            calls["total"] += seconds
+            calls["recent"].append(seconds)
+
+    def add_bytes(self, read: int = 0, written: int = 0):
+        """Count bytes read from or written to roster files"""
+        with self._lock:
+            self.bytes_read += read
+            self.bytes_written += written
+
+    def summary(self) -> Dict:
+        """Counts, cumulative time and p50/p99 latency (ms) for every function"""
+        with self._lock:
+            functions = {}
+            for name, calls in sorted(self._calls.items()):
+                recent = sorted(calls["recent"])
+                percentile = lambda p: recent[min(int(p * len(recent)), len(recent) - 1)] * 1000
+                functions[name] = {"calls": calls["count"],
+                                   "total_ms": round(calls["total"] * 1000, 3),
+                                   "p50_ms": round(percentile(0.50), 3),
+                                   "p99_ms": round(percentile(0.99), 3)}
+            return {"since": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+                    "functions": functions, "bytes_read": self.bytes_read,
+                    "bytes_written": self.bytes_written}
+
+    def profile(self, name: str, func, args, kwargs):
+        """Run one call under cProfile and tracemalloc and keep the results"""
+        import cProfile
+        import pstats
+        import tracemalloc
+        
+        profiler = cProfile.Profile()
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            self.record(name, time.perf_counter() - start)
+            _, peak = tracemalloc.get_traced_memory()
+            allocations = tracemalloc.take_snapshot().statistics("lineno")[:10]
+            if not tracing:
+                tracemalloc.stop()
+            profiler.dump_stats(PROFILE_FILE)
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(15)
+            self.last_profile = {"function": name, "peak_memory_bytes": peak,
+                                 "profile": report.getvalue(),
+                                 "allocations": [str(stat) for stat in allocations]}
+
+
+def instrumented(func):
+    """Record the calls of func in metrics while instrumentation is on"""
+    name = func.__name__
+    
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if metrics is None:
+            return func(*args, **kwargs)
+        if metrics.profile_next and threading.current_thread() is threading.main_thread():
+            metrics.profile_next = False
+            return metrics.profile(name, func, args, kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.record(name, time.perf_counter() - start)
+    return wrapper
+
+
+def count_file_bytes(filename: str, read: bool):
+    """Add a roster file's size to the bytes read or written, if instrumented"""
+    if metrics is not None and os.path.exists(filename):
+        size = os.path.getsize(filename)
+        metrics.add_bytes(read=size if read else 0, written=0 if read else size)
+
+
+class LRUCache:
+    """
+    Bounded mapping that evicts the least recently used entry
+    hits and misses count the lookups made with get
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the value cached for key (now the most recent), or None"""
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Cache value for key, evicting the least recently used entry if full"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def discard(self, key):
+        """Drop key if it is cached"""
+        self._entries.pop(key, None)
+
+    def discard_where(self, predicate):
+        """Drop every entry for which predicate(key, value) is true"""
+        for key in [key for key, value in self._entries.items() if predicate(key, value)]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        """Size and hit/miss counts"""
+        lookups = self.hits + self.misses
+        return {"entries": len(self._entries), "capacity": self.capacity,
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0}
+
+
+class StudentViewCache:
+    """
+    Rendered detail views by student ID and name search results by query
+    Subscribes to the store and drops only the entries a change affects:
+    grade changes drop that student's view, an added student drops the
+    searches its name matches, a removed student drops its view and the
+    searches that found it, and replacing the roster (a load) drops all.
+    Search results are kept as IDs, so grade changes never touch them.
+    """
+
+    def __init__(self, store, detail_capacity: int = 512, search_capacity: int = 256):
+        self.store = store
+        self.details = LRUCache(detail_capacity)
+        self.searches = LRUCache(search_capacity)
+        store.subscribe(self.update)
+
+    def detail(self, student) -> str:
+        """The student's rendered detail view (see render_student_details)"""
+        text = self.details.get(student["id"])
+        if text is None:
+            text = render_student_details(student)
+            self.details.put(student["id"], text)
+        return text
+
+    def search(self, query: str) -> Tuple[str, ...]:
+        """IDs of the students whose name contains query, in roster order"""
+        query = query.strip().lower()
+        ids = self.searches.get(query)
+        if ids is None:
+            ids = tuple(student["id"] for student in self.store.search_name(query))
+            self.searches.put(query, ids)
+        return ids
+
+    def update(self, event: str, student, *details):
+        """Store listener: invalidate what the change affects"""
+        if student is None:  # clear, replace or extend
+            self.details.clear()
+            self.searches.clear()
+        elif event == "add":
+            name = student["name"].lower()
+            self.searches.discard_where(lambda query, ids: query in name)
+        elif event == "remove":
+            self.details.discard(student["id"])
+            self.searches.discard_where(lambda query, ids: student["id"] in ids)
+        else:  # A grade changed
+            self.details.discard(student["id"])
+
+    def close(self):
+        """Stop following the store"""
+        self.store.unsubscribe(self.update)
+
+    def stats(self) -> Dict:
+        return {"details": self.details.stats(), "searches": self.searches.stats()}
+
+
+# Database used by the "sqlite" store
+DATABASE_FILE = "student_records.db"
+# Storage backends selectable with the SAMS_STORE environment variable
+STORE_BACKENDS = {"dict": StudentStore, "columnar": ColumnarStudentStore,
+                  "sqlite": lambda: SQLiteStudentStore(DATABASE_FILE)}
 
 # Global variables for storing data
-students: List[Dict] = []
+students = STORE_BACKENDS.get(os.environ.get("SAMS_STORE", "dict"), StudentStore)()
 current_user: Optional[Dict] = None
+# Check the running report statistics against a full recompute on every report
+VERIFY_REPORT_STATS = os.environ.get("SAMS_VERIFY_STATS") == "1"
+# Roster files: "csv" keeps the roster in CSV_FILE, "snapshot" in the
+# memory-mapped binary SNAPSHOT_FILE (CSV stays available for import/export).
+# Only the columnar store opens a snapshot without copying it
+CSV_FILE = "student_records.csv"
+SNAPSHOT_FILE = "student_records.snapshot"
+DATA_FORMAT = os.environ.get("SAMS_FORMAT", "csv")
+# The process umask, read once at startup (reading it means setting it);
+# atomic_open applies it to its temporary files
+FILE_UMASK = os.umask(0o022)
+os.umask(FILE_UMASK)
+# Processes used to parse large CSV rosters (see ShardedCSVReader)
+LOAD_WORKERS = int(os.environ.get("SAMS_LOAD_WORKERS", os.cpu_count() or 1))
+# With SAMS_JOURNAL=1 saves append changes to JOURNAL_FILE instead of
+# rewriting the roster file every time
+JOURNAL_FILE = "student_records.journal"
+journal: Optional[Journal] = None
+if os.environ.get("SAMS_JOURNAL") == "1":
+    journal = Journal(JOURNAL_FILE)
+    students.subscribe(journal.record)
+# Call timings collected by @instrumented functions; None unless SAMS_METRICS=1
+# or turned on from the hidden "m" menu option
+metrics: Optional[Metrics] = Metrics() if os.environ.get("SAMS_METRICS") == "1" else None
+METRICS_FILE = "sams_metrics.json"
+PROFILE_FILE = "sams_profile.prof"
+# Set once the saved roster has been read (main() defers this to the first
+# menu action that needs it, see ROSTER_CHOICES)
+roster_opened = False
+# Writes full roster saves from the menu in the background
+saver = BackgroundSaver()
+atexit.register(saver.wait)
+# Ranking index, built by get_rank_index the first time rankings are shown
+rank_index: Optional[RankIndex] = None
+# Name order index for prefix filters, built by get_name_prefix_index
+name_prefix_index: Optional[SortedIndex] = None
+# Cached detail views and name searches, built by get_view_cache
+view_cache: Optional[StudentViewCache] = None
 users_db = {
     "admin": {"password": "admin123", "role": "admin"},
     "user": {"password": "user123", "role": "user"}
@@ -21,8 +2010,25 @@ users_db = {
 
 
 def clear_screen():
-    """Clear the terminal screen"""
-    os.system('cls' if os.name == 'nt' else 'clear')
+    """Clear the terminal screen (nothing to clear when output is not a terminal)"""
+    if not sys.stdout.isatty():
+        return
+    if os.name == 'nt':
+        os.system('cls')
+    else:
+        sys.stdout.write("\033[H\033[2J")
+        sys.stdout.flush()
+
+
+def authenticate(username: str, password: str) -> Optional[Dict]:
+    """
+    Check a username and password against users_db
+    Returns: the user for current_user, or None if the credentials are wrong
+    """
+    user = users_db.get(username)
+    if user is None or user["password"] != password:
+        return None
+    return {"username": username, "role": user["role"]}
 
 
 def login_system() -> bool:
@@ -30,6 +2036,7 @@ def login_system() -> bool:
     Handle user authentication
     Returns: True if login successful, False otherwise
     """
+    import getpass
     global current_user
     print("=" * 50)
     print("Student Academic Management System - Login")
@@ -40,8 +2047,8 @@ def login_system() -> bool:
         username = input("Username: ")
         password = getpass.getpass("Password: ")
         
-        if username in users_db and users_db[username]["password"] == password:
-            current_user = {"username": username, "role": users_db[username]["role"]}
+        current_user = authenticate(username, password)
+        if current_user is not None:
             print(f"\nLogin successful! Welcome {username} ({current_user['role']})")
             input("\nPress Enter to continue...")
             return True
@@ -56,6 +2063,7 @@ def login_system() -> bool:
     return False
 
 
+@instrumented
 def add_student():
     """Add a new student to the system"""
     if current_user["role"] != "admin":
@@ -68,10 +2076,9 @@ def add_student():
     student_id = input("Enter Student ID (e.g., S1001): ").strip()
     
     # Check if ID already exists
-    for student in students:
-        if student["id"] == student_id:
-            print(f"\nError: Student ID {student_id} already exists!")
-            return
+    if student_id in students:
+        print(f"\nError: Student ID {student_id} already exists!")
+        return
     
     name = input("Enter Student Name: ").strip()
     
@@ -106,10 +2113,11 @@ def add_student():
         "grades": grades
     }
     
-    students.append(student)
+    students.add(student)
     print(f"\nStudent {name} added successfully!")
 
 
+@instrumented
 def search_student():
     """Search for a student by ID or name"""
     print("\n--- Search Student ---")
@@ -120,186 +2128,1332 @@ def search_student():
     
     if choice == "1":
         search_id = input("Enter Student ID: ").strip()
-        found = False
+        student = students.get(search_id)
         
-        for student in students:
-            if student["id"] == search_id:
-                display_student_details(student)
-                found = True
-                break
-        
-        if not found:
+        if student:
+            display_student_details(student)
+        else:
             print(f"\nNo student found with ID: {search_id}")
     
     elif choice == "2":
         search_name = input("Enter Student Name (partial match allowed): ").strip().lower()
-        found_students = []
-        
-        for student in students:
-            if search_name in student["name"].lower():
-                found_students.append(student)
+        found_students = get_view_cache().search(search_name)
         
         if found_students:
             print(f"\nFound {len(found_students)} student(s):")
-            for student in found_students:
-                display_student_details(student)
+            cache = get_view_cache()
+            write_lines(cache.detail(students.get(student_id)) for student_id in found_students)
         else:
             print(f"\nNo students found matching: {search_name}")
     else:
         print("\nInvalid choice!")
 
 
-def display_student_details(student: Dict):
-    """Display detailed information about a student"""
-    print(f"\n{'='*40}")
-    print(f"ID: {student['id']}")
-    print(f"Name: {student['name']}")
-    print(f"Grades: {', '.join(map(str, student['grades']))}")
-    
-    avg = calculate_average(student['grades'])
-    status = "Pass" if avg >= 60 else "Fail"
-    grade_letter = get_letter_grade(avg)
+def render_student_details(student: Dict) -> str:
+    """Format detailed information about a student"""
+    avg = student['average']
+    status = "Pass" if avg >= 60 else "Fail"
+    return (f"\n{'='*40}\n"
+            f"ID: {student['id']}\n"
+            f"Name: {student['name']}\n"
+            f"Grades: {', '.join(map(str, student['grades']))}\n"
+            f"Average: {avg:.2f}\n"
+            f"Letter Grade: {student['letter']}\n"
+            f"Status: {status}\n"
+            f"{'='*40}\n")
+
+
+def display_student_details(student: Dict):
+    """Display detailed information about a student"""
+    sys.stdout.write(get_view_cache().detail(student))
+
+
+@instrumented
+def calculate_average(grades: List[float]) -> float:
+    """Calculate average of grades"""
+    if not grades:
+        return 0.0
+    return sum(grades) / len(grades)
+
+
+def get_letter_grade(average: float) -> str:
+    """Convert average to letter grade"""
+    if average >= 90:
+        return "A"
+    elif average >= 80:
+        return "B"
+    elif average >= 70:
+        return "C"
+    elif average >= 60:
+        return "D"
+    else:
+        return "F"
+
+
+# Letter grade cutoffs used by the batch engine, must match get_letter_grade
+LETTER_CUTOFFS = (60, 70, 80, 90)
+LETTERS = ("F", "D", "C", "B", "A")
+# Sums of grades that are multiples of 2**-20 are exact in any order as long
+# as they stay below this bound, so the vectorized sum equals Python's sum()
+EXACT_SUM_SCALE = 2.0 ** 20
+EXACT_SUM_LIMIT = 2.0 ** 32
+
+
+def roster_grade_arrays(records: Iterable[Dict]) -> Tuple:
+    """
+    Flatten a roster's grades into CSR form
+    Returns: (values, offsets) where student i's grades are
+             values[offsets[i]:offsets[i + 1]]
+    """
+    np = numpy_module()
+    values = []
+    offsets = [0]
+    for student in records:
+        values.extend(student["grades"])
+        offsets.append(len(values))
+    if np is None:
+        return values, offsets
+    return np.array(values, dtype=np.float64), np.array(offsets, dtype=np.int64)
+
+
+def segment_sums(values, offsets):
+    """
+    Sum each student's slice of a CSR grade array with NumPy
+    Returns: one sum per student, equal to Python's sum() over the slice
+    """
+    np = numpy_module()
+    values = np.asarray(values, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    nonempty = counts > 0
+    starts = offsets[:-1][nonempty]
+    
+    sums = np.zeros(len(counts))
+    if not len(starts):
+        return sums
+    sums[nonempty] = np.add.reduceat(values, starts)
+    scaled = values * EXACT_SUM_SCALE
+    off_grid = (scaled != np.floor(scaled)).astype(np.int64)
+    inexact = np.zeros(len(counts), dtype=bool)
+    inexact[nonempty] = ((np.add.reduceat(off_grid, starts) > 0)
+                         | (np.add.reduceat(np.abs(values), starts) >= EXACT_SUM_LIMIT))
+    
+    # Rows whose sum could depend on summation order use Python's sum()
+    for i in np.flatnonzero(inexact):
+        sums[i] = sum(values[offsets[i]:offsets[i + 1]].tolist())
+    return sums
+
+
+def grade_sums(sums, counts) -> Tuple:
+    """
+    Turn per-student grade sums and counts into averages and letter grades
+    Returns: (averages, letters, passed) NumPy arrays
+    """
+    np = numpy_module()
+    counts = np.asarray(counts)
+    averages = np.divide(sums, counts, out=np.zeros(len(counts)), where=counts > 0)
+    letter_index = np.searchsorted(np.array(LETTER_CUTOFFS, dtype=np.float64),
+                                   averages, side="right")
+    letters = np.array(LETTERS)[letter_index]
+    return averages, letters, averages >= 60
+
+
+def batch_grade(values, offsets) -> Tuple:
+    """
+    Compute averages, letter grades and pass/fail for a whole roster
+    Takes the CSR arrays from roster_grade_arrays; results match
+    calculate_average and get_letter_grade exactly
+    Returns: (averages, letters, passed) with one entry per student
+    """
+    np = numpy_module()
+    if np is None:
+        averages = [calculate_average(values[offsets[i]:offsets[i + 1]])
+                    for i in range(len(offsets) - 1)]
+        return (averages, [get_letter_grade(avg) for avg in averages],
+                [avg >= 60 for avg in averages])
+    
+    return grade_sums(segment_sums(values, offsets), np.diff(offsets))
+
+
+def batch_report_stats(records: Iterable[Dict]) -> ReportStats:
+    """Build report statistics for a roster with the batch grading engine"""
+    return ReportStats.from_batch(*batch_grade(*roster_grade_arrays(records)))
+
+
+# Rows per page of the student listing
+PAGE_SIZE = 20
+# Sort orders offered by the student listing (see StoreEvents.sorted_ids)
+STUDENT_SORT_KEYS = {
+    "id": lambda student: student["id"],
+    "name": lambda student: student["name"].lower(),
+    "average": lambda student: -student["average"],
+}
+
+
+# Rendered output is written in pieces of about this many characters
+WRITE_CHUNK_SIZE = 1 << 16
+# Output formats of student tables and reports
+OUTPUT_FORMATS = ("text", "csv", "json")
+
+
+def write_lines(lines: Iterable[str], file=None):
+    """
+    Write rendered lines with as few write calls as possible
+    Lines (each ending in a newline) are collected into chunks of about
+    WRITE_CHUNK_SIZE characters, so a huge table streams out in large
+    writes without ever being held in memory whole.
+    """
+    file = file or sys.stdout
+    chunk, size = [], 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= WRITE_CHUNK_SIZE:
+            file.write("".join(chunk))
+            chunk, size = [], 0
+    if chunk:
+        file.write("".join(chunk))
+    file.flush()
+
+
+def format_student_row(student: Dict, avg: float, grade: str) -> str:
+    """One line of the student table"""
+    status = "Pass" if avg >= 60 else "Fail"
+    return (f"{student['id']:<10} {student['name']:<20} {avg:<10.2f} "
+            f"{status:<10} {grade:<5}")
+
+
+def student_table_lines(records: Iterable[Dict], output_format: str = "text"):
+    """
+    Yield a student table line by line (each line ends in a newline)
+    output_format: "text" (the View All Students layout), "csv" with
+                   ID,Name,Average,Grade,Status columns, or "json", an
+                   array with one object per line
+    """
+    if output_format == "text":
+        yield f"{'ID':<10} {'Name':<20} {'Average':<10} {'Status':<10} {'Grade':<5}\n"
+        yield "-" * 60 + "\n"
+        for student in records:
+            yield format_student_row(student, student['average'], student['letter']) + "\n"
+    elif output_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        
+        def csv_line(values):
+            writer.writerow(values)
+            line = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return line
+        
+        yield csv_line(["ID", "Name", "Average", "Grade", "Status"])
+        for student in records:
+            yield csv_line([student["id"], student["name"], f"{student['average']:.2f}",
+                            student["letter"], "Pass" if student["average"] >= 60 else "Fail"])
+    elif output_format == "json":
+        separator = "[\n"
+        for student in records:
+            yield separator + json.dumps({
+                "id": student["id"], "name": student["name"],
+                "grades": list(student["grades"]), "average": student["average"],
+                "letter": student["letter"],
+                "status": "Pass" if student["average"] >= 60 else "Fail"})
+            separator = ",\n"
+        yield "[]\n" if separator == "[\n" else "\n]\n"
+    else:
+        raise ValueError(f"unknown output format {output_format}")
+
+
+def render_student_page(records: List[Dict], page: int = 0, page_count: int = 1,
+                        sort_key: Optional[str] = None, use_batch: bool = False,
+                        title: str = "All Students") -> str:
+    """
+    Format one page of the student listing
+    use_batch: grade the page with batch_grade instead of reading each
+               student's cached average
+    Returns: the whole page as one string, ready for a single write
+    """
+    if page_count > 1:
+        order = f", by {sort_key}" if sort_key else ""
+        title = f"{title} (page {page + 1} of {page_count}{order})"
+    lines = ["", f"--- {title} ---",
+             f"{'ID':<10} {'Name':<20} {'Average':<10} {'Status':<10} {'Grade':<5}",
+             "-" * 60]
+    
+    if use_batch:
+        averages, letters, _ = batch_grade(*roster_grade_arrays(records))
+        rows = zip(records, averages, letters)
+    else:
+        rows = ((student, student['average'], student['letter']) for student in records)
+    
+    lines.extend(format_student_row(student, avg, grade) for student, avg, grade in rows)
+    return "\n".join(lines) + "\n"
+
+
+@instrumented
+def view_all_students(use_batch: bool = False, page_size: int = PAGE_SIZE):
+    """
+    Display all student records one page at a time
+    Only the students on the visible page are read and formatted. The
+    listing can be sorted by ID, name or average through the store's
+    sort index, and any page can be opened by number.
+    use_batch: grade each page with batch_grade instead of reading each
+               student's cached average
+    """
+    if not students:
+        print("\nNo students in the system!")
+        return
+    
+    browse_students(students.sorted_ids, "All Students", ("id", "name", "average", "roster"),
+                    use_batch, page_size)
+
+
+def browse_students(ordered_ids, title: str, orders: Tuple[str, ...],
+                    use_batch: bool = False, page_size: int = PAGE_SIZE):
+    """
+    Page through a list of students
+    ordered_ids: called with a sort key from STUDENT_SORT_KEYS, or None
+                 for the default order, and returns the IDs in that order
+    orders: sort choices offered to the user; "roster" is the default order
+    """
+    sort_key = None
+    page = 0
+    while True:
+        ids = ordered_ids(sort_key)
+        page_count = (len(ids) + page_size - 1) // page_size
+        page = min(max(page, 0), page_count - 1)
+        records = [students.get(student_id)
+                   for student_id in ids[page * page_size:(page + 1) * page_size]]
+        sys.stdout.write(render_student_page(records, page, page_count, sort_key,
+                                             use_batch, title))
+        sys.stdout.flush()
+        if page_count == 1:
+            return
+        
+        command = input(f"\n[Enter] next, p previous, a page number, "
+                        f"sort by {'/'.join(orders)}, or q to quit: ").strip().lower()
+        if command == "q" or (command in ("", "n") and page == page_count - 1):
+            return
+        elif command in ("", "n"):
+            page += 1
+        elif command == "p":
+            page -= 1
+        elif command.isdigit():
+            page = int(command) - 1
+        elif command in orders:
+            sort_key = None if command == "roster" else command
+            page = 0
+        else:
+            print("\nInvalid choice!")
+
+
+def report_columns(records) -> Tuple:
+    """
+    Return a roster's grades as (starts, counts, values) columns
+    Student i's grades are values[starts[i]:starts[i] + counts[i]]
+    """
+    np = numpy_module()
+    if isinstance(records, ColumnarStudentStore):
+        return records.grade_columns()
+    values, offsets = roster_grade_arrays(records)
+    if np is not None:
+        return offsets[:-1], np.diff(offsets), values
+    return offsets[:-1], [end - start for start, end in zip(offsets, offsets[1:])], values
+
+
+def grade_report_rows(starts, counts, values, start: int, stop: int) -> ReportStats:
+    """Report totals for students start to stop, recomputed from their grades"""
+    stats = ReportStats()
+    for row in range(start, stop):
+        count = counts[row]
+        if count:
+            first = starts[row]
+            average = sum(values[first:first + count]) / count
+        else:
+            average = 0.0
+        stats._apply(average, get_letter_grade(average), 1)
+    return stats
+
+
+def report_shard(memory_name: str, rows: int, value_count: int,
+                 start: int, stop: int) -> ReportStats:
+    """Worker for parallel_report_stats: grade one shard from shared memory"""
+    from multiprocessing import shared_memory
+    memory = shared_memory.SharedMemory(memory_name)
+    columns = memory.buf
+    starts = columns[:8 * rows].cast("q")
+    counts = columns[8 * rows:16 * rows].cast("q")
+    values = columns[16 * rows:16 * rows + 8 * value_count].cast("d")
+    try:
+        return grade_report_rows(starts, counts, values, start, stop)
+    finally:
+        for view in (starts, counts, values, columns):
+            view.release()
+        memory.close()
+
+
+def parallel_report_stats(records, workers: int) -> ReportStats:
+    """
+    Recompute the report statistics from every grade on several processes
+    The grade columns are copied into shared memory once, each worker
+    grades a contiguous shard of students, and the partial totals are
+    merged in roster order. Averages, pass counts and the distribution
+    equal a serial recompute; total_average only differs by summation order.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+    starts, counts, values = report_columns(records)
+    rows, value_count = len(starts), len(values)
+    if workers <= 1 or rows < 2 * workers:
+        return grade_report_rows(starts, counts, values, 0, rows)
+    
+    memory = shared_memory.SharedMemory(create=True, size=max(16 * rows + 8 * value_count, 1))
+    try:
+        offset = 0
+        for column, typecode in ((starts, "q"), (counts, "q"), (values, "d")):
+            if isinstance(column, list) or memoryview(column).itemsize != 8:
+                column = array(typecode, column)
+            data = memoryview(column).cast("B")
+            memory.buf[offset:offset + len(data)] = data
+            offset += len(data)
+        
+        bounds = [rows * shard // workers for shard in range(workers + 1)]
+        stats = ReportStats()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for partial in executor.map(report_shard, repeat(memory.name), repeat(rows),
+                                        repeat(value_count), bounds[:-1], bounds[1:]):
+                stats.merge(partial)
+        return stats
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def report_stats(use_batch: bool = False, workers: int = 1) -> Tuple[ReportStats, List[str]]:
+    """
+    Statistics for the report on the current roster
+    use_batch / workers: see generate_report
+    Returns: (stats, problems); problems describes running totals that
+             failed verification and were replaced by a full recompute
+    """
+    if workers > 1:
+        return parallel_report_stats(students, workers), []
+    if use_batch:
+        return batch_report_stats(students), []
+    stats = students.stats
+    problems = stats.verify(students) if VERIFY_REPORT_STATS else []
+    if problems:
+        stats = ReportStats.from_records(students)
+    return stats, problems
+
+
+def render_report(stats: ReportStats, problems: Iterable[str] = ()) -> str:
+    """Format the grade performance report as text"""
+    out = io.StringIO()
+    out.write("\n--- Grade Performance Report ---\n")
+    problems = list(problems)
+    if problems:
+        out.write("\nWarning: running statistics are out of sync, using a full recompute:\n")
+        for problem in problems:
+            out.write(f"  {problem}\n")
+    
+    total_students = stats.total_students
+    passed_students = stats.passed_students
+    failed_students = stats.failed_students
+    overall_average = stats.total_average / total_students
+    
+    out.write(f"\nTotal Students: {total_students}\n")
+    out.write(f"Passed: {passed_students} ({passed_students/total_students*100:.1f}%)\n")
+    out.write(f"Failed: {failed_students} ({failed_students/total_students*100:.1f}%)\n")
+    out.write(f"Overall Average: {overall_average:.2f}\n")
+    
+    out.write("\n--- Grade Distribution ---\n")
+    for grade, count in stats.grade_distribution.items():
+        percentage = count / total_students * 100
+        out.write(f"{grade}: {count} students ({percentage:.1f}%)\n")
+    return out.getvalue()
+
+
+def format_report(stats: ReportStats, output_format: str = "json") -> str:
+    """
+    Format the report statistics for other programs
+    output_format: "json" (the report_summary dict) or "csv" with one
+                   Metric,Value row per figure and one per letter grade
+    """
+    summary = report_summary(stats)
+    if output_format == "json":
+        return json.dumps(summary, indent=2) + "\n"
+    if output_format != "csv":
+        raise ValueError(f"unknown output format {output_format}")
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["Metric", "Value"])
+    for metric in ("total_students", "passed_students", "failed_students"):
+        writer.writerow([metric, summary[metric]])
+    writer.writerow(["overall_average", f"{summary['overall_average']:.4f}"])
+    for letter, count in summary["grade_distribution"].items():
+        writer.writerow([f"grade_{letter}", count])
+    return out.getvalue()
+
+
+@instrumented
+def generate_report(use_batch: bool = False, workers: int = 1):
+    """
+    Generate pass/fail report and statistics
+    The report is built in memory and written with a single write
+    use_batch: recompute the statistics with the batch grading engine
+               instead of reading the store's running totals
+    workers: recompute the statistics on this many processes instead
+             (see parallel_report_stats)
+    """
+    if not students:
+        print("\nNo students to generate report!")
+        return
     
-    print(f"Average: {avg:.2f}")
-    print(f"Letter Grade: {grade_letter}")
-    print(f"Status: {status}")
-    print(f"{'='*40}")
+    stats, problems = report_stats(use_batch, workers)
+    sys.stdout.write(render_report(stats, problems))
+    sys.stdout.flush()
 
 
-def calculate_average(grades: List[float]) -> float:
-    """Calculate average of grades"""
-    if not grades:
-        return 0.0
-    return sum(grades) / len(grades)
+def get_view_cache() -> StudentViewCache:
+    """Return the detail view and search cache for the current store"""
+    global view_cache
+    if view_cache is None or view_cache.store is not students:
+        if view_cache is not None:
+            view_cache.close()
+        view_cache = StudentViewCache(students)
+    return view_cache
 
 
-def get_letter_grade(average: float) -> str:
-    """Convert average to letter grade"""
-    if average >= 90:
-        return "A"
-    elif average >= 80:
-        return "B"
-    elif average >= 70:
-        return "C"
-    elif average >= 60:
-        return "D"
-    else:
-        return "F"
+def get_rank_index() -> RankIndex:
+    """Return the ranking index for the roster, building it on first use"""
+    global rank_index
+    if rank_index is None:
+        rank_index = RankIndex(students)
+    return rank_index
 
 
-def view_all_students():
-    """Display all student records"""
+def get_name_prefix_index() -> SortedIndex:
+    """Return the roster's index of lowercased names, building it on first use"""
+    global name_prefix_index
+    if name_prefix_index is None:
+        name_prefix_index = SortedIndex(lambda student: student["name"].lower(), students)
+    return name_prefix_index
+
+
+def average_bounds(min_average: Optional[float] = None, max_average: Optional[float] = None,
+                   letter: Optional[str] = None, passed: Optional[bool] = None) -> Tuple:
+    """
+    Combine the average filters of find_students into one range
+    Returns: (low, high) with low <= average < high for every match
+    """
+    low, high = -math.inf, math.inf
+    if min_average is not None:
+        low = max(low, min_average)
+    if max_average is not None:
+        high = min(high, math.nextafter(max_average, math.inf))
+    if letter is not None:
+        if letter.upper() not in LETTERS:
+            raise ValueError(f"unknown letter grade: {letter}")
+        i = LETTERS.index(letter.upper())
+        if i > 0:
+            low = max(low, LETTER_CUTOFFS[i - 1])
+        if i < len(LETTER_CUTOFFS):
+            high = min(high, LETTER_CUTOFFS[i])
+    if passed is True:
+        low = max(low, 60)
+    elif passed is False:
+        high = min(high, 60)
+    return low, high
+
+
+def find_students(min_average: Optional[float] = None, max_average: Optional[float] = None,
+                  letter: Optional[str] = None, passed: Optional[bool] = None,
+                  name_prefix: Optional[str] = None) -> List[str]:
+    """
+    Find the students matching every given filter
+    min_average, max_average: inclusive bounds on the average
+    letter: letter grade "A" to "F"; passed: True for passing students,
+            False for failing ones; name_prefix: start of the name, any case
+    The average filters are one range of the rank index and the prefix one
+    range of the name index; only the smaller range is read and checked
+    against the other filter
+    Returns: matching IDs, highest average first
+    """
+    low, high = average_bounds(min_average, max_average, letter, passed)
+    if low >= high:
+        return []
+    ranks = get_rank_index()
+    if not name_prefix:
+        return ranks.average_between(low, high)
+    
+    names = get_name_prefix_index()
+    prefix = name_prefix.lower()
+    after_prefix = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    average_low, average_high = (math.nextafter(-high, math.inf),
+                                 math.nextafter(-low, math.inf))
+    if names.count_between(prefix, after_prefix) <= ranks.count_between(average_low,
+                                                                         average_high):
+        matches = [student_id for student_id in names.between(prefix, after_prefix)
+                   if average_low <= ranks.key_of(student_id) < average_high]
+        return sorted(matches, key=ranks.entry_of)
+    return [student_id for student_id in ranks.between(average_low, average_high)
+            if names.key_of(student_id).startswith(prefix)]
+
+
+def print_ranked_students(student_ids: List[str]):
+    """Print students with their class rank and percentile"""
+    index = get_rank_index()
+    lines = [f"{'Rank':<6} {'ID':<10} {'Name':<20} {'Average':<10} {'Percentile':<10}",
+             "-" * 60]
+    for student_id in student_ids:
+        student = students.get(student_id)
+        lines.append(f"{index.rank(student_id):<6} {student_id:<10} {student['name']:<20} "
+                     f"{student['average']:<10.2f} {index.percentile(student_id):<10.1f}")
+    print("\n".join(lines))
+
+
+@instrumented
+def show_rankings():
+    """Show the top or bottom students, or one student's class rank"""
     if not students:
         print("\nNo students in the system!")
         return
     
-    print("\n--- All Students ---")
-    print(f"{'ID':<10} {'Name':<20} {'Average':<10} {'Status':<10} {'Grade':<5}")
-    print("-" * 60)
+    index = get_rank_index()
+    print("\n--- Rankings ---")
+    print("1. Top students")
+    print("2. Bottom students")
+    print("3. Bottom decile")
+    print("4. Student rank and percentile")
     
-    for student in students:
-        avg = calculate_average(student['grades'])
-        status = "Pass" if avg >= 60 else "Fail"
-        grade = get_letter_grade(avg)
-        
-        print(f"{student['id']:<10} {student['name']:<20} {avg:<10.2f} {status:<10} {grade:<5}")
+    choice = input("\nEnter your choice (1-4): ").strip()
+    
+    if choice in ("1", "2"):
+        try:
+            count = int(input("How many students? (default 10): ").strip() or 10)
+        except ValueError:
+            print("\nInvalid number!")
+            return
+        if count < 1:
+            print("\nInvalid number!")
+            return
+        if choice == "1":
+            print(f"\n--- Top {count} Students ---")
+            print_ranked_students(index.top(count))
+        else:
+            print(f"\n--- Bottom {count} Students ---")
+            print_ranked_students(index.bottom(count))
+    
+    elif choice == "3":
+        count = math.ceil(len(index) / 10)
+        print(f"\n--- Bottom Decile ({count} students) ---")
+        print_ranked_students(index.bottom(count))
+    
+    elif choice == "4":
+        student_id = input("Enter Student ID: ").strip()
+        rank = index.rank(student_id)
+        if rank is None:
+            print(f"\nNo student found with ID: {student_id}")
+            return
+        print(f"\n{students.get(student_id)['name']} is ranked {rank} of {len(index)} "
+              f"({index.percentile(student_id):.1f} percentile)")
+    else:
+        print("\nInvalid choice!")
 
 
-def generate_report():
-    """Generate pass/fail report and statistics"""
+@instrumented
+def filter_students():
+    """Ask for filters and page through the matching students"""
     if not students:
-        print("\nNo students to generate report!")
+        print("\nNo students in the system!")
+        return
+    
+    print("\n--- Filter Students ---")
+    print("Leave a filter blank to skip it")
+    try:
+        min_input = input("Minimum average: ").strip()
+        max_input = input("Maximum average: ").strip()
+        min_average = float(min_input) if min_input else None
+        max_average = float(max_input) if max_input else None
+    except ValueError:
+        print("\nInvalid average!")
         return
     
-    print("\n--- Grade Performance Report ---")
+    letter = input("Letter grade (A-F): ").strip().upper() or None
+    if letter is not None and letter not in LETTERS:
+        print("\nInvalid letter grade!")
+        return
     
-    total_students = len(students)
-    passed_students = 0
-    failed_students = 0
-    total_average = 0
+    status = input("Status (pass/fail): ").strip().lower()
+    if status not in ("", "pass", "fail"):
+        print("\nInvalid status!")
+        return
+    passed = None if not status else status == "pass"
+    name_prefix = input("Name starts with: ").strip()
     
-    grade_distribution = {"A": 0, "B": 0, "C": 0, "D": 0, "F": 0}
+    ids = find_students(min_average, max_average, letter, passed, name_prefix)
+    if not ids:
+        print("\nNo students match these filters")
+        return
+    print(f"\nFound {len(ids)} matching student(s)")
     
-    for student in students:
-        avg = calculate_average(student['grades'])
-        total_average += avg
-        
-        if avg >= 60:
-            passed_students += 1
-        else:
-            failed_students += 1
-        
-        letter_grade = get_letter_grade(avg)
-        grade_distribution[letter_grade] += 1
+    orders = {None: ids}
     
-    overall_average = total_average / total_students
+    def ordered_ids(sort_key):
+        if sort_key not in orders:
+            sort_value = STUDENT_SORT_KEYS[sort_key]
+            orders[sort_key] = sorted(
+                ids, key=lambda student_id: (sort_value(students.get(student_id)), student_id))
+        return orders[sort_key]
     
-    print(f"\nTotal Students: {total_students}")
-    print(f"Passed: {passed_students} ({passed_students/total_students*100:.1f}%)")
-    print(f"Failed: {failed_students} ({failed_students/total_students*100:.1f}%)")
-    print(f"Overall Average: {overall_average:.2f}")
+    browse_students(ordered_ids, "Matching Students", ("id", "name", "average"))
+
+
+@contextmanager
+def atomic_open(filename: str, mode: str = "w", **kwargs):
+    """
+    Open a temporary file that replaces filename only when fully written
+    The data is fsynced before the rename, so a crash leaves either the
+    old file or the new one, never a truncated mix. Every call gets its
+    own temporary file, so concurrent saves of one file cannot mix either.
+    """
+    directory, base = os.path.split(os.path.abspath(filename))
+    descriptor, temp_filename = tempfile.mkstemp(prefix=base + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(descriptor, mode, **kwargs) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        # mkstemp creates the file private; give it the permissions open() would
+        try:
+            os.chmod(temp_filename, os.stat(filename).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(temp_filename, 0o666 & ~FILE_UMASK)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
+    try:
+        directory = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+    except OSError:  # Directories cannot be opened on every platform
+        return
+    try:
+        os.fsync(directory)
+    except OSError:
+        pass
+    finally:
+        os.close(directory)
+
+
+def copy_roster(records: Iterable[Dict]) -> List[Dict]:
+    """Copy the fields a save writes, so later edits cannot change the copy"""
+    return [{"id": student["id"], "name": student["name"],
+             "grades": list(student["grades"]), "grade_sum": student["grade_sum"]}
+            for student in records]
+
+
+def save_snapshot(filename: str, records, stats: Optional[ReportStats] = None) -> int:
+    """
+    Write a roster as a binary snapshot
+    stats: report totals for the header, defaults to the store's stats
+    The file is written next to the target and renamed over it, so a
+    snapshot that is currently memory-mapped is never modified in place
+    Returns: number of bytes written
+    """
+    ids = []
+    string_offsets = array("q", [0])
+    starts, counts = array("q"), array("q")
+    sums, grades = array("d"), array("d")
+    strings = []
+    position = 0
+    for student in records:
+        ids.append(student["id"])
+        for text in (student["id"], student["name"]):
+            data = text.encode("utf-8")
+            strings.append(data)
+            position += len(data)
+            string_offsets.append(position)
+        student_grades = student["grades"]
+        starts.append(len(grades))
+        counts.append(len(student_grades))
+        grades.extend(student_grades)
+        sums.append(student["grade_sum"])
+    id_order = array("q", sorted(range(len(ids)), key=ids.__getitem__))
     
-    print("\n--- Grade Distribution ---")
-    for grade, count in grade_distribution.items():
-        percentage = count / total_students * 100
-        print(f"{grade}: {count} students ({percentage:.1f}%)")
+    stats = stats or records.stats
+    header = MappedSnapshot.HEADER.pack(
+        MappedSnapshot.MAGIC, len(ids), len(grades), position,
+        stats.total_students, stats.passed_students, stats.total_average,
+        *stats.grade_distribution.values())
+    with atomic_open(filename, "wb") as file:
+        file.write(header)
+        for section in (string_offsets, starts, counts, sums, id_order, grades):
+            section.tofile(file)
+        file.write(b"".join(strings))
+        size = file.tell()
+    return size
 
 
-def save_to_file():
-    """Save student records to CSV file"""
+@instrumented
+def save_to_file(file_format: Optional[str] = None, background: bool = False):
+    """
+    Save student records to file
+    file_format: "csv" or "snapshot", defaults to DATA_FORMAT
+    background: copy the roster and write it on the saver thread instead
+                of waiting for the write (journal saves stay in the foreground)
+    Returns: False if nothing could be saved
+    """
     if current_user["role"] != "admin":
         print("\nError: Only administrators can save data!")
-        return
+        return False
     
     if not students:
         print("\nNo data to save!")
-        return
+        return False
     
-    filename = "student_records.csv"
+    file_format = file_format or DATA_FORMAT
+    filename = SNAPSHOT_FILE if file_format == "snapshot" else CSV_FILE
     
     try:
-        with open(filename, 'w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(["ID", "Name", "Grades"])
-            
-            for student in students:
-                grades_str = ";".join(map(str, student['grades']))
-                writer.writerow([student['id'], student['name'], grades_str])
+        if journal is not None and not journal.should_compact(filename, len(students)):
+            count = journal.flush()
+            print(f"\nSaved {count} change(s) to {journal.filename}")
+            return True
         
+        if background and journal is None:
+            saver.request(filename, file_format, copy_roster(students), students.stats.copy())
+            print(f"\nSaving to {filename} in the background...")
+            return True
+        
+        write_roster_file(filename, file_format)
+        if journal is not None:
+            journal.start(filename)
         print(f"\nData saved successfully to {filename}")
+        return True
     except Exception as e:
         print(f"\nError saving file: {e}")
+        return False
+
+
+@instrumented
+def write_roster_file(filename: str, file_format: str, records=None,
+                      stats: Optional[ReportStats] = None):
+    """
+    Write a whole roster to filename in the given file format
+    records and stats default to the current students and their totals
+    """
+    if records is None:
+        records, stats = students, students.stats
+    if file_format == "snapshot":
+        save_snapshot(filename, records, stats)
+    else:
+        with atomic_open(filename, 'w', newline='') as file:
+            write_roster_csv(file, records)
+    count_file_bytes(filename, read=False)
+
+
+def write_roster_csv(file, records: Iterable[Dict]):
+    """Write records to an open file in the roster CSV format"""
+    writer = csv.writer(file)
+    writer.writerow(["ID", "Name", "Grades"])
+    
+    for student in records:
+        grades_str = ";".join(map(str, student['grades']))
+        writer.writerow([student['id'], student['name'], grades_str])
+
+
+def replay_journal(base_filename: str):
+    """Apply the changes logged since base_filename was written"""
+    if journal is None:
+        return
+    applied = journal.replay(students, base_filename)
+    if applied:
+        print(f"Applied {applied} logged change(s) from {journal.filename}")
+    if journal.discarded:
+        print(f"Warning: {journal.filename} does not match {base_filename}, "
+              f"{journal.discarded} logged change(s) were not applied "
+              f"(kept in {journal.filename}.stale)")
+
+
+def open_input(filename: str):
+    """Open a text file for reading, or standard input when filename is "-" """
+    if filename == "-":
+        return nullcontext(sys.stdin)
+    return open(filename, 'r', newline='')
+
+
+class StudentCSVReader:
+    """
+    Streaming reader for student CSV files
+    Iterating yields one record per valid row without holding the file in
+    memory. Rows that cannot be parsed are skipped and reported through
+    on_error(line_number, message) and the errors list instead of
+    aborting the whole load.
+    """
+
+    # Only the first errors are kept in memory, error_count has the total
+    MAX_KEPT_ERRORS = 100
+
+    def __init__(self, filename: str, on_error=None):
+        self.filename = filename  # "-" reads standard input
+        self.on_error = on_error
+        self.rows_read = 0
+        self.error_count = 0
+        self.errors: List[Tuple[int, str]] = []
+
+    def _report(self, line_number: int, message: str):
+        """Record a bad row"""
+        self.error_count += 1
+        if len(self.errors) < self.MAX_KEPT_ERRORS:
+            self.errors.append((line_number, message))
+        if self.on_error:
+            self.on_error(line_number, message)
+
+    @staticmethod
+    def parse_row(row: Dict) -> Dict:
+        """
+        Turn one CSV row into a student record
+        Raises: ValueError describing what is wrong with the row
+        """
+        student_id = row.get("ID") or ""
+        if not student_id:
+            raise ValueError("missing student ID")
+        grades_str = row.get("Grades")
+        if grades_str is None:
+            raise ValueError("missing Grades column")
+        grades = []
+        for grade_str in grades_str.split(";") if grades_str else ():
+            try:
+                grade = float(grade_str)
+            except ValueError:
+                raise ValueError(f"invalid grade '{grade_str}'") from None
+            if not 0 <= grade <= 100:
+                raise ValueError(f"grade {grade} out of range")
+            grades.append(grade)
+        return {"id": student_id, "name": row.get("Name") or "", "grades": grades}
+
+    def __iter__(self):
+        with open_input(self.filename) as file:
+            yield from self._parse_rows(file)
+
+    def _parse_rows(self, file, fieldnames: Optional[List[str]] = None, first_line: int = 0):
+        """
+        Yield the valid records of an open CSV file, reporting the bad rows
+        fieldnames: column names when file is past the header line
+        first_line: number of lines of the file before this position
+        """
+        reader = csv.DictReader(file, fieldnames=fieldnames)
+        for row in reader:
+            try:
+                student = self.parse_row(row)
+            except ValueError as e:
+                self._report(first_line + reader.line_num, str(e))
+                continue
+            self.rows_read += 1
+            yield student
+
+    def chunks(self, size: int = 10000):
+        """Yield the records in lists of at most size records"""
+        chunk = []
+        for student in self:
+            chunk.append(student)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def stream_report(filename: str, on_error=None) -> ReportStats:
+    """
+    Compute report statistics straight from a CSV file
+    The roster is never materialized; duplicate IDs are skipped like a load
+    """
+    seen_ids = set()
+    
+    def first_occurrences():
+        for student in StudentCSVReader(filename, on_error):
+            if student["id"] not in seen_ids:
+                seen_ids.add(student["id"])
+                yield student
+    
+    return ReportStats.from_records(first_occurrences())
+
+
+class BulkCSVReader(StudentCSVReader):
+    """
+    High-throughput CSV import straight into a ColumnarStudentStore
+    The file is read in large blocks. Each block is split into columns
+    with one regular expression and its whole Grades column is parsed by
+    a single np.fromstring call into the columnar grade buffer.
+
+    Blocks with quoted fields, blank or malformed lines, bad grades or
+    duplicate IDs are parsed again row by row, so errors and duplicates
+    are handled exactly as StudentCSVReader handles them. Without NumPy,
+    or with an unexpected header, the file is streamed row by row.
+    """
+
+    BLOCK_SIZE = 1 << 22
+    HEADER = "ID,Name,Grades"
+    ROW_PATTERN = re.compile(r'^([^,"\r\n]*),([^,"\r\n]*),([^,"\r\n]*)\r?$', re.M)
+
+    def load_columnar(self) -> ColumnarStudentStore:
+        """Read the whole file into a new ColumnarStudentStore"""
+        np = numpy_module()
+        store = ColumnarStudentStore()
+        with open(self.filename, 'r', newline='') as file:
+            header = file.readline()
+            if header.rstrip("\r\n") != self.HEADER or np is None:
+                for student in self:
+                    store.add(student)
+                return store
+            
+            line_number = 1
+            remainder = ""
+            while True:
+                data = file.read(self.BLOCK_SIZE)
+                if not data:
+                    break
+                block = remainder + data
+                cut = self._last_row_end(block)
+                block, remainder = block[:cut], block[cut:]
+                if block:
+                    self._load_block(store, block, line_number)
+                    line_number += block.count("\n")
+            if remainder:
+                self._load_block(store, remainder + "\n", line_number)
+        return store
+
+    @staticmethod
+    def _last_row_end(block: str) -> int:
+        """
+        Return the end of the last complete row in a block that starts a row
+        A line break inside a quoted field (odd quote count before it) does
+        not end a row; 0 means the block holds no complete row yet
+        """
+        cut = block.rfind("\n") + 1
+        quotes = block.count('"', 0, cut)
+        while cut and quotes % 2:
+            previous = block.rfind("\n", 0, cut - 1) + 1
+            quotes -= block.count('"', previous, cut)
+            cut = previous
+        return cut
+
+    def _load_block(self, store: ColumnarStudentStore, block: str, line_number: int):
+        """Append a block of complete lines, falling back to row-by-row parsing"""
+        np = numpy_module()
+        rows = self.ROW_PATTERN.findall(block)
+        if len(rows) != block.count("\n"):
+            self._load_rows(store, block, line_number)
+            return
+        ids, names, grade_strs = zip(*rows)
+        if "" in ids or len(set(ids)) != len(ids) or any(student_id in store for student_id in ids):
+            self._load_rows(store, block, line_number)
+            return
+        
+        if "" in grade_strs:
+            counts = np.array([grade_str.count(";") + 1 if grade_str else 0
+                               for grade_str in grade_strs], dtype=np.int64)
+            grades_text = ";".join(filter(None, grade_strs))
+        else:
+            counts = np.fromiter(map(str.count, grade_strs, repeat(";")),
+                                 dtype=np.int64, count=len(grade_strs)) + 1
+            grades_text = ";".join(grade_strs)
+        
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                values = np.fromstring(grades_text, sep=";") if grades_text else np.zeros(0)
+        except (ValueError, DeprecationWarning):
+            values = None
+        if (values is None or len(values) != offsets[-1]
+                or not np.all((values >= 0) & (values <= 100))):
+            self._load_rows(store, block, line_number)
+            return
+        
+        sums = segment_sums(values, offsets)
+        stats = ReportStats.from_batch(*grade_sums(sums, counts))
+        store.extend_columns(ids, names, offsets, sums, values, stats)
+        self.rows_read += len(ids)
+
+    def _load_rows(self, store: ColumnarStudentStore, block: str, line_number: int):
+        """Parse a block row by row with the csv module and add each record"""
+        reader = csv.DictReader(io.StringIO(block, newline=''),
+                                fieldnames=self.HEADER.split(","))
+        for row in reader:
+            try:
+                student = self.parse_row(row)
+            except ValueError as e:
+                self._report(line_number + reader.line_num, str(e))
+                continue
+            self.rows_read += 1
+            store.add(student)
+
+
+def parse_csv_shard(filename: str, start: int, stop: int, fieldnames: List[str]) -> Tuple:
+    """
+    Worker for ShardedCSVReader: parse the rows in bytes start to stop
+    Returns: (records, errors, line_count, quote_count); error line
+    numbers are relative to the shard
+    """
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        data = file.read(stop - start)
+    reader = csv.DictReader(io.TextIOWrapper(io.BytesIO(data), newline=''),
+                            fieldnames=fieldnames)
+    records, errors = [], []
+    for row in reader:
+        try:
+            records.append(StudentCSVReader.parse_row(row))
+        except ValueError as e:
+            errors.append((reader.line_num, str(e)))
+    return records, errors, data.count(b"\n"), data.count(b'"')
+
+
+class ShardedCSVReader(StudentCSVReader):
+    """
+    Student CSV reader that parses a large file on several processes
+    The file is cut into byte ranges of about SHARD_BYTES, each cut moved
+    forward to the next line break. Workers parse the ranges and the
+    records are yielded in file order as the ranges finish, with at most
+    two ranges per worker parsed ahead, so duplicate IDs resolve exactly
+    as with StudentCSVReader (the first one wins when the store is filled).
+
+    A quoted field can contain a line break; once a cut turns out to lie
+    inside quotes, the rest of the file from the start of that range is
+    streamed on this process instead. Small files and standard input are
+    always streamed.
+    """
+
+    # Size of the byte range a worker parses at a time
+    SHARD_BYTES = 1 << 22
+
+    def __init__(self, filename: str, on_error=None, workers: int = 1):
+        super().__init__(filename, on_error)
+        self.workers = workers
+
+    def _shard_bounds(self) -> Tuple[List[str], List[int]]:
+        """Return the header fields and the byte offsets where shards start and end"""
+        with open(self.filename, 'rb') as file:
+            header = file.readline()
+            size = os.fstat(file.fileno()).st_size
+            shards = (size - len(header)) // self.SHARD_BYTES
+            bounds = [len(header)]
+            for shard in range(1, shards):
+                file.seek(max(len(header) + (size - len(header)) * shard // shards, bounds[-1]))
+                file.readline()
+                if file.tell() < size:
+                    bounds.append(file.tell())
+            bounds.append(size)
+        fieldnames = next(csv.reader(io.TextIOWrapper(io.BytesIO(header), newline='')), [])
+        return fieldnames, bounds
+
+    def _stream_from(self, start: int, fieldnames: List[str], first_line: int):
+        """Parse the file on this process from byte start, a row boundary"""
+        with open(self.filename, 'rb') as raw:
+            raw.seek(start)
+            with io.TextIOWrapper(raw, newline='') as file:
+                yield from self._parse_rows(file, fieldnames, first_line)
+
+    def __iter__(self):
+        if self.filename == "-" or self.workers <= 1:
+            yield from super().__iter__()
+            return
+        fieldnames, bounds = self._shard_bounds()
+        if len(bounds) <= 2:
+            yield from super().__iter__()
+            return
+        
+        from concurrent.futures import ProcessPoolExecutor
+        ranges = zip(bounds[:-1], bounds[1:])
+        ahead = 2 * self.workers
+        pending = deque()
+        line_number = 1
+        quotes = 0
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(bounds) - 1)) as executor:
+            while True:
+                for start, stop in islice(ranges, ahead - len(pending)):
+                    pending.append((start, stop, executor.submit(
+                        parse_csv_shard, self.filename, start, stop, fieldnames)))
+                if not pending:
+                    return
+                start, stop, future = pending.popleft()
+                records, errors, line_count, quote_count = future.result()
+                quotes += quote_count
+                if quotes % 2 and stop < bounds[-1]:
+                    # This range ends inside a quoted field, so its last row
+                    # was cut short and the later ranges start mid-row
+                    executor.shutdown(cancel_futures=True)
+                    del records, pending
+                    yield from self._stream_from(start, fieldnames, line_number)
+                    return
+                for shard_line, message in errors:
+                    self._report(line_number + shard_line, message)
+                self.rows_read += len(records)
+                yield from records
+                line_number += line_count
 
 
-def load_from_file():
-    """Load student records from CSV file"""
-    global students
-    filename = "student_records.csv"
+@instrumented
+def load_from_file(file_format: Optional[str] = None):
+    """
+    Load student records from file
+    file_format: "csv" or "snapshot", defaults to DATA_FORMAT. Without a
+                 snapshot file the CSV file is imported instead.
+    A ColumnarStudentStore adopts the memory-mapped snapshot as is, so
+    the load takes the same time for any roster size; the dict and SQLite
+    stores copy every record out of it.
+    """
+    global roster_opened
+    roster_opened = True  # An explicit load replaces the roster opened on first use
+    file_format = file_format or DATA_FORMAT
+    filename = CSV_FILE
+    saver.wait()  # Read the roster that was last saved, not the one before it
+    
+    if file_format == "snapshot":
+        if os.path.exists(SNAPSHOT_FILE):
+            try:
+                loaded_count = students.replace(ColumnarStudentStore.open_snapshot(SNAPSHOT_FILE))
+                print(f"\nLoaded {loaded_count} student records from {SNAPSHOT_FILE}")
+                count_file_bytes(SNAPSHOT_FILE, read=True)
+                replay_journal(SNAPSHOT_FILE)
+            except Exception as e:
+                print(f"\nError loading file: {e}")
+            return
+        print(f"\nSnapshot {SNAPSHOT_FILE} not found, importing {filename}")
     
     if not os.path.exists(filename):
         print(f"\nFile {filename} not found!")
         return
     
     try:
-        loaded_students = []
-        with open(filename, 'r') as file:
-            reader = csv.DictReader(file)
-            
-            for row in reader:
-                grades = [float(g) for g in row['Grades'].split(';')]
-                student = {
-                    "id": row['ID'],
-                    "name": row['Name'],
-                    "grades": grades
-                }
-                loaded_students.append(student)
-        
-        students = loaded_students
-        print(f"\nLoaded {len(students)} student records from {filename}")
+        if isinstance(students, ColumnarStudentStore):
+            reader = BulkCSVReader(filename)
+            loaded_count = students.replace(reader.load_columnar())
+        else:
+            reader = ShardedCSVReader(filename, workers=LOAD_WORKERS)
+            loaded_count = students.replace(reader)
+        print(f"\nLoaded {loaded_count} student records from {filename}")
+        count_file_bytes(filename, read=True)
+        duplicates = reader.rows_read - loaded_count
+        if duplicates:
+            print(f"Skipped {duplicates} duplicate student ID(s)")
+        if reader.error_count:
+            print(f"Skipped {reader.error_count} invalid row(s):")
+            for line_number, message in reader.errors[:10]:
+                print(f"  Line {line_number}: {message}")
+            if reader.error_count > 10:
+                print(f"  ... and {reader.error_count - 10} more")
+        replay_journal(filename)
     except Exception as e:
         print(f"\nError loading file: {e}")
 
 
+def read_grade_rows(filename: str):
+    """
+    Read "student_id,grade" rows from a file or standard input ("-")
+    A first row naming the columns is skipped
+    Yields: (line_number, student_id, grade_text)
+    """
+    with open_input(filename) as file:
+        reader = csv.reader(file)
+        for row in reader:
+            if not row or not "".join(row).strip():
+                continue
+            if reader.line_num == 1 and row[0].strip().lower() in ("id", "student_id"):
+                continue
+            yield (reader.line_num, row[0].strip(),
+                   row[1].strip() if len(row) > 1 else "")
+
+
+class GradeIngestReport:
+    """
+    Outcome of ingest_grades
+    errors holds (row_number, message) for every rejected row, in row order
+    """
+
+    def __init__(self):
+        self.applied = 0
+        self.students_updated = 0
+        self.errors: List[Tuple[int, str]] = []
+
+    @property
+    def rejected(self) -> int:
+        return len(self.errors)
+
+
+def parse_grade(value) -> float:
+    """Convert a grade given as a number or text to float, NaN if it is neither"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def valid_grade_mask(grades: List[float]) -> List[bool]:
+    """
+    Check a batch of grades against the 0-100 range in one pass
+    Returns: one flag per grade; NaN grades are invalid
+    """
+    np = numpy_module()
+    if np is None:
+        return [0 <= grade <= 100 for grade in grades]
+    values = np.asarray(grades, dtype=np.float64)
+    return ((values >= 0) & (values <= 100)).tolist()
+
+
+def ingest_grades(events: Iterable[Tuple[str, object]],
+                  row_numbers: Optional[List[int]] = None) -> GradeIngestReport:
+    """
+    Append a batch of grades to the roster
+    events: (student_id, grade) pairs; grades may be numbers or text
+    row_numbers: the row number reported for each event, by default 1, 2, ...
+    The grades are range-checked together, grouped by student and added
+    with one add_grades call per student inside a single store transaction.
+    Nothing is printed; rejected rows are listed in the returned report.
+    """
+    events = list(events)
+    if row_numbers is None:
+        row_numbers = range(1, len(events) + 1)
+    grades = [parse_grade(grade) for _, grade in events]
+    report = GradeIngestReport()
+    
+    rows_by_student: Dict[str, List[int]] = {}
+    for i, valid in enumerate(valid_grade_mask(grades)):
+        if valid:
+            rows_by_student.setdefault(events[i][0], []).append(i)
+        elif math.isnan(grades[i]):
+            report.errors.append((row_numbers[i], f"invalid grade '{events[i][1]}'"))
+        else:
+            report.errors.append((row_numbers[i], f"grade {grades[i]} out of range"))
+    
+    with students.transaction():
+        for student_id, rows in rows_by_student.items():
+            student = students.get(student_id)
+            if student is None:
+                report.errors.extend((row_numbers[i], f"unknown student ID '{student_id}'")
+                                     for i in rows)
+                continue
+            students.add_grades(student, [grades[i] for i in rows])
+            report.applied += len(rows)
+            report.students_updated += 1
+    
+    report.errors.sort()
+    return report
+
+
+def ingest_grade_file(filename: str) -> GradeIngestReport:
+    """ingest_grades for a CSV file of student_id,grade rows, or standard input ("-")"""
+    rows = list(read_grade_rows(filename))
+    return ingest_grades([(student_id, grade) for _, student_id, grade in rows],
+                         [line_number for line_number, _, _ in rows])
+
+
+@instrumented
 def edit_grades():
     """Edit student grades"""
     if current_user["role"] != "admin":
@@ -308,12 +3462,7 @@ def edit_grades():
     
     print("\n--- Edit Student Grades ---")
     student_id = input("Enter Student ID: ").strip()
-    
-    student = None
-    for s in students:
-        if s["id"] == student_id:
-            student = s
-            break
+    student = students.get(student_id)
     
     if not student:
         print(f"\nStudent ID {student_id} not found!")
@@ -324,14 +3473,15 @@ def edit_grades():
     print("\n1. Add new grade")
     print("2. Edit existing grade")
     print("3. Delete grade")
+    print("4. Add several grades")
     
-    choice = input("\nEnter your choice (1-3): ").strip()
+    choice = input("\nEnter your choice (1-4): ").strip()
     
     if choice == "1":
         try:
             new_grade = float(input("Enter new grade: "))
             if 0 <= new_grade <= 100:
-                student["grades"].append(new_grade)
+                students.add_grade(student, new_grade)
                 print("\nGrade added successfully!")
             else:
                 print("\nGrade must be between 0 and 100!")
@@ -352,7 +3502,7 @@ def edit_grades():
             if 0 <= index < len(student["grades"]):
                 new_grade = float(input("Enter new grade: "))
                 if 0 <= new_grade <= 100:
-                    student["grades"][index] = new_grade
+                    students.update_grade(student, index, new_grade)
                     print("\nGrade updated successfully!")
                 else:
                     print("\nGrade must be between 0 and 100!")
@@ -374,7 +3524,7 @@ def edit_grades():
             index = int(input("\nEnter grade number to delete: ")) - 1
             if 0 <= index < len(student["grades"]):
                 if len(student["grades"]) > 1:
-                    deleted_grade = student["grades"].pop(index)
+                    deleted_grade = students.delete_grade(student, index)
                     print(f"\nGrade {deleted_grade} deleted successfully!")
                 else:
                     print("\nCannot delete the only grade!")
@@ -382,6 +3532,82 @@ def edit_grades():
                 print("\nInvalid grade number!")
         except ValueError:
             print("\nInvalid input!")
+    
+    elif choice == "4":
+        grades = input("Enter grades separated by commas: ").split(",")
+        report = ingest_grades((student_id, grade.strip()) for grade in grades)
+        print(f"\nAdded {report.applied} grade(s)")
+        for row_number, message in report.errors:
+            print(f"  Grade {row_number}: {message}")
+    else:
+        print("\nInvalid choice!")
+
+
+def dump_metrics(filename: str = METRICS_FILE):
+    """Write the collected metrics, and the last profile, to a JSON file"""
+    data = metrics.summary()
+    data["last_profile"] = metrics.last_profile
+    data["view_cache"] = view_cache.stats() if view_cache is not None else None
+    with atomic_open(filename, 'w') as file:
+        json.dump(data, file, indent=2)
+
+
+def show_metrics():
+    """Hidden menu option: view call timings and profile the next action"""
+    global metrics
+    if metrics is None:
+        metrics = Metrics()
+        print("\nInstrumentation started; menu actions are timed from now on.")
+    
+    summary = metrics.summary()
+    print(f"\n--- Instrumentation (since {summary['since']}) ---")
+    print(f"{'Function':<22} {'Calls':>8} {'Total ms':>12} {'p50 ms':>10} {'p99 ms':>10}")
+    print("-" * 66)
+    for name, calls in summary["functions"].items():
+        print(f"{name:<22} {calls['calls']:>8} {calls['total_ms']:>12.1f} "
+              f"{calls['p50_ms']:>10.3f} {calls['p99_ms']:>10.3f}")
+    print(f"\nRoster bytes read: {summary['bytes_read']:,}  "
+          f"written: {summary['bytes_written']:,}")
+    if view_cache is not None:
+        for name, cache in view_cache.stats().items():
+            print(f"View cache ({name}): {cache['entries']}/{cache['capacity']} entries, "
+                  f"{cache['hits']} hits, {cache['misses']} misses")
+    if metrics.last_profile:
+        print(f"Last profile: {metrics.last_profile['function']} "
+              f"(peak {metrics.last_profile['peak_memory_bytes']:,} bytes, "
+              f"full stats in {PROFILE_FILE})")
+    
+    print("\n1. Profile the next action")
+    print("2. Show the last profile")
+    print(f"3. Save metrics to {METRICS_FILE}")
+    print("4. Reset")
+    print("5. Back")
+    choice = input("\nEnter your choice (1-5): ").strip()
+    
+    if choice == "1":
+        metrics.profile_next = True
+        print("\nThe next menu action will run under cProfile and tracemalloc.")
+    elif choice == "2":
+        if metrics.last_profile is None:
+            print("\nNothing has been profiled yet.")
+        else:
+            print(metrics.last_profile["profile"])
+            print("Top allocations:")
+            for line in metrics.last_profile["allocations"]:
+                print(f"  {line}")
+    elif choice == "3":
+        try:
+            dump_metrics()
+            print(f"\nMetrics saved to {METRICS_FILE}")
+        except OSError as e:
+            print(f"\nError saving metrics: {e}")
+    elif choice == "4":
+        metrics = Metrics()
+        print("\nMetrics reset.")
+
+
+# Menu choices that read or write the roster, so it must be opened first
+ROSTER_CHOICES = {"1", "2", "3", "4", "5", "6", "10", "11"}
 
 
 def main_menu():
@@ -391,6 +3617,7 @@ def main_menu():
         print("=" * 50)
         print("Student Academic Management System")
         print(f"Logged in as: {current_user['username']} ({current_user['role']})")
+        print(saver.status())
         print("=" * 50)
         
         print("\n1. Add Student (Admin only)")
@@ -402,8 +3629,12 @@ def main_menu():
         print("7. Load from File")
         print("8. Logout")
         print("9. Exit")
+        print("10. Rankings")
+        print("11. Filter Students")
         
-        choice = input("\nEnter your choice (1-9): ").strip()
+        choice = input("\nEnter your choice (1-11): ").strip()
+        if choice in ROSTER_CHOICES and not roster_opened:
+            open_roster()
         
         if choice == "1":
             add_student()
@@ -416,7 +3647,7 @@ def main_menu():
         elif choice == "5":
             generate_report()
         elif choice == "6":
-            save_to_file()
+            save_to_file(background=True)
         elif choice == "7":
             load_from_file()
         elif choice == "8":
@@ -425,22 +3656,193 @@ def main_menu():
         elif choice == "9":
             print("\nThank you for using Student Academic Management System!")
             return "exit"
+        elif choice == "10":
+            show_rankings()
+        elif choice == "11":
+            filter_students()
+        elif choice == "m":  # Hidden: instrumentation
+            show_metrics()
         else:
             print("\nInvalid choice! Please try again.")
         
         input("\nPress Enter to continue...")
 
 
+def open_roster() -> bool:
+    """
+    Load the saved roster, if there is one
+    Returns: True if existing records were found
+    """
+    global roster_opened
+    roster_opened = True
+    if isinstance(students, SQLiteStudentStore) and students:
+        print(f"\nOpened {len(students)} student records from {DATABASE_FILE}")
+        return True
+    if students:  # Records already in memory are not replaced by the file
+        return True
+    if os.path.exists(CSV_FILE) or (DATA_FORMAT == "snapshot" and os.path.exists(SNAPSHOT_FILE)):
+        print("\nFound existing student records. Loading...")
+        load_from_file()
+        return True
+    return False
+
+
+def report_summary(stats: ReportStats) -> Dict:
+    """Report statistics as a JSON-ready dict"""
+    return {"total_students": stats.total_students,
+            "passed_students": stats.passed_students,
+            "failed_students": stats.failed_students,
+            "overall_average": (stats.total_average / stats.total_students
+                                if stats.total_students else 0.0),
+            "grade_distribution": dict(stats.grade_distribution)}
+
+
+def cli_import(args) -> int:
+    """Add the students in a CSV file to the roster (or replace it)"""
+    reader = StudentCSVReader(args.file)
+    if args.replace:
+        kept = students.replace(reader)
+        print(f"Replaced the roster with {kept} student(s)", file=sys.stderr)
+    else:
+        added = sum(students.add(student) for student in reader)
+        print(f"Added {added} student(s), skipped {reader.rows_read - added} existing ID(s)",
+              file=sys.stderr)
+    for line_number, message in reader.errors:
+        print(f"Line {line_number}: {message}", file=sys.stderr)
+    return 1 if reader.error_count else 0
+
+
+def cli_add_grades(args) -> int:
+    """Append grades read as "student_id,grade" rows"""
+    report = ingest_grade_file(args.file)
+    for line_number, message in report.errors:
+        print(f"Line {line_number}: {message}", file=sys.stderr)
+    print(f"Added {report.applied} grade(s), rejected {report.rejected} row(s)",
+          file=sys.stderr)
+    return 1 if report.errors else 0
+
+
+def cli_report(args) -> int:
+    """Print the grade report, as text, JSON or CSV"""
+    if args.format == "text":
+        generate_report(workers=args.workers)
+        return 0
+    stats, problems = report_stats(workers=args.workers)
+    for problem in problems:
+        print(f"Warning: {problem}", file=sys.stderr)
+    sys.stdout.write(format_report(stats, args.format))
+    return 0
+
+
+def cli_export(args) -> int:
+    """Write the roster to a file, or as CSV to standard output ("-")"""
+    if args.file == "-":
+        write_roster_csv(sys.stdout, students)
+    else:
+        write_roster_file(args.file, args.format)
+        print(f"Exported {len(students)} student(s) to {args.file}", file=sys.stderr)
+    return 0
+
+
+def cli_query(args) -> int:
+    """Print the students matching the filters as CSV, JSON or a text table"""
+    try:
+        ids = find_students(args.min_average, args.max_average, args.letter,
+                            None if args.status is None else args.status == "pass",
+                            args.name_prefix)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    if args.limit is not None:
+        ids = ids[:args.limit]
+    write_lines(student_table_lines(map(students.get, ids), args.format))
+    return 0
+
+
+def build_cli_parser() -> "argparse.ArgumentParser":
+    """Describe the batch commands accepted by run_cli"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog="final_project.py",
+        description="Run one Student Academic Management System task without prompts. "
+                    "The password is read from the SAMS_PASSWORD environment variable.")
+    parser.add_argument("--user", required=True, help="username to run the command as")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    command = commands.add_parser("import", help="add students from a CSV file (admin)")
+    command.add_argument("file", help="roster CSV file, or - for standard input")
+    command.add_argument("--replace", action="store_true",
+                         help="replace the roster instead of adding new students")
+    command.set_defaults(handler=cli_import, admin=True)
+    
+    command = commands.add_parser("add-grades", help="append student_id,grade rows (admin)")
+    command.add_argument("file", nargs="?", default="-",
+                         help="CSV file of student_id,grade rows (default: standard input)")
+    command.set_defaults(handler=cli_add_grades, admin=True)
+    
+    command = commands.add_parser("report", help="print the grade report")
+    command.add_argument("--format", choices=OUTPUT_FORMATS, default="text")
+    command.add_argument("--workers", type=int, default=1,
+                         help="recompute the report from every grade on this many processes")
+    command.set_defaults(handler=cli_report, admin=False)
+    
+    command = commands.add_parser("export", help="write the roster to a file")
+    command.add_argument("file", help="output file, or - for CSV on standard output")
+    command.add_argument("--format", choices=("csv", "snapshot"), default="csv")
+    command.set_defaults(handler=cli_export, admin=False)
+    
+    command = commands.add_parser("query", help="print students matching filters")
+    command.add_argument("--min-average", type=float)
+    command.add_argument("--max-average", type=float)
+    command.add_argument("--letter", choices=LETTERS, type=str.upper)
+    command.add_argument("--status", choices=("pass", "fail"))
+    command.add_argument("--name-prefix")
+    command.add_argument("--limit", type=int, help="print at most this many students")
+    command.add_argument("--format", choices=OUTPUT_FORMATS, default="csv")
+    command.set_defaults(handler=cli_query, admin=False)
+    return parser
+
+
+def run_cli(argv: List[str]) -> int:
+    """
+    Run one batch command from the command line
+    Status messages go to standard error so that standard output only
+    carries the command's data
+    Returns: the process exit status
+    """
+    global current_user
+    args = build_cli_parser().parse_args(argv)
+    
+    current_user = authenticate(args.user, os.environ.get("SAMS_PASSWORD", ""))
+    if current_user is None:
+        print("Error: invalid username or SAMS_PASSWORD", file=sys.stderr)
+        return 2
+    if args.admin and current_user["role"] != "admin":
+        print(f"Error: only administrators can run {args.command}", file=sys.stderr)
+        return 2
+    
+    with redirect_stdout(sys.stderr):
+        open_roster()
+    try:
+        status = args.handler(args)
+    except BrokenPipeError:
+        # The reader of our output (e.g. head) exited; drop what is left
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    if args.admin and not isinstance(students, SQLiteStudentStore):
+        with redirect_stdout(sys.stderr):
+            if not save_to_file():
+                status = 1
+    return status
+
+
 def main():
     """Main program entry point"""
     print("Welcome to Student Academic Management System")
     print("=" * 50)
     
-    # Attempt to load existing data
-    if os.path.exists("student_records.csv"):
-        print("\nFound existing student records. Loading...")
-        load_from_file()
-        input("\nPress Enter to continue...")
+    # The saved roster is opened by the first menu action that needs it
+    # (see ROSTER_CHOICES), so the login prompt appears at once
     
     # Main program loop
     while True:
@@ -459,7 +3861,14 @@ def main():
             global current_user
             current_user = None
             continue
+    
+    # Finish any save still being written before the process exits
+    if saver.busy:
+        print("\nWaiting for the last save to finish...")
+        saver.wait()
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
     main()
\ No newline at end of file
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Server mode for Student Academic Management System
+Serves the student store to many clients at once over TCP or a Unix socket
+Usage: python server.py [--host HOST] [--port PORT] [--unix PATH]
+
+Protocol: one JSON object per line in each direction. Every request has an
+"op" field; every response is {"ok": true, "result": ...} or
+{"ok": false, "error": "..."}. A connection starts with
+{"op": "login", "username": ..., "password": ...}.
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import json
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import final_project as app
+
+# Longest request line accepted (bulk add_grades requests can be large)
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+
+class RequestError(Exception):
+    """A request that cannot be served; the message is sent to the client"""
+
+
+class ReadWriteLock:
+    """
+    Readers-writer lock for asyncio tasks
+    Any number of readers may hold the lock together, a writer holds it
+    alone. A waiting writer stops new readers from entering, so a steady
+    stream of reads cannot starve writes.
+    """
+
+    def __init__(self):
+        self._changed = asyncio.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @asynccontextmanager
+    async def read(self):
+        async with self._changed:
+            await self._changed.wait_for(
+                lambda: not self._writing and not self._writers_waiting)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self._readers -= 1
+                if not self._readers:
+                    self._changed.notify_all()
+
+    @asynccontextmanager
+    async def write(self):
+        async with self._changed:
+            self._writers_waiting += 1
+            try:
+                await self._changed.wait_for(lambda: not self._writing and not self._readers)
+            finally:
+                self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self._writing = False
+                self._changed.notify_all()
+
+
+def student_json(student) -> Dict:
+    """A student record as sent to clients"""
+    return {"id": student["id"], "name": student["name"], "grades": list(student["grades"]),
+            "average": student["average"], "letter": student["letter"],
+            "status": "Pass" if student["average"] >= 60 else "Fail"}
+
+
+def find_student(request: Dict):
+    """Return the student named by the request's "id", or raise RequestError"""
+    student = app.students.get(str(request.get("id", "")))
+    if student is None:
+        raise RequestError(f"no student with ID {request.get('id')}")
+    return student
+
+
+def request_grade(request: Dict) -> float:
+    """Return the request's "grade" if it is between 0 and 100"""
+    grade = app.parse_grade(request.get("grade"))
+    if not app.valid_grade_mask([grade])[0]:
+        raise RequestError("grade must be a number between 0 and 100")
+    return grade
+
+
+def request_index(request: Dict, student) -> int:
+    """Return the request's grade "index" if the student has that grade"""
+    index = request.get("index")
+    if not isinstance(index, int) or not 0 <= index < len(student["grades"]):
+        raise RequestError("invalid grade index")
+    return index
+
+
+# Read operations run together under the read lock
+
+def op_get(request: Dict):
+    return student_json(find_student(request))
+
+
+def op_search(request: Dict):
+    return [student_json(student)
+            for student in app.students.search_name(str(request.get("name", "")))]
+
+
+def op_list(request: Dict):
+    sort_key = request.get("sort")
+    if sort_key is not None and sort_key not in app.STUDENT_SORT_KEYS:
+        raise RequestError(f"unknown sort order {sort_key}")
+    offset = max(int(request.get("offset", 0)), 0)
+    limit = min(max(int(request.get("limit", app.PAGE_SIZE)), 0), 1000)
+    ids = app.students.sorted_ids(sort_key)
+    return {"total": len(ids),
+            "students": [student_json(app.students.get(student_id))
+                         for student_id in ids[offset:offset + limit]]}
+
+
+def op_report(request: Dict):
+    return app.report_summary(app.students.stats)
+
+
+def op_filter(request: Dict):
+    status = request.get("status")
+    try:
+        ids = app.find_students(request.get("min_average"), request.get("max_average"),
+                                request.get("letter"),
+                                None if status is None else status == "pass",
+                                request.get("name_prefix"))
+    except (TypeError, ValueError) as e:
+        raise RequestError(str(e)) from None
+    return [student_json(app.students.get(student_id))
+            for student_id in ids[:int(request.get("limit", 1000))]]
+
+
+def op_rank(request: Dict):
+    index = app.get_rank_index()
+    student = find_student(request)
+    return {"id": student["id"], "rank": index.rank(student["id"]), "of": len(index),
+            "percentile": index.percentile(student["id"])}
+
+
+def op_top(request: Dict):
+    return [student_json(app.students.get(student_id))
+            for student_id in app.get_rank_index().top(int(request.get("k", 10)))]
+
+
+# Write operations run one at a time under the write lock (admin only)
+
+def op_add_student(request: Dict):
+    student_id = str(request.get("id", "")).strip()
+    name = str(request.get("name", "")).strip()
+    grades = request.get("grades", [])
+    if not student_id or not name:
+        raise RequestError("id and name are required")
+    if not isinstance(grades, list):
+        raise RequestError("grades must be a list")
+    grades = [app.parse_grade(grade) for grade in grades]
+    if not grades or not all(app.valid_grade_mask(grades)):
+        raise RequestError("at least one grade is required, each between 0 and 100")
+    if not app.students.add({"id": student_id, "name": name, "grades": grades}):
+        raise RequestError(f"student ID {student_id} already exists")
+    return student_json(app.students.get(student_id))
+
+
+def op_add_grade(request: Dict):
+    student = find_student(request)
+    app.students.add_grade(student, request_grade(request))
+    return student_json(student)
+
+
+def op_add_grades(request: Dict):
+    events = request.get("events")
+    if not isinstance(events, list) or not all(
+            isinstance(event, list) and len(event) == 2 for event in events):
+        raise RequestError("events must be a list of [student_id, grade] pairs")
+    report = app.ingest_grades((str(student_id), grade) for student_id, grade in events)
+    return {"applied": report.applied, "students_updated": report.students_updated,
+            "errors": report.errors}
+
+
+def op_update_grade(request: Dict):
+    student = find_student(request)
+    app.students.update_grade(student, request_index(request, student), request_grade(request))
+    return student_json(student)
+
+
+def op_delete_grade(request: Dict):
+    student = find_student(request)
+    index = request_index(request, student)
+    if len(student["grades"]) == 1:
+        raise RequestError("cannot delete the only grade")
+    return {"deleted": app.students.delete_grade(student, index),
+            "student": student_json(student)}
+
+
+READ_OPS = {"get": op_get, "search": op_search, "list": op_list, "report": op_report,
+            "filter": op_filter, "rank": op_rank, "top": op_top}
+WRITE_OPS = {"add_student": op_add_student, "add_grade": op_add_grade,
+             "add_grades": op_add_grades, "update_grade": op_update_grade,
+             "delete_grade": op_delete_grade}
+
+
+class StudentServer:
+    """
+    Serves the module-level student store of final_project to many clients
+    Requests run on a thread pool so a slow report never stalls the event
+    loop; reads share a ReadWriteLock and writes hold it alone. Saving
+    copies the roster under the read lock and writes the file outside it.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.lock = ReadWriteLock()
+        self.save_lock = asyncio.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count())
+        self.requests_served = 0
+        # Build the lazy indexes now, so concurrent readers never race to create them
+        app.get_rank_index()
+        app.get_name_prefix_index()
+
+    async def run(self, func, *args):
+        """Run a blocking function on the worker threads"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def handle(self, request: Dict, session: Dict):
+        """Serve one request for a connection"""
+        op = request.get("op")
+        if op == "login":
+            user = app.authenticate(str(request.get("username", "")),
+                                    str(request.get("password", "")))
+            if user is None:
+                raise RequestError("invalid credentials")
+            session["user"] = user
+            return user
+        if session.get("user") is None:
+            raise RequestError("login required")
+
+        if op in READ_OPS:
+            async with self.lock.read():
+                return await self.run(READ_OPS[op], request)
+        if op in WRITE_OPS or op == "save":
+            if session["user"]["role"] != "admin":
+                raise RequestError(f"only administrators can {op}")
+            if op == "save":
+                return await self.save(request)
+            async with self.lock.write():
+                return await self.run(WRITE_OPS[op], request)
+        raise RequestError(f"unknown op {op}")
+
+    async def save(self, request: Dict):
+        """
+        Save like save_to_file: append the journal when it is on, otherwise
+        write the roster file without blocking readers during the write
+        """
+        file_format = request.get("format", app.DATA_FORMAT)
+        if file_format not in ("csv", "snapshot"):
+            raise RequestError(f"unknown file format {file_format}")
+        filename = app.SNAPSHOT_FILE if file_format == "snapshot" else app.CSV_FILE
+        journal = app.journal
+        # One save at a time, so a later copy of the roster is never
+        # overwritten by an earlier one that finished writing last
+        async with self.save_lock:
+            async with self.lock.read():
+                if journal is not None and not journal.should_compact(filename,
+                                                                      len(app.students)):
+                    count = await self.run(journal.flush)
+                    return {"saved": journal.filename, "changes": count}
+                records, stats = await self.run(
+                    lambda: (app.copy_roster(app.students), app.students.stats.copy()))
+                if journal is not None:
+                    journal.cut()
+            try:
+                await self.run(app.write_roster_file, filename, file_format, records, stats)
+            except BaseException:
+                if journal is not None:
+                    # The changes cut from the queue are only in memory now
+                    journal.needs_compaction = True
+                raise
+            if journal is not None:
+                # Writes made during the save stay queued for the new log
+                await self.run(journal.start, filename, True)
+        return {"saved": filename, "students": len(records)}
+
+    async def serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer one connection's requests until it closes"""
+        session = {"user": None}
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:  # Line longer than MAX_REQUEST_BYTES
+                    response = {"ok": False, "error": "request too large"}
+                    writer.write((json.dumps(response) + "\n").encode())
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise RequestError("request must be a JSON object")
+                    response = {"ok": True, "result": await self.handle(request, session)}
+                except RequestError as e:
+                    response = {"ok": False, "error": str(e)}
+                except (TypeError, ValueError) as e:
+                    response = {"ok": False, "error": f"bad request: {e}"}
+                self.requests_served += 1
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8571,
+                    unix_path: Optional[str] = None) -> asyncio.AbstractServer:
+        """Start listening; returns the asyncio server"""
+        if unix_path:
+            return await asyncio.start_unix_server(self.serve_client, unix_path,
+                                                   limit=MAX_REQUEST_BYTES)
+        return await asyncio.start_server(self.serve_client, host, port,
+                                          limit=MAX_REQUEST_BYTES)
+
+
+async def serve(host: str, port: int, unix_path: Optional[str]):
+    """Load the roster and serve it until interrupted"""
+    app.open_roster()
+    server = await StudentServer().start(host, port, unix_path)
+    where = unix_path or f"{host}:{port}"
+    print(f"\nServing {len(app.students)} student records on {where}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve student records over a JSON protocol")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8571)
+    parser.add_argument("--unix", help="listen on a Unix socket at this path instead")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        sys.exit(0)
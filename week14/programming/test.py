@@ -6,7 +6,10 @@ This script provides automated testing and demonstration of the system
 
 import os
 import sys
+import math
+import json
 import time
+import tracemalloc
 from unittest.mock import patch
 import io
 
@@ -14,7 +17,13 @@ import io
 from final_project import (
     students, add_student, search_student, calculate_average,
     get_letter_grade, generate_report, save_to_file, load_from_file,
-    current_user
+    current_user, StudentStore, ReportStats, batch_grade, roster_grade_arrays,
+    ColumnarStudentStore, StudentCSVReader, stream_report, BulkCSVReader,
+    save_snapshot, Journal, replay_journal, atomic_open, copy_roster, BackgroundSaver,
+    SQLiteStudentStore, view_all_students, RankIndex, find_students, run_cli,
+    ingest_grades, parallel_report_stats, ShardedCSVReader, Metrics, dump_metrics,
+    write_roster_file, write_lines, student_table_lines, render_report, format_report,
+    report_summary, StudentViewCache
 )
 
 
@@ -167,6 +176,1296 @@ def test_conditional_logic():
     return True
 
 
+def test_student_store():
+    """Test ID lookups and duplicate handling in the student store"""
+    print_section("Testing Student Store")
+    
+    store = StudentStore()
+    assert store.add({"id": "S1", "name": "Alice", "grades": [90]})
+    assert store.add({"id": "S2", "name": "Bob", "grades": [70]})
+    assert not store.add({"id": "S1", "name": "Duplicate", "grades": [50]})
+    
+    print(f"  Students in store: {len(store)}")
+    assert len(store) == 2
+    assert "S2" in store and "S3" not in store
+    assert store.get("S1")["name"] == "Alice"
+    
+    store.remove("S1")
+    assert store.get("S1") is None
+    assert [s["id"] for s in store] == ["S2"]
+    
+    kept = store.replace([
+        {"id": "S7", "name": "First", "grades": [80]},
+        {"id": "S7", "name": "Second", "grades": [60]},
+    ])
+    print(f"  Records kept after reload with duplicates: {kept}")
+    assert kept == 1 and store.get("S7")["name"] == "First"
+    assert store.get("S2") is None
+    
+    print("\nAll student store tests passed!")
+    return True
+
+
+def test_name_search():
+    """Test that the name index returns the same matches as a full scan"""
+    print_section("Testing Name Search")
+    
+    store = StudentStore()
+    names = ["Alice Johnson", "Bob Smith", "Charlie Brown", "Diana Prince",
+             "Ethan Hunt", "Johnny Bravo", "Al Brownson"]
+    for i, name in enumerate(names):
+        store.add({"id": f"S{i}", "name": name, "grades": [75]})
+    assert store.search_name("ali")  # Builds the index, later changes update it
+    store.remove("S3")
+    store.add({"id": "S3", "name": "Diana Prince", "grades": [75]})
+    
+    def check(queries):
+        for query in queries:
+            expected = [s["id"] for s in store if query.lower() in s["name"].lower()]
+            found = [s["id"] for s in store.search_name(query)]
+            print(f"  '{query}': {found}")
+            assert found == expected, f"Name search mismatch for '{query}'"
+    
+    check(["", "a", "AL", "bro", "brown", "john", "ohnso", "zzz", "n h"])
+    
+    # Removing most names compacts the index
+    for student_id in ("S0", "S1", "S2", "S4", "S5"):
+        store.remove(student_id)
+    store.add({"id": "S9", "name": "Alicia Brown", "grades": [75]})
+    check(["", "al", "brown", "prince"])
+    
+    print("\nAll name search tests passed!")
+    return True
+
+
+def test_cached_aggregates():
+    """Test that cached averages follow grade edits"""
+    print_section("Testing Cached Aggregates")
+    
+    store = StudentStore()
+    student = {"id": "S1", "name": "Alice", "grades": [80, 90]}
+    store.add(student)
+    assert student["average"] == 85 and student["letter"] == "B"
+    
+    store.add_grade(student, 100)
+    print(f"  After adding 100: {student['average']:.2f} ({student['letter']})")
+    assert student["average"] == calculate_average(student["grades"])
+    assert student["letter"] == "A"
+    
+    store.update_grade(student, 0, 20)
+    print(f"  After changing 80 to 20: {student['average']:.2f} ({student['letter']})")
+    assert student["average"] == calculate_average(student["grades"])
+    assert student["letter"] == "C"
+    
+    deleted = store.delete_grade(student, 1)
+    print(f"  After deleting {deleted}: {student['average']:.2f} ({student['letter']})")
+    assert student["grades"] == [20, 100] and student["grade_count"] == 2
+    assert student["average"] == 60 and student["letter"] == "D"
+    
+    # Edits must not let the cached sum drift off a letter cutoff
+    import random
+    rng = random.Random(3)
+    for store in (StudentStore(), ColumnarStudentStore(), SQLiteStudentStore()):
+        store.add({"id": "S2", "name": "Bob", "grades": [55.8, 72.6]})
+        student = store.get("S2")
+        store.update_grade(student, 0, 88.5)
+        store.add_grade(student, 48.9)
+        assert student["average"] == 70.0 and student["letter"] == "C"
+        for _ in range(300):
+            grades = student["grades"]
+            if len(grades) > 1 and rng.random() < 0.3:
+                store.delete_grade(student, rng.randrange(len(grades)))
+            elif rng.random() < 0.5:
+                store.update_grade(student, rng.randrange(len(grades)), round(rng.uniform(0, 100), 1))
+            else:
+                store.add_grade(student, round(rng.uniform(0, 100), 1))
+            assert student["average"] == calculate_average(list(student["grades"]))
+        assert vars(store.stats) == vars(ReportStats.from_records(store))
+    print(f"  [55.8, 72.6], 55.8 -> 88.5, add 48.9: average 70.0 (C) in every store")
+    
+    print("\nAll cached aggregate tests passed!")
+    return True
+
+
+def test_report_stats():
+    """Test that running report statistics match a full recompute"""
+    print_section("Testing Report Statistics")
+    
+    store = StudentStore()
+    store.add({"id": "S1", "name": "Alice", "grades": [95, 85]})
+    store.add({"id": "S2", "name": "Bob", "grades": [55]})
+    store.add({"id": "S3", "name": "Cara", "grades": [72.5, 61.25]})
+    store.add_grade(store.get("S2"), 85)
+    store.update_grade(store.get("S3"), 0, 33.3)
+    store.delete_grade(store.get("S1"), 1)
+    store.remove("S3")
+    store.add({"id": "S4", "name": "Dan", "grades": [60]})
+    
+    stats = store.stats
+    print(f"  Total: {stats.total_students}, Passed: {stats.passed_students}, "
+          f"Failed: {stats.failed_students}")
+    print(f"  Distribution: {stats.grade_distribution}")
+    assert stats.verify(store) == []
+    assert stats.total_students == 3 and stats.passed_students == 3
+    assert stats.grade_distribution == {"A": 1, "B": 0, "C": 1, "D": 1, "F": 0}
+    
+    store.get("S4")["grades"].append(0)
+    stale = ReportStats.from_records(store)
+    assert stats.verify(store) != []
+    assert stale.failed_students == 1
+    
+    print("\nAll report statistics tests passed!")
+    return True
+
+
+def test_batch_grading():
+    """Test that batch grading matches the scalar functions exactly"""
+    print_section("Testing Batch Grading")
+    
+    roster = [
+        {"id": "S1", "name": "A", "grades": [90, 89.5, 90.5]},
+        {"id": "S2", "name": "B", "grades": []},
+        {"id": "S3", "name": "C", "grades": [0.1, 0.2, 99.7, 60.0000001]},
+        {"id": "S4", "name": "D", "grades": [59.99, 60.01]},
+        {"id": "S5", "name": "E", "grades": [79.999999, 80]},
+        {"id": "S6", "name": "F", "grades": [100]},
+    ]
+    averages, letters, passed = batch_grade(*roster_grade_arrays(roster))
+    
+    for student, avg, letter, ok in zip(roster, averages, letters, passed):
+        expected = calculate_average(student["grades"])
+        print(f"  {student['id']}: {float(avg)!r} {letter} {'Pass' if ok else 'Fail'}")
+        assert float(avg) == expected, f"Average mismatch for {student['id']}"
+        assert letter == get_letter_grade(expected)
+        assert bool(ok) == (expected >= 60)
+    
+    print("\nAll batch grading tests passed!")
+    return True
+
+
+def test_columnar_store():
+    """Test that the columnar store behaves like the dict store in less memory"""
+    print_section("Testing Columnar Store")
+    
+    def snapshot(store):
+        return [(s["id"], s["name"], s["grades"], s["average"], s["letter"])
+                for s in store]
+    
+    dict_store = StudentStore()
+    columnar_store = ColumnarStudentStore()
+    for store in (dict_store, columnar_store):
+        store.replace([
+            {"id": "S1", "name": "Alice Johnson", "grades": [85.0, 92.0]},
+            {"id": "S2", "name": "Bob Smith", "grades": [55.0]},
+            {"id": "S1", "name": "Duplicate", "grades": [10.0]},
+        ])
+        store.add({"id": "S3", "name": "Alicia Keys", "grades": [70.0, 65.0, 61.0]})
+        store.add_grade(store.get("S1"), 99.0)
+        store.add_grade(store.get("S2"), 75.0)
+        store.update_grade(store.get("S3"), 1, 90.0)
+        store.delete_grade(store.get("S3"), 0)
+        store.remove("S2")
+        store.add({"id": "S4", "name": "Bob Stone", "grades": [40.0]})
+        store.add_grade(store.get("S1"), 50.0)
+    
+    print(f"  Columnar roster: {snapshot(columnar_store)}")
+    assert snapshot(columnar_store) == snapshot(dict_store)
+    assert columnar_store.stats.verify(columnar_store) == []
+    assert ([s["id"] for s in columnar_store.search_name("ali")]
+            == [s["id"] for s in dict_store.search_name("ali")])
+    
+    # Compare memory for a roster built from student_records.csv rows
+    base_rows = [
+        ("Alice Johnson", [85.0, 92.0, 78.0, 88.0, 90.0]),
+        ("Bob Smith", [75.0, 68.0, 82.0, 79.0, 85.0]),
+        ("Charlie Brown", [92.0, 95.0, 98.0, 94.0, 96.0]),
+        ("Diana Prince", [65.0, 70.0, 68.0, 72.0, 69.0]),
+        ("Ethan Hunt", [55.0, 58.0, 52.0, 48.0, 60.0]),
+    ]
+    
+    def measure(store_class, searched):
+        """Bytes per student, before or after a first name search"""
+        tracemalloc.start()
+        store = store_class()
+        store.replace({"id": f"S{100000 + i}", "name": name, "grades": list(grades)}
+                      for i in range(20000)
+                      for name, grades in [base_rows[i % len(base_rows)]])
+        if searched:
+            store.search_name("a")
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return used / 20000
+    
+    # The dict store builds its name index on the first search; the
+    # columnar store searches its string table and keeps no index
+    for searched in (False, True):
+        dict_bytes = measure(StudentStore, searched)
+        columnar_bytes = measure(ColumnarStudentStore, searched)
+        ratio = dict_bytes / columnar_bytes
+        label = "after a name search" if searched else "records only"
+        print(f"  Bytes per student ({label}): dict {dict_bytes:.0f}, "
+              f"columnar {columnar_bytes:.0f} ({ratio:.1f}x)")
+        assert ratio >= 5
+    
+    print("\nAll columnar store tests passed!")
+    return True
+
+
+def test_streaming_loader():
+    """Test that bad rows are reported without aborting the load"""
+    print_section("Testing Streaming Loader")
+    
+    filename = "test_stream_records.csv"
+    with open(filename, "w", newline="") as f:
+        f.write("ID,Name,Grades\n")
+        f.write("S1,Alice,90;80\n")
+        f.write("S2,Bob,abc\n")
+        f.write(",Nobody,50\n")
+        f.write("S3,Cara,101\n")
+        f.write("S4,Dan,55;60\n")
+        f.write("S1,Alice Again,10\n")
+    
+    try:
+        errors = []
+        reader = StudentCSVReader(filename, lambda line, message: errors.append(line))
+        loaded = [student["id"] for student in reader]
+        print(f"  Loaded: {loaded}")
+        for line_number, message in reader.errors:
+            print(f"  Line {line_number}: {message}")
+        assert loaded == ["S1", "S4", "S1"]
+        assert errors == [3, 4, 5] and reader.error_count == 3
+        
+        chunks = list(StudentCSVReader(filename).chunks(2))
+        assert [len(chunk) for chunk in chunks] == [2, 1]
+        
+        stats = stream_report(filename)
+        print(f"  Streamed report: {stats.total_students} students, "
+              f"{stats.passed_students} passed")
+        assert stats.total_students == 2 and stats.passed_students == 1
+    finally:
+        os.remove(filename)
+    
+    print("\nAll streaming loader tests passed!")
+    return True
+
+
+def test_bulk_import():
+    """Test that the bulk columnar import matches the streaming loader"""
+    print_section("Testing Bulk Import")
+    
+    filename = "test_bulk_records.csv"
+    with open(filename, "w", newline="") as f:
+        f.write("ID,Name,Grades\r\n")
+        for i in range(50):
+            f.write(f"S{i},Student {i},{i};{100 - i};{i % 7 + 0.5}\r\n")
+        f.write('S50,"Doe, Jane",77\r\n')
+        f.write("S51,Bad Grade,7;x\r\n")
+        f.write("S3,Duplicate,10\r\n")
+        f.write("S52,No Newline,88")
+    
+    try:
+        BulkCSVReader.BLOCK_SIZE, block_size = 256, BulkCSVReader.BLOCK_SIZE
+        bulk = BulkCSVReader(filename)
+        bulk_store = bulk.load_columnar()
+        BulkCSVReader.BLOCK_SIZE = block_size
+        
+        streamed = StudentCSVReader(filename)
+        streamed_store = StudentStore()
+        streamed_store.replace(streamed)
+        
+        rows = lambda store: [(s["id"], s["name"], s["grades"]) for s in store]
+        print(f"  Bulk: {len(bulk_store)} students, errors {bulk.errors}")
+        assert rows(bulk_store) == rows(streamed_store)
+        assert bulk.errors == streamed.errors and bulk.rows_read == streamed.rows_read
+        assert vars(bulk_store.stats) == vars(streamed_store.stats)
+        
+        # Quoted line breaks must not be cut at a block boundary
+        with open(filename, "w", newline="") as f:
+            f.write("ID,Name,Grades\r\n")
+            for i in range(40):
+                name = f'"Line {i}\r\nof ""{i}"""' if i % 9 == 4 else f"Student {i}"
+                f.write(f"S{i},{name},{i};{100 - i}\r\n")
+        streamed = StudentCSVReader(filename)
+        streamed_store = StudentStore()
+        streamed_store.replace(streamed)
+        for size in range(16, 700):
+            BulkCSVReader.BLOCK_SIZE = size
+            bulk = BulkCSVReader(filename)
+            bulk_store = bulk.load_columnar()
+            assert rows(bulk_store) == rows(streamed_store), size
+            assert bulk.errors == streamed.errors == []
+        print(f"  Quoted line breaks: {len(bulk_store)} students at every block size")
+    finally:
+        BulkCSVReader.BLOCK_SIZE = block_size
+        os.remove(filename)
+    
+    print("\nAll bulk import tests passed!")
+    return True
+
+
+def test_snapshot():
+    """Test writing and memory-mapping a binary snapshot"""
+    print_section("Testing Binary Snapshot")
+    
+    filename = "test_records.snapshot"
+    source = StudentStore()
+    source.replace([
+        {"id": "S3", "name": "Chloé Brown", "grades": [92.5, 95.0]},
+        {"id": "S1", "name": "Alice Johnson", "grades": [85.0, 60.0, 78.0]},
+        {"id": "S2", "name": "Bob Smith", "grades": []},
+    ])
+    rows = lambda store: [(s["id"], s["name"], s["grades"], s["average"], s["letter"])
+                          for s in store]
+    
+    try:
+        size = save_snapshot(filename, source)
+        print(f"  Snapshot size: {size} bytes")
+        mapped = ColumnarStudentStore.open_snapshot(filename)
+        assert rows(mapped) == rows(source)
+        assert vars(mapped.stats) == vars(source.stats)
+        assert mapped.get("S1")["name"] == "Alice Johnson"
+        assert mapped.get("S4") is None and "S2" in mapped
+        assert [s["id"] for s in mapped.search_name("loé")] == ["S3"]
+        
+        # The first change copies the mapped data, after which it can be rewritten
+        mapped.add_grade(mapped.get("S2"), 40.0)
+        mapped.add({"id": "S0", "name": "Zed", "grades": [100.0]})
+        source.add_grade(source.get("S2"), 40.0)
+        source.add({"id": "S0", "name": "Zed", "grades": [100.0]})
+        assert rows(mapped) == rows(source)
+        assert mapped.stats.verify(mapped) == []
+        save_snapshot(filename, mapped)
+        assert rows(ColumnarStudentStore.open_snapshot(filename)) == rows(source)
+        print(f"  Reopened after edits: {len(source)} students")
+    finally:
+        os.remove(filename)
+    
+    print("\nAll snapshot tests passed!")
+    return True
+
+
+def test_journal():
+    """Test journaled saves, crash recovery and compaction"""
+    print_section("Testing Change Journal")
+    
+    base, log = "test_journal_base.snapshot", "test_journal.journal"
+    rows = lambda store: [(s["id"], s["name"], s["grades"]) for s in store]
+    
+    def recover():
+        store = StudentStore()
+        store.replace(ColumnarStudentStore.open_snapshot(base))
+        applied = Journal(log).replay(store, base)
+        return store, applied
+    
+    store = StudentStore()
+    store.replace([{"id": "S1", "name": "Alice", "grades": [80.0, 90.0]},
+                   {"id": "S2", "name": "Bob", "grades": [55.0]}])
+    journal = Journal(log)
+    store.subscribe(journal.record)
+    
+    try:
+        save_snapshot(base, store)
+        journal.start(base)
+        
+        store.add_grade(store.get("S2"), 75.0)
+        store.add({"id": "S3", "name": "Cara", "grades": [60.0]})
+        store.update_grade(store.get("S1"), 0, 100.0)
+        store.delete_grade(store.get("S1"), 1)
+        store.remove("S3")
+        assert journal.flush() == 5 and journal.flush() == 0
+        
+        recovered, applied = recover()
+        print(f"  Replayed {applied} change(s) after a simulated crash")
+        assert applied == 5 and rows(recovered) == rows(store)
+        
+        # A torn final line keeps everything written before it
+        store.add_grade(store.get("S1"), 70.0)
+        journal.flush()
+        with open(log, "a") as f:
+            f.write('{"op": "add_gr')
+        recovered, applied = recover()
+        assert applied == 6 and rows(recovered) == rows(store)
+        
+        # After compaction the old entries are folded into the roster file
+        save_snapshot(base, store)
+        journal.start(base)
+        recovered, applied = recover()
+        assert applied == 0 and rows(recovered) == rows(store)
+        
+        # A log written for an older roster file is never replayed, but kept
+        store.add_grade(store.get("S2"), 10.0)
+        journal.flush()
+        save_snapshot(base, store)
+        recovered = StudentStore()
+        recovered.replace(ColumnarStudentStore.open_snapshot(base))
+        stale = Journal(log)
+        with patch("final_project.journal", stale), patch("final_project.students", recovered), \
+                patch("sys.stdout", io.StringIO()) as output:
+            replay_journal(base)
+        assert stale.discarded == 1 and rows(recovered) == rows(store)
+        assert not os.path.exists(log) and os.path.exists(log + ".stale")
+        assert "1 logged change(s) were not applied" in output.getvalue()
+        print("  Compacted journals are ignored, stale ones kept aside")
+    finally:
+        for filename in (base, log, log + ".stale"):
+            if os.path.exists(filename):
+                os.remove(filename)
+    
+    print("\nAll journal tests passed!")
+    return True
+
+
+def test_background_save():
+    """Test atomic writes and coalesced background saves"""
+    print_section("Testing Background Saves")
+    
+    filename = "test_background.csv"
+    with open(filename, "w") as f:
+        f.write("ID,Name,Grades\n")
+    
+    try:
+        # A failed write leaves the previous file untouched
+        try:
+            with atomic_open(filename, "w") as f:
+                f.write("partial")
+                raise RuntimeError("disk full")
+        except RuntimeError:
+            pass
+        with open(filename) as f:
+            assert f.read() == "ID,Name,Grades\n"
+        assert not [name for name in os.listdir(".") if name.startswith(filename + ".")]
+        print("  Interrupted write kept the old file")
+        
+        # The copy is taken before the save, so later edits are not written
+        store = StudentStore()
+        store.replace([{"id": "S1", "name": "Alice", "grades": [80.0, 90.0]}])
+        saver = BackgroundSaver()
+        for grade in (70.0, 60.0, 50.0):
+            store.add_grade(store.get("S1"), grade)
+            saver.request(filename, "csv", copy_roster(store), store.stats.copy())
+        store.add_grade(store.get("S1"), 0.0)
+        assert saver.wait(timeout=10)
+        
+        with open(filename) as f:
+            assert f.read().splitlines()[1] == "S1,Alice,80.0;90.0;70.0;60.0;50.0"
+        assert saver.last_error is None and saver.last_filename == filename
+        print(f"  {saver.coalesced} save request(s) coalesced")
+        print(f"  {saver.status()}")
+        
+        saver.request(os.path.join("missing_dir", "roster.csv"), "csv", [], ReportStats())
+        saver.wait(timeout=10)
+        assert saver.status().startswith("Last save failed")
+    finally:
+        if os.path.exists(filename):
+            os.remove(filename)
+    
+    print("\nAll background save tests passed!")
+    return True
+
+
+def test_sqlite_store():
+    """Test that the SQLite store matches the dict store and persists changes"""
+    print_section("Testing SQLite Store")
+    
+    filename = "test_store.db"
+    fields = ("id", "name", "grades", "grade_sum", "grade_count", "average", "letter")
+    rows = lambda store: [tuple(s[field] for field in fields) for s in store]
+    
+    reference = StudentStore()
+    store = SQLiteStudentStore(filename)
+    try:
+        for target in (reference, store):
+            target.replace([{"id": "S1", "name": "Alice Johnson", "grades": [80.0, 90.0]},
+                            {"id": "S2", "name": "Bob Smith", "grades": [55.0]},
+                            {"id": "S1", "name": "Duplicate", "grades": [10.0]},
+                            {"id": "S3", "name": "Chloé Brown", "grades": []}])
+            assert target.add({"id": "S4", "name": "Dan Lee", "grades": [70.5]})
+            assert not target.add({"id": "S4", "name": "Dan Again", "grades": [1.0]})
+            target.add_grade(target.get("S2"), 75.0)
+            target.add_grade(target.get("S3"), 99.0)
+            target.update_grade(target.get("S1"), -1, 100.0)
+            assert target.delete_grade(target.get("S1"), 0) == 80.0
+            target.remove("S4")
+        
+        assert rows(store) == rows(reference) and len(store) == 3
+        assert "S2" in store and "S4" not in store and store.get("S4") is None
+        for query in ("", "o", "BRO", "loé", "zzz", "n sm", 'e "j', "ohn", "s"):
+            assert ([s["id"] for s in store.search_name(query)]
+                    == [s["id"] for s in reference.search_name(query)])
+        assert not store.stats.verify(reference)
+        print(f"  {len(store)} students match the dict store after every change")
+        
+        plan = store._db.execute("EXPLAIN QUERY PLAN SELECT row FROM students "
+                                 "WHERE id = ?", ("S1",)).fetchall()
+        assert "USING INDEX" in plan[0][-1] or "USING COVERING INDEX" in plan[0][-1]
+        # Name searches of three or more characters go through the trigram index
+        plan = [step[-1] for step in store._db.execute(
+            "EXPLAIN QUERY PLAN SELECT row FROM students WHERE row IN (SELECT rowid "
+            "FROM students_names WHERE students_names MATCH ?) ORDER BY row", ('"bro"',))]
+        print(f"  Name search plan: {plan}")
+        assert any("students_names VIRTUAL TABLE INDEX" in step for step in plan)
+        assert not any(step.startswith("SCAN students ") for step in plan)
+        
+        store.close()
+        store = SQLiteStudentStore(filename)
+        assert rows(store) == rows(reference)
+        print("  Changes are still there after reopening the database")
+        
+        store.clear()
+        assert not store and len(store) == 0
+        assert store._db.execute("SELECT COUNT(*) FROM grades").fetchone()[0] == 0
+    finally:
+        store.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(filename + suffix):
+                os.remove(filename + suffix)
+    
+    print("\nAll SQLite store tests passed!")
+    return True
+
+
+def test_paged_listing():
+    """Test sort indexes and the paginated student listing"""
+    print_section("Testing Paged Listing")
+    
+    records = [{"id": f"S{(i * 37) % 45:03d}", "name": f"Student {chr(65 + i % 26)}{i}",
+                "grades": [float(40 + (i * 7) % 60)]} for i in range(45)]
+    stores = [StudentStore(), ColumnarStudentStore(), SQLiteStudentStore()]
+    for store in stores:
+        store.replace(records)
+    
+    for key in (None, "id", "name", "average"):
+        orders = [store.sorted_ids(key) for store in stores]
+        assert orders[0] == orders[1] == orders[2], f"Sort order mismatch for {key}"
+    by_average = [stores[0].get(student_id)["average"] for student_id in stores[0].sorted_ids("average")]
+    assert by_average == sorted(by_average, reverse=True)
+    assert stores[0].sorted_ids(None) == [r["id"] for r in records]
+    print("  All stores agree on roster, ID, name and average order")
+    
+    # The index is reused until the store changes
+    store = stores[0]
+    index = store.sorted_ids("name")
+    assert store.sorted_ids("name") is index
+    store.add_grade(store.get("S000"), 0.0)
+    assert store.sorted_ids("name") is not index
+    
+    class CountingOutput(io.StringIO):
+        writes = 0
+        def write(self, text):
+            CountingOutput.writes += 1
+            return super().write(text)
+    
+    output = CountingOutput()
+    commands = ["", "3", "average", "p", "q"]
+    with patch("final_project.students", store), patch("sys.stdout", output), \
+            patch("builtins.input", side_effect=commands):
+        view_all_students(page_size=20)
+    pages = output.getvalue().split("--- All Students")[1:]
+    assert [page.split(")")[0] for page in pages] == [
+        " (page 1 of 3", " (page 2 of 3", " (page 3 of 3",
+        " (page 1 of 3, by average", " (page 1 of 3, by average"]
+    assert len(pages[2].strip().splitlines()) == 3 + 5
+    first_row = pages[3].splitlines()[3].split()[0]
+    assert first_row == store.sorted_ids("average")[0]
+    assert CountingOutput.writes == len(pages)
+    print(f"  Rendered {len(pages)} pages with one write each")
+    stores[2].close()
+    
+    print("\nAll paged listing tests passed!")
+    return True
+
+
+def test_rank_index():
+    """Test top-K, rank and percentile queries against a full sort"""
+    print_section("Testing Rank Index")
+    
+    import random
+    rng = random.Random(14)
+    
+    class SmallBuckets(RankIndex):
+        LOAD = 4  # Forces many bucket splits and merges
+    
+    store = StudentStore()
+    store.replace([{"id": f"S{i:03d}", "name": f"Student {i}",
+                    "grades": [float(rng.randint(0, 20) * 5)]} for i in range(60)])
+    index = SmallBuckets(store)
+    
+    def check():
+        ranked = sorted(store, key=lambda s: (-s["average"], s["id"]))
+        ids = [s["id"] for s in ranked]
+        assert len(index) == len(store)
+        assert index.top(7) == ids[:7] and index.top(1000) == ids
+        assert index.bottom(5) == ids[::-1][:5]
+        for student in ranked:
+            higher = sum(s["average"] > student["average"] for s in ranked)
+            equal = sum(s["average"] == student["average"] for s in ranked)
+            lower = len(ranked) - higher - equal
+            assert index.rank(student["id"]) == higher + 1
+            assert math.isclose(index.percentile(student["id"]),
+                                (lower + equal / 2) / len(ranked) * 100)
+    
+    check()
+    for _ in range(300):
+        student = store.get(rng.choice(store.sorted_ids()))
+        action = rng.random()
+        if action < 0.4:
+            store.add_grade(student, float(rng.randint(0, 100)))
+        elif action < 0.6 and student["grades"]:
+            store.update_grade(student, 0, float(rng.randint(0, 100)))
+        elif action < 0.75 and len(student["grades"]) > 1:
+            store.delete_grade(student, -1)
+        elif action < 0.85:
+            store.remove(student["id"])
+        else:
+            store.add({"id": f"N{rng.randint(0, 10**6)}", "name": "New",
+                       "grades": [float(rng.randint(0, 100))]})
+    check()
+    print(f"  Index matches a full sort after 300 changes ({len(index)} students)")
+    
+    assert index.rank("missing") is None and index.percentile("missing") is None
+    store.clear()
+    assert len(index) == 0 and index.top(3) == []
+    
+    # Rankings come after Logout (8) and Exit (9) in the main menu
+    import final_project
+    store.replace([{"id": f"S{i}", "name": f"Student {i}", "grades": [float(i)]} for i in range(5)])
+    answers = iter(["10", "1", "2", "", "9"])
+    with patch("final_project.students", store), patch("final_project.rank_index", None), \
+            patch("final_project.roster_opened", True), \
+            patch("final_project.current_user", {"username": "admin", "role": "admin"}), \
+            patch("builtins.input", lambda prompt="": next(answers)), \
+            patch("sys.stdout", io.StringIO()) as output:
+        assert final_project.main_menu() == "exit"
+    assert "--- Top 2 Students ---" in output.getvalue()
+    print("  Menu option 10 shows rankings, 9 still exits")
+    
+    print("\nAll rank index tests passed!")
+    return True
+
+
+def test_filter_queries():
+    """Test average, letter, status and name prefix filters against a full scan"""
+    print_section("Testing Filter Queries")
+    
+    import random
+    rng = random.Random(15)
+    first_names = ["Ann", "Anna", "Andre", "Bea", "Ben", "Carl", "Zoe", "anya"]
+    store = StudentStore()
+    store.replace([{"id": f"S{i:03d}", "name": f"{rng.choice(first_names)} {i}",
+                    "grades": [float(rng.randint(0, 100)) for _ in range(rng.randint(1, 3))]}
+                   for i in range(200)])
+    
+    def expected(min_average=None, max_average=None, letter=None, passed=None,
+                 name_prefix=None):
+        matches = [s for s in store
+                   if (min_average is None or s["average"] >= min_average)
+                   and (max_average is None or s["average"] <= max_average)
+                   and (letter is None or s["letter"] == letter.upper())
+                   and (passed is None or (s["average"] >= 60) == passed)
+                   and s["name"].lower().startswith((name_prefix or "").lower())]
+        return [s["id"] for s in sorted(matches, key=lambda s: (-s["average"], s["id"]))]
+    
+    queries = [{}, {"min_average": 55, "max_average": 60}, {"letter": "D"},
+               {"letter": "a"}, {"passed": False}, {"passed": True, "letter": "F"},
+               {"name_prefix": "an"}, {"name_prefix": "AN", "letter": "C"},
+               {"name_prefix": "Zoe", "min_average": 50}, {"name_prefix": "x"},
+               {"min_average": 90, "max_average": 80}, {"max_average": 60.0}]
+    
+    with patch("final_project.students", store), patch("final_project.rank_index", None), \
+            patch("final_project.name_prefix_index", None):
+        for query in queries:
+            found = find_students(**query)
+            assert found == expected(**query), f"Filter mismatch for {query}"
+            print(f"  {query}: {len(found)} match(es)")
+        
+        # The indexes follow later changes
+        store.add_grade(store.get("S000"), 100.0)
+        store.add({"id": "S999", "name": "Andy", "grades": [59.5]})
+        store.remove("S001")
+        for query in queries:
+            assert find_students(**query) == expected(**query)
+        
+        try:
+            find_students(letter="E")
+            assert False, "Unknown letters should be rejected"
+        except ValueError:
+            pass
+        
+        # Filter is menu option 11; Logout (8) and Exit (9) keep their numbers
+        import final_project
+        answers = iter(["11", "", "", "", "", "zoe", "q", "", "8"])
+        with patch("final_project.roster_opened", True), \
+                patch("final_project.current_user", {"username": "admin", "role": "admin"}), \
+                patch("builtins.input", lambda prompt="": next(answers)), \
+                patch("sys.stdout", io.StringIO()) as output:
+            assert final_project.main_menu() == "logout"
+        assert "--- Filter Students ---" in output.getvalue()
+        print("  Menu option 11 filters students, 8 still logs out")
+    
+    print("\nAll filter query tests passed!")
+    return True
+
+
+def test_batch_cli():
+    """Test the non-interactive command line against a temporary roster"""
+    print_section("Testing Batch CLI")
+    
+    import final_project
+    roster, grades_file = "test_cli_roster.csv", "test_cli_grades.csv"
+    with open(roster, "w") as f:
+        f.write("ID,Name,Grades\nS1,Alice,90\nS2,Bob,50\n")
+    with open(grades_file, "w") as f:
+        f.write("student_id,grade\n" + "S2,70\n" * 3000 + "S9,80\nS1,101\n")
+    
+    def cli(*argv, password="admin123"):
+        output, errors = io.StringIO(), io.StringIO()
+        with patch.dict(os.environ, {"SAMS_PASSWORD": password}), \
+                patch("sys.stdout", output), patch("sys.stderr", errors):
+            status = run_cli(["--user", "admin" if password == "admin123" else "user", *argv])
+        return status, output.getvalue(), errors.getvalue()
+    
+    try:
+        with patch("final_project.students", StudentStore()), \
+                patch("final_project.CSV_FILE", roster), patch("final_project.DATA_FORMAT", "csv"), \
+                patch("final_project.journal", None), patch("final_project.current_user", None), \
+                patch("final_project.rank_index", None), \
+                patch("final_project.name_prefix_index", None):
+            start = time.perf_counter()
+            status, _, errors = cli("add-grades", grades_file)
+            elapsed = time.perf_counter() - start
+            assert status == 1 and "Added 3000 grade(s), rejected 2 row(s)" in errors
+            assert "Line 3002: unknown student ID 'S9'" in errors
+            print(f"  add-grades applied 3000 grades in {elapsed:.2f} s")
+            
+            status, output, _ = cli("query", "--status", "pass")
+            assert status == 0 and output.splitlines()[1:] == ["S1,Alice,90.00,A,Pass",
+                                                               "S2,Bob,69.99,D,Pass"]
+            
+            status, output, _ = cli("report", "--format", "json", password="user123")
+            assert status == 0 and json.loads(output)["passed_students"] == 2
+            
+            status, _, errors = cli("add-grades", grades_file, password="user123")
+            assert status == 2 and "only administrators" in errors
+            status, _, _ = cli("report", password="wrong")
+            assert status == 2
+        
+        with open(roster) as f:
+            assert f.read().splitlines()[2].startswith("S2,Bob,50.0;70.0;70.0")
+        print("  Query, report, saving and access checks behave as expected")
+    finally:
+        for filename in (roster, grades_file):
+            if os.path.exists(filename):
+                os.remove(filename)
+    
+    # Only the SQLite store says it opened the database
+    store = StudentStore()
+    store.add({"id": "S1", "name": "Alice", "grades": [90.0]})
+    with patch("final_project.students", store), patch("final_project.roster_opened", False), \
+            patch("sys.stdout", io.StringIO()) as output:
+        assert final_project.open_roster()
+    assert final_project.DATABASE_FILE not in output.getvalue()
+    
+    print("\nAll batch CLI tests passed!")
+    return True
+
+
+def test_grade_ingestion():
+    """Test bulk grade ingestion against adding the grades one at a time"""
+    print_section("Testing Bulk Grade Ingestion")
+    
+    import random
+    rng = random.Random(17)
+    # StudentStore keeps the dicts it is given, so every store gets fresh ones
+    roster = lambda: [{"id": f"S{i}", "name": f"Student {i}", "grades": [70.0]}
+                      for i in range(50)]
+    events = [(f"S{rng.randint(0, 59)}", rng.choice([rng.randint(0, 100), "88.5", "abc", -1, None]))
+              for _ in range(1000)]
+    
+    expected = StudentStore()
+    expected.replace(roster())
+    expected_errors = []
+    for row, (student_id, grade) in enumerate(events, 1):
+        try:
+            grade = float(grade)
+        except (TypeError, ValueError):
+            expected_errors.append(row)
+            continue
+        if not 0 <= grade <= 100 or student_id not in expected:
+            expected_errors.append(row)
+            continue
+        expected.add_grade(expected.get(student_id), grade)
+    
+    rows = lambda store: [(s["id"], s["grades"], s["average"], s["letter"]) for s in store]
+    for store in (StudentStore(), ColumnarStudentStore(), SQLiteStudentStore()):
+        store.replace(roster())
+        with patch("final_project.students", store):
+            report = ingest_grades(events)
+        assert rows(store) == rows(expected), type(store).__name__
+        assert [row for row, _ in report.errors] == expected_errors
+        assert report.applied + report.rejected == len(events)
+        assert not store.stats.verify(store)
+    print(f"  {report.applied} grades for {report.students_updated} students, "
+          f"{report.rejected} rejected rows")
+    print(f"  First errors: {report.errors[:3]}")
+    
+    # Journaled bulk changes replay like single ones
+    journal = Journal("test_ingest.journal")
+    store = StudentStore()
+    store.replace(roster())
+    store.subscribe(journal.record)
+    journal.start("test_ingest.csv")
+    try:
+        with patch("final_project.students", store):
+            ingest_grades([("S1", 90), ("S1", 91), ("S2", 10)])
+        journal.flush()
+        replayed = StudentStore()
+        replayed.replace(roster())
+        assert Journal("test_ingest.journal").replay(replayed, "test_ingest.csv") == 2
+        assert rows(replayed) == rows(store)
+    finally:
+        os.remove("test_ingest.journal")
+    
+    print("\nAll bulk grade ingestion tests passed!")
+    return True
+
+
+def test_server():
+    """Test the JSON server with concurrent readers and a writer"""
+    print_section("Testing Server Mode")
+    
+    import asyncio
+    from server import StudentServer, ReadWriteLock
+    
+    async def check_lock():
+        lock = ReadWriteLock()
+        active = {"readers": 0, "writers": 0, "max_readers": 0}
+        
+        async def reader():
+            async with lock.read():
+                active["readers"] += 1
+                active["max_readers"] = max(active["max_readers"], active["readers"])
+                assert active["writers"] == 0
+                await asyncio.sleep(0.01)
+                active["readers"] -= 1
+        
+        async def writer():
+            async with lock.write():
+                active["writers"] += 1
+                assert active["writers"] == 1 and active["readers"] == 0
+                await asyncio.sleep(0.01)
+                active["writers"] -= 1
+        
+        await asyncio.gather(*[reader() if i % 5 else writer() for i in range(30)])
+        return active["max_readers"]
+    
+    async def client(port, requests):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        responses = []
+        for request in requests:
+            writer.write((json.dumps(request) + "\n").encode())
+            await writer.drain()
+            responses.append(json.loads(await reader.readline()))
+        writer.close()
+        return responses
+    
+    async def scenario():
+        server = StudentServer(workers=4)
+        listener = await server.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+        admin = {"op": "login", "username": "admin", "password": "admin123"}
+        user = {"op": "login", "username": "user", "password": "user123"}
+        async with listener:
+            readers = [client(port, [user] + [{"op": "get", "id": f"S{i % 20}"}] * 25
+                              + [{"op": "add_grade", "id": "S1", "grade": 50}])
+                       for i in range(20)]
+            writer = client(port, [admin] + [{"op": "add_grade", "id": "S0", "grade": 100}] * 50
+                            + [{"op": "report"}, {"op": "top", "k": 1},
+                               {"op": "update_grade", "id": "S0", "index": 99, "grade": 1},
+                               {"op": "get", "id": "S404"}, {"op": "filter", "letter": "A"},
+                               {"op": "add_student", "id": "S90", "name": "Ann", "grades": "90"}])
+            start = time.perf_counter()
+            results = await asyncio.gather(writer, *readers,
+                                           client(port, [{"op": "report"}]))
+            elapsed = time.perf_counter() - start
+        return server, results, elapsed
+    
+    store = StudentStore()
+    store.replace([{"id": f"S{i}", "name": f"Student {i}", "grades": [float(40 + i)]}
+                   for i in range(20)])
+    with patch("final_project.students", store), patch("final_project.rank_index", None), \
+            patch("final_project.name_prefix_index", None):
+        max_readers = asyncio.run(check_lock())
+        assert max_readers > 1
+        print(f"  Read lock shared by up to {max_readers} readers, writes exclusive")
+        
+        server, (admin_results, *reader_results, anonymous), elapsed = asyncio.run(scenario())
+        for results in reader_results:
+            assert all(r["ok"] for r in results[:-1])
+            assert results[-1] == {"ok": False, "error": "only administrators can add_grade"}
+        assert all(r["ok"] for r in admin_results[:53])
+        assert admin_results[51]["result"]["total_students"] == 20
+        assert admin_results[52]["result"][0]["id"] == "S0"
+        assert admin_results[53] == {"ok": False, "error": "invalid grade index"}
+        assert not admin_results[54]["ok"] and [s["id"] for s in admin_results[55]["result"]] == ["S0"]
+        assert admin_results[56] == {"ok": False, "error": "grades must be a list"}
+        assert anonymous == [{"ok": False, "error": "login required"}]
+        assert store.get("S0")["grades"] == [40.0] + [100.0] * 50
+        print(f"  {server.requests_served} requests from 22 clients in {elapsed:.2f} s")
+        
+        # Concurrent saves are serialized and each writes its own temporary file
+        async def concurrent_saves():
+            server = StudentServer(workers=4)
+            return await asyncio.gather(*[server.save({"format": "csv"}) for _ in range(8)])
+        
+        filename = "test_server_save.csv"
+        try:
+            with patch("final_project.CSV_FILE", filename):
+                saves = asyncio.run(concurrent_saves())
+            assert all(save == {"saved": filename, "students": 20} for save in saves)
+            loaded = StudentStore()
+            loaded.replace(StudentCSVReader(filename))
+            assert loaded.get("S0")["grades"] == store.get("S0")["grades"]
+            assert not [name for name in os.listdir(".") if name.startswith(filename + ".")]
+            print("  8 concurrent saves wrote one complete file")
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
+        
+        # With a journal the first save compacts and later ones append to it
+        async def journaled_saves():
+            server = StudentServer(workers=2)
+            saves = [await server.save({"format": "csv"})]
+            store.add_grade(store.get("S1"), 99.0)
+            store.add_grade(store.get("S2"), 98.0)
+            saves.append(await server.save({"format": "csv"}))
+            saves.append(await server.save({"format": "csv"}))
+            return saves
+        
+        journal = Journal("test_server.journal")
+        store.subscribe(journal.record)
+        try:
+            with patch("final_project.CSV_FILE", filename), patch("final_project.journal", journal):
+                saves = asyncio.run(journaled_saves())
+            assert saves == [{"saved": filename, "students": 20},
+                             {"saved": journal.filename, "changes": 2},
+                             {"saved": journal.filename, "changes": 0}]
+            loaded = StudentStore()
+            loaded.replace(StudentCSVReader(filename))
+            assert Journal(journal.filename).replay(loaded, filename) == 2
+            assert [s["grades"] for s in loaded] == [s["grades"] for s in store]
+            
+            # Changes made while a full save writes stay queued for the new log
+            journal.cut()
+            store.add_grade(store.get("S3"), 97.0)
+            journal.start(filename, keep_pending=True)
+            assert len(journal.pending) == 1 and not journal.should_compact(filename, 20)
+            print("  Journaled saves append only the changes")
+        finally:
+            store.unsubscribe(journal.record)
+            for name in (filename, journal.filename):
+                if os.path.exists(name):
+                    os.remove(name)
+    
+    print("\nAll server tests passed!")
+    return True
+
+
+def test_parallel_report():
+    """Test that the parallel report matches the serial one"""
+    print_section("Testing Parallel Report")
+    
+    import random
+    rng = random.Random(19)
+    roster = [{"id": f"S{i}", "name": f"Student {i}",
+               "grades": [rng.randint(0, 100) + rng.choice([0, 0.5, 0.1]) for _ in range(rng.randint(0, 6))]}
+              for i in range(5000)]
+    
+    def report_text(store, workers):
+        output = io.StringIO()
+        with patch("final_project.students", store), patch("sys.stdout", output):
+            generate_report(workers=workers)
+        return output.getvalue()
+    
+    for store in (StudentStore(), ColumnarStudentStore()):
+        store.replace(roster)
+        for i in range(0, 5000, 9):
+            store.remove(f"S{i}")
+        expected = ReportStats.from_records(store)
+        for workers in (2, 3):
+            stats = parallel_report_stats(store, workers)
+            assert not stats.verify(store)
+            assert stats.grade_distribution == expected.grade_distribution
+        assert report_text(store, 3) == report_text(store, 1)
+    print(f"  {len(store)} students: 2 and 3 workers match the serial report")
+    
+    print("\nAll parallel report tests passed!")
+    return True
+
+
+def test_sharded_load():
+    """Test that the sharded CSV loader matches the streaming loader"""
+    print_section("Testing Sharded CSV Load")
+    
+    filename = "test_sharded_records.csv"
+    
+    def compare(label):
+        streamed = StudentCSVReader(filename)
+        streamed_store = StudentStore()
+        streamed_store.replace(streamed)
+        sharded = ShardedCSVReader(filename, workers=3)
+        sharded.SHARD_BYTES = 64
+        sharded_store = StudentStore()
+        sharded_store.replace(sharded)
+        
+        rows = lambda store: [(s["id"], s["name"], s["grades"]) for s in store]
+        print(f"  {label}: {len(sharded_store)} students, {sharded.error_count} errors")
+        assert rows(sharded_store) == rows(streamed_store)
+        assert sharded.errors == streamed.errors and sharded.rows_read == streamed.rows_read
+    
+    try:
+        with open(filename, "w", newline="") as f:
+            f.write("ID,Name,Grades\r\n")
+            for i in range(300):
+                f.write(f"S{i % 250},Student {i},{i % 101};{(i * 7) % 101}\r\n")
+                if i % 60 == 0:
+                    f.write('S900,"Doe, Jane",77\r\nS901,Bad Grade,7;x\r\n\r\n')
+        compare("Duplicates and bad rows across shards")
+        
+        # A quoted line break in the middle of the file makes the cuts unsafe
+        with open(filename, "w", newline="") as f:
+            f.write("ID,Name,Grades\r\n")
+            f.write('S1,"' + "Long\r\n" * 200 + 'Name",90\r\n')
+            f.write("S2,Second,80\r\nS1,Duplicate,10\r\nS3,Bad,x")
+        compare("Quoted line breaks")
+        
+        # Ranges before the quoted field are still parsed by the workers
+        with open(filename, "w", newline="") as f:
+            f.write("ID,Name,Grades\r\n")
+            for i in range(100):
+                f.write(f"S{i % 80},Student {i},{i % 101}\r\n")
+            f.write('S500,"Split\r\nName",90\r\nS501,Bad,x\r\nS3,Duplicate,10\r\n')
+            for i in range(100, 150):
+                f.write(f"S{i},Student {i},{i % 101}\r\n")
+        compare("Quoted line break after several ranges")
+    finally:
+        os.remove(filename)
+    
+    print("\nAll sharded load tests passed!")
+    return True
+
+
+def test_instrumentation():
+    """Test call timings, byte counts and one-action profiling"""
+    print_section("Testing Instrumentation")
+    
+    store = StudentStore()
+    store.replace([{"id": f"S{i}", "name": f"Student {i}", "grades": [i % 101, 75]}
+                   for i in range(200)])
+    metrics = Metrics()
+    filename, profile_file, metrics_file = "test_metrics.csv", "test_profile.prof", "test_metrics.json"
+    try:
+        with patch("final_project.students", store), patch("final_project.metrics", metrics), \
+                patch("final_project.PROFILE_FILE", profile_file), patch("sys.stdout", io.StringIO()):
+            for grades in ([90, 80], [], [55]):
+                calculate_average(grades)
+            write_roster_file(filename, "csv")
+            metrics.profile_next = True
+            generate_report()
+            generate_report()
+            dump_metrics(metrics_file)
+        
+        summary = metrics.summary()
+        functions = summary["functions"]
+        print(f"  {functions}")
+        assert functions["calculate_average"]["calls"] == 3
+        assert functions["generate_report"]["calls"] == 2
+        assert functions["write_roster_file"]["calls"] == 1
+        assert summary["bytes_written"] == os.path.getsize(filename)
+        assert not metrics.profile_next and metrics.last_profile["function"] == "generate_report"
+        assert "generate_report" in metrics.last_profile["profile"] and os.path.exists(profile_file)
+        
+        with open(metrics_file) as f:
+            saved = json.load(f)
+        assert saved["functions"]["generate_report"]["calls"] == 2
+        assert saved["last_profile"]["function"] == "generate_report"
+        print(f"  Profiled generate_report, peak {metrics.last_profile['peak_memory_bytes']:,} bytes")
+    finally:
+        for name in (filename, profile_file, metrics_file):
+            if os.path.exists(name):
+                os.remove(name)
+    
+    print("\nAll instrumentation tests passed!")
+    return True
+
+
+def test_fast_startup():
+    """Test that startup skips heavy imports, the roster load and clearing a pipe"""
+    print_section("Testing Fast Startup")
+    
+    import subprocess
+    import final_project
+    heavy = ("numpy", "sqlite3", "argparse", "concurrent.futures.process",
+             "multiprocessing.shared_memory")
+    # Every store backend starts without heavy imports or creating files
+    import tempfile
+    here = os.path.dirname(os.path.abspath(final_project.__file__))
+    for backend in ("dict", "columnar", "sqlite"):
+        with tempfile.TemporaryDirectory() as directory:
+            result = subprocess.run(
+                [sys.executable, "-c", "import sys, final_project; "
+                 f"print([name for name in {heavy!r} if name in sys.modules])"],
+                capture_output=True, text=True, check=True, cwd=directory,
+                env=dict(os.environ, SAMS_STORE=backend, PYTHONPATH=here))
+            created = os.listdir(directory)
+        print(f"  {backend}: heavy modules imported at startup: {result.stdout.strip()}, "
+              f"files created: {created}")
+        assert result.stdout.strip() == "[]" and created == []
+    
+    # The roster is opened by the first menu action that needs it, once
+    opened = []
+    
+    def open_roster():
+        opened.append(True)
+        final_project.roster_opened = True
+    
+    answers = iter(["8", "5", "", "2", "", "8"])
+    with patch("final_project.roster_opened", False), \
+            patch("final_project.current_user", {"username": "admin", "role": "admin"}), \
+            patch("final_project.open_roster", open_roster), \
+            patch("final_project.generate_report", lambda: None), \
+            patch("final_project.search_student", lambda: None), \
+            patch("builtins.input", lambda prompt="": next(answers)), \
+            patch("sys.stdout", io.StringIO()):
+        final_project.main_menu()
+        assert not opened
+        final_project.main_menu()
+    print(f"  Roster opened {len(opened)} time(s) for two roster actions")
+    assert len(opened) == 1
+    
+    with patch("sys.stdout", io.StringIO()) as output, \
+            patch("os.system", lambda command: 1 / 0):
+        final_project.clear_screen()
+    assert output.getvalue() == ""
+    
+    print("\nAll fast startup tests passed!")
+    return True
+
+
+def test_rendering():
+    """Test buffered rendering and the JSON/CSV output formats"""
+    print_section("Testing Rendering")
+    
+    import csv
+    store = StudentStore()
+    store.replace([{"id": f"S{i}", "name": f"Student, {i}", "grades": [i % 101, 60.5]}
+                   for i in range(3000)])
+    
+    class CountingFile(io.StringIO):
+        writes = 0
+        
+        def write(self, text):
+            self.writes += 1
+            return super().write(text)
+    
+    output = CountingFile()
+    with patch("final_project.students", store), patch("sys.stdout", output):
+        generate_report()
+    assert output.writes == 1
+    assert output.getvalue() == render_report(store.stats)
+    assert "Total Students: 3000" in output.getvalue()
+    print(f"  Text report: {len(output.getvalue())} characters in {output.writes} write")
+    
+    summary = report_summary(store.stats)
+    assert json.loads(format_report(store.stats, "json")) == summary
+    rows = dict(csv.reader(io.StringIO(format_report(store.stats, "csv"))))
+    assert int(rows["total_students"]) == 3000
+    assert int(rows["grade_A"]) == summary["grade_distribution"]["A"]
+    
+    for output_format in ("text", "csv", "json"):
+        output = CountingFile()
+        write_lines(student_table_lines(store, output_format), output)
+        text = output.getvalue()
+        if output_format == "csv":
+            table = list(csv.DictReader(io.StringIO(text)))
+            assert [row["ID"] for row in table] == [s["id"] for s in store]
+            assert table[7]["Name"] == "Student, 7"
+        elif output_format == "json":
+            table = json.loads(text)
+            assert [row["id"] for row in table] == [s["id"] for s in store]
+            assert table[5]["grades"] == [5, 60.5]
+        else:
+            assert len(text.splitlines()) == 3002
+        # Streamed in large chunks, not one write per student
+        assert 1 < output.writes < len(store) / 50
+        print(f"  {output_format} table: {len(text):,} characters in {output.writes} writes")
+    assert json.loads("".join(student_table_lines([], "json"))) == []
+    
+    print("\nAll rendering tests passed!")
+    return True
+
+
+def test_view_cache():
+    """Test the LRU cache of detail views and name searches"""
+    print_section("Testing View Cache")
+    
+    from final_project import render_student_details
+    roster = lambda: [{"id": "S1", "name": "Alice Stone", "grades": [90.0]},
+                      {"id": "S2", "name": "Bob Stone", "grades": [70.0]},
+                      {"id": "S3", "name": "Carol Reed", "grades": [50.0]}]
+    for store in (StudentStore(), ColumnarStudentStore(), SQLiteStudentStore()):
+        store.replace(roster())
+        cache = StudentViewCache(store, detail_capacity=2, search_capacity=3)
+        
+        # Least recently used entries are evicted
+        assert cache.detail(store.get("S1")) == render_student_details(store.get("S1"))
+        cache.detail(store.get("S1"))
+        cache.detail(store.get("S2"))
+        cache.detail(store.get("S3"))
+        assert len(cache.details) == 2 and (cache.details.hits, cache.details.misses) == (1, 3)
+        
+        # A grade change drops only that student's view
+        store.add_grade(store.get("S3"), 100.0)
+        assert "Average: 75.00" in cache.detail(store.get("S3"))
+        cache.detail(store.get("S2"))
+        assert (cache.details.hits, cache.details.misses) == (2, 4)
+        
+        # Searches are cached by normalized query until a matching name is added
+        assert cache.search("stone") == ("S1", "S2")
+        assert cache.search("  STONE ") == ("S1", "S2") and cache.searches.hits == 1
+        assert cache.search("reed") == ("S3",)
+        store.add({"id": "S4", "name": "Dan Stone", "grades": [80.0]})
+        assert "stone" not in cache.searches._entries and "reed" in cache.searches._entries
+        assert cache.search("stone") == ("S1", "S2", "S4")
+        
+        # Removing a student drops its view and the searches that found it
+        store.remove("S3")
+        assert "reed" not in cache.searches._entries and "stone" in cache.searches._entries
+        assert cache.search("reed") == ()
+        
+        # Loading a roster drops everything
+        store.replace(roster())
+        assert not len(cache.details) and not len(cache.searches)
+        print(f"  {type(store).__name__}: {cache.stats()}")
+        cache.close()
+    
+    # search_student goes through the cache
+    store = StudentStore()
+    store.replace(roster())
+    with patch("final_project.students", store), patch("final_project.view_cache", None), \
+            patch("sys.stdout", io.StringIO()) as output:
+        for _ in range(2):
+            answers = iter(["2", "stone"])
+            with patch("builtins.input", lambda prompt="": next(answers)):
+                search_student()
+        import final_project
+        stats = final_project.view_cache.stats()
+    assert output.getvalue().count("Name: Alice Stone") == 2
+    assert stats["searches"]["hits"] == 1 and stats["details"]["hits"] == 2
+    
+    print("\nAll view cache tests passed!")
+    return True
+
+
 def populate_test_data():
     """Populate system with test data"""
     print_section("Populating Test Data")
@@ -243,6 +1542,30 @@ def demonstrate_system():
         ("Calculations", test_calculations),
         ("Loop Features", test_loop_features),
         ("Conditional Logic", test_conditional_logic),
+        ("Student Store", test_student_store),
+        ("Name Search", test_name_search),
+        ("Cached Aggregates", test_cached_aggregates),
+        ("Report Statistics", test_report_stats),
+        ("Batch Grading", test_batch_grading),
+        ("Columnar Store", test_columnar_store),
+        ("Streaming Loader", test_streaming_loader),
+        ("Bulk Import", test_bulk_import),
+        ("Binary Snapshot", test_snapshot),
+        ("Change Journal", test_journal),
+        ("Background Saves", test_background_save),
+        ("SQLite Store", test_sqlite_store),
+        ("Paged Listing", test_paged_listing),
+        ("Rank Index", test_rank_index),
+        ("Filter Queries", test_filter_queries),
+        ("Batch CLI", test_batch_cli),
+        ("Bulk Grade Ingestion", test_grade_ingestion),
+        ("Server Mode", test_server),
+        ("Parallel Report", test_parallel_report),
+        ("Sharded CSV Load", test_sharded_load),
+        ("Instrumentation", test_instrumentation),
+        ("Fast Startup", test_fast_startup),
+        ("Rendering", test_rendering),
+        ("View Cache", test_view_cache),
         ("Test Data Population", populate_test_data),
         ("File Operations", test_file_operations),
     ]